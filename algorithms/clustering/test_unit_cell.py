@@ -17,3 +17,50 @@ def test_unit_cell():
         crystal_symmetries, lattice_ids=lattice_ids
     )
     clusters, dendrogram, _ = ucs.ab_cluster(write_file_lists=False, doplot=False)
+
+
+def test_unit_cell_sparse_matches_single_linkage():
+    sgi = sgtbx.space_group_info("P1")
+    crystal_symmetries = [
+        sgi.any_compatible_crystal_symmetry(volume=random.choice([1000, 2000, 4000]))
+        for i in range(30)
+    ]
+    lattice_ids = flex.int_range(0, len(crystal_symmetries)).as_string()
+    ucs = UnitCellCluster.from_crystal_symmetries(
+        crystal_symmetries, lattice_ids=lattice_ids
+    )
+    clusters, _, _ = ucs.ab_cluster(threshold=100, write_file_lists=False, doplot=False)
+    sparse_clusters = ucs.ab_cluster_sparse(threshold=100, write_file_lists=False)
+    assert sorted(sorted(id(m) for m in c.members) for c in sparse_clusters) == sorted(
+        sorted(id(m) for m in c.members) for c in clusters
+    )
+
+
+def test_unit_cell_sparse_prefilter(monkeypatch):
+    from dials.algorithms.clustering import unit_cell
+
+    sgi = sgtbx.space_group_info("P1")
+    crystal_symmetries = [
+        sgi.any_compatible_crystal_symmetry(volume=random.choice([1000, 2000, 4000]))
+        for i in range(30)
+    ]
+    ucs = UnitCellCluster.from_crystal_symmetries(crystal_symmetries)
+
+    n_distances = []
+    ncdist_batch = unit_cell._ncdist_batch
+
+    def counting_ncdist_batch(g6_a, g6_b):
+        n_distances[-1] += len(g6_a)
+        return ncdist_batch(g6_a, g6_b)
+
+    monkeypatch.setattr(unit_cell, "_ncdist_batch", counting_ncdist_batch)
+    n_distances.append(0)
+    exact_clusters = ucs.ab_cluster_sparse(
+        threshold=10, exact=True, write_file_lists=False
+    )
+    n_distances.append(0)
+    clusters = ucs.ab_cluster_sparse(threshold=10, write_file_lists=False)
+    assert sorted(sorted(id(m) for m in c.members) for c in clusters) == sorted(
+        sorted(id(m) for m in c.members) for c in exact_clusters
+    )
+    assert n_distances[1] < n_distances[0]
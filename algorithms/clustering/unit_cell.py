@@ -5,6 +5,8 @@
 
 import logging
 
+from libtbx import easy_mp
+
 logger = logging.getLogger(__name__)
 
 
@@ -78,33 +80,12 @@ def ab_cluster(
             return [], None
 
         # 3. Create an array of sub-cluster objects from the clustering
-        sub_clusters = []
-        for cluster in range(max(cluster_ids)):
-            info_string = (
-                "Made using ab_cluster with t={}," " {} method, and {} linkage"
-            ).format(threshold, method, linkage_method)
-            sub_clusters.append(
-                self.make_sub_cluster(
-                    [
-                        self.members[i]
-                        for i in range(len(self.members))
-                        if cluster_ids[i] == cluster + 1
-                    ],
-                    "cluster_{}".format(cluster + 1),
-                    info_string,
-                )
-            )
-
-        sub_clusters = sorted(sub_clusters, key=lambda x: len(x.members))
-        # Rename to order by size
-        for num, cluster in enumerate(sub_clusters):
-            cluster.cname = "cluster_{}".format(num + 1)
-
-        # 3.5 optionally write out the clusters to files.
-        if write_file_lists:
-            for cluster in sub_clusters:
-                if len(cluster.members) > 1:
-                    cluster.dump_file_list(out_file_name="{}.lst".format(cluster.cname))
+        info_string = (
+            "Made using ab_cluster with t={}," " {} method, and {} linkage"
+        ).format(threshold, method, linkage_method)
+        sub_clusters = self._make_sub_clusters(
+            cluster_ids, info_string, write_file_lists
+        )
 
         if labels is True:
             labels = [image.name for image in self.members]
@@ -153,3 +134,161 @@ def ab_cluster(
                 plt.show()
 
         return sub_clusters, dendrogram, ax
+
+    def ab_cluster_sparse(
+        self, threshold=10000, exact=False, nproc=1, write_file_lists=True
+    ):
+        """
+        Single linkage clustering of the unit cells without a distance matrix.
+
+        Single linkage clusters cut at a distance threshold are the connected
+        components of the graph joining all pairs of cells closer than the
+        threshold. The components are built up with a union-find structure,
+        and the Andrews-Bernstein distance is only computed for pairs of cells
+        that are not already in the same component. The memory used scales
+        with the number of cells, and so does the number of distances computed
+        if the cells are all in one cluster. No dendrogram is produced.
+
+        By default only the pairs of cells whose sorted (g1, g2, g3) differ by
+        at most the threshold are compared, found with a k-d tree. Each step
+        of an Andrews-Bernstein path is either a Euclidean G6 segment, which
+        cannot change these by more than its length, or a boundary mapping,
+        which leaves them unchanged. The distance between two cells is
+        therefore never less than this difference, and no pair within the
+        threshold is missed: the clusters are the same as those of ab_cluster
+        with single linkage. Set exact=True to compare all pairs instead.
+
+        :param threshold: the distance threshold at which to cut the tree.
+        :param exact: if True, compare every pair of cells not already in the
+                      same cluster, without the k-d tree prefilter.
+        :param nproc: the number of processes used to compute the distances.
+        :param write_file_lists: if True, write out the files that make up each cluster.
+        :return: A list of Clusters ordered by largest Cluster to smallest
+        """
+
+        import numpy as np
+        from scipy.spatial import cKDTree
+        from xfel.clustering.singleframe import SingleFrame
+
+        logger.info("Single linkage clustering of unit cells with union-find")
+
+        g6_cells = np.array([SingleFrame.make_g6(image.uc) for image in self.members])
+        n = len(g6_cells)
+        tree = None
+        if not exact and n:
+            lengths = np.sort(g6_cells[:, :3], axis=1)
+            tree = cKDTree(lengths)
+            n_candidates = (tree.count_neighbors(tree, threshold) - n) // 2
+            logger.info(
+                "Found %d candidate pairs of the %d pairs of unit cells",
+                n_candidates,
+                n * (n - 1) // 2,
+            )
+
+        # The root of the component of each cell, and the root of each root
+        parent = np.arange(n)
+
+        def find(cells):
+            roots = parent[cells]
+            while True:
+                up = parent[roots]
+                if np.array_equal(up, roots):
+                    break
+                roots = up
+            parent[cells] = roots
+            return roots
+
+        # Compute the distances for the pending pairs in batches, and join
+        # the components of those within the threshold
+        batch_size = 10000
+        pending = []
+
+        def join_pending():
+            cells_a = np.concatenate([a for a, _ in pending])
+            cells_b = np.concatenate([b for _, b in pending])
+            del pending[:]
+            batches = [
+                (
+                    g6_cells[cells_a[i : i + batch_size]],
+                    g6_cells[cells_b[i : i + batch_size]],
+                )
+                for i in range(0, len(cells_a), batch_size)
+            ]
+            if nproc > 1 and len(batches) > 1:
+                results = easy_mp.parallel_map(
+                    _ncdist_batch,
+                    batches,
+                    processes=nproc,
+                    iterable_type=easy_mp.posiargs,
+                    method="multiprocessing",
+                    preserve_exception_message=True,
+                )
+            else:
+                results = [_ncdist_batch(*batch) for batch in batches]
+            close = np.concatenate(results) <= threshold
+            for i, j in zip(cells_a[close], cells_b[close]):
+                root_i, root_j = find(np.array([i, j]))
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        n_pending = 0
+        for i in range(n - 1):
+            if tree is None:
+                others = np.arange(i + 1, n)
+            else:
+                others = np.array(tree.query_ball_point(lengths[i], threshold))
+                others = others[others > i]
+            if not len(others):
+                continue
+            others = others[find(others) != find(np.array([i]))[0]]
+            if not len(others):
+                continue
+            pending.append((np.full(len(others), i), others))
+            n_pending += len(others)
+            if n_pending >= batch_size * nproc:
+                join_pending()
+                n_pending = 0
+        if pending:
+            join_pending()
+
+        _, labels = np.unique(find(np.arange(n)), return_inverse=True)
+        info_string = (
+            "Made using ab_cluster_sparse with t={} and single linkage"
+        ).format(threshold)
+        return self._make_sub_clusters(labels + 1, info_string, write_file_lists)
+
+    def _make_sub_clusters(self, cluster_ids, info_string, write_file_lists):
+        """
+        Create the sub-clusters from a list of 1-based cluster ids.
+        """
+        members = {}
+        for member, cluster_id in zip(self.members, cluster_ids):
+            members.setdefault(cluster_id, []).append(member)
+        sub_clusters = [
+            self.make_sub_cluster(
+                members.get(cluster + 1, []),
+                "cluster_{}".format(cluster + 1),
+                info_string,
+            )
+            for cluster in range(max(cluster_ids))
+        ]
+
+        sub_clusters = sorted(sub_clusters, key=lambda x: len(x.members))
+        # Rename to order by size
+        for num, cluster in enumerate(sub_clusters):
+            cluster.cname = "cluster_{}".format(num + 1)
+
+        # Optionally write out the clusters to files.
+        if write_file_lists:
+            for cluster in sub_clusters:
+                if len(cluster.members) > 1:
+                    cluster.dump_file_list(out_file_name="{}.lst".format(cluster.cname))
+        return sub_clusters
+
+
+def _ncdist_batch(g6_a, g6_b):
+    """Andrews-Bernstein distances between corresponding rows of two arrays."""
+    import numpy as np
+    from cctbx.uctbx.determine_unit_cell import NCDist
+
+    return np.array([NCDist(a, b) for a, b in zip(g6_a, g6_b)])
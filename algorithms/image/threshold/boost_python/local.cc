@@ -10,12 +10,34 @@
  */
 #include <boost/python.hpp>
 #include <boost/python/def.hpp>
+#include <dials/util/scoped_gil_release.h>
 #include <dials/algorithms/image/threshold/local.h>
 
 namespace dials { namespace algorithms { namespace boost_python {
 
   using namespace boost::python;
 
+  using dials::util::scoped_gil_release;
+
+  template <typename Threshold, typename T>
+  void threshold_nogil(Threshold &self,
+                       const af::const_ref<T, af::c_grid<2> > &src,
+                       const af::const_ref<bool, af::c_grid<2> > &mask,
+                       af::ref<bool, af::c_grid<2> > dst) {
+    scoped_gil_release release;
+    self.template threshold<T>(src, mask, dst);
+  }
+
+  template <typename Threshold, typename T>
+  void threshold_w_gain_nogil(Threshold &self,
+                              const af::const_ref<T, af::c_grid<2> > &src,
+                              const af::const_ref<bool, af::c_grid<2> > &mask,
+                              const af::const_ref<double, af::c_grid<2> > &gain,
+                              af::ref<bool, af::c_grid<2> > dst) {
+    scoped_gil_release release;
+    self.template threshold_w_gain<T>(src, mask, gain, dst);
+  }
+
   template <typename FloatType>
   void local_threshold_suite() {
     def("niblack", &niblack<FloatType>, (arg("image"), arg("size"), arg("n_sigma")));
@@ -66,10 +88,11 @@ namespace dials { namespace algorithms { namespace boost_python {
 
     class_<DispersionThreshold>("DispersionThreshold", no_init)
       .def(init<int2, int2, double, double, double, int>())
-      .def("__call__", &DispersionThreshold::threshold<int>)
-      .def("__call__", &DispersionThreshold::threshold<double>)
-      .def("__call__", &DispersionThreshold::threshold_w_gain<int>)
-      .def("__call__", &DispersionThreshold::threshold_w_gain<double>);
+      .def(init<int2, int2, double, double, double, int, std::size_t>())
+      .def("__call__", &threshold_nogil<DispersionThreshold, int>)
+      .def("__call__", &threshold_nogil<DispersionThreshold, double>)
+      .def("__call__", &threshold_w_gain_nogil<DispersionThreshold, int>)
+      .def("__call__", &threshold_w_gain_nogil<DispersionThreshold, double>);
 
     class_<DispersionThresholdDebug>("DispersionThresholdDebug", no_init)
       .def(init<const af::const_ref<double, af::c_grid<2> > &,
@@ -150,9 +173,10 @@ namespace dials { namespace algorithms { namespace boost_python {
     class_<DispersionExtendedThreshold>("DispersionExtendedThreshold", no_init)
       .def(init<int2, int2, double, double, double, int>())
       /* .def("__call__", &DispersionExtendedThreshold::threshold<int>) */
-      .def("__call__", &DispersionExtendedThreshold::threshold<double>)
+      .def("__call__", &threshold_nogil<DispersionExtendedThreshold, double>)
       /* .def("__call__", &DispersionExtendedThreshold::threshold_w_gain<int>) */
-      .def("__call__", &DispersionExtendedThreshold::threshold_w_gain<double>);
+      .def("__call__",
+           &threshold_w_gain_nogil<DispersionExtendedThreshold, double>);
   }
 
 }}}  // namespace dials::algorithms::boost_python
@@ -12,8 +12,11 @@
 #define DIALS_ALGORITHMS_IMAGE_THRESHOLD_UNIMODAL_H
 
 #include <cmath>
+#include <algorithm>
 #include <vector>
 #include <iostream>
+#include <boost/bind.hpp>
+#include <boost/thread.hpp>
 #include <scitbx/array_family/tiny_types.h>
 #include <scitbx/array_family/ref_reductions.h>
 #include <dials/error.h>
@@ -365,14 +368,17 @@ namespace dials { namespace algorithms {
                         double nsig_b,
                         double nsig_s,
                         double threshold,
-                        int min_count)
+                        int min_count,
+                        std::size_t nthreads = 1)
         : image_size_(image_size),
           kernel_size_(kernel_size),
           nsig_b_(nsig_b),
           nsig_s_(nsig_s),
           threshold_(threshold),
-          min_count_(min_count) {
+          min_count_(min_count),
+          nthreads_(nthreads) {
       // Check the input
+      DIALS_ASSERT(nthreads_ > 0);
       DIALS_ASSERT(threshold_ >= 0);
       DIALS_ASSERT(nsig_b >= 0 && nsig_s >= 0);
       DIALS_ASSERT(image_size.all_gt(0));
@@ -431,16 +437,20 @@ namespace dials { namespace algorithms {
     }
 
     /**
-     * Compute the threshold
+     * Compute the threshold for a band of rows
      * @param src - The input array
      * @param mask - The mask array
      * @param dst The output array
+     * @param row0 The first row
+     * @param row1 The last row (exclusive)
      */
     template <typename T>
     void compute_threshold(af::ref<Data<T> > table,
                            const af::const_ref<T, af::c_grid<2> > &src,
                            const af::const_ref<bool, af::c_grid<2> > &mask,
-                           af::ref<bool, af::c_grid<2> > dst) {
+                           af::ref<bool, af::c_grid<2> > dst,
+                           std::size_t row0,
+                           std::size_t row1) {
       // Get the size of the image
       std::size_t ysize = src.accessor()[0];
       std::size_t xsize = src.accessor()[1];
@@ -450,7 +460,8 @@ namespace dials { namespace algorithms {
       int kysize = kernel_size_[0];
 
       // Calculate the local mean at every point
-      for (std::size_t j = 0, k = 0; j < ysize; ++j) {
+      DIALS_ASSERT(row0 <= row1 && row1 <= ysize);
+      for (std::size_t j = row0, k = row0 * xsize; j < row1; ++j) {
         for (std::size_t i = 0; i < xsize; ++i, ++k) {
           int i0 = i - kxsize - 1, i1 = i + kxsize;
           int j0 = j - kysize - 1, j1 = j + kysize;
@@ -502,18 +513,22 @@ namespace dials { namespace algorithms {
     }
 
     /**
-     * Compute the threshold
+     * Compute the threshold for a band of rows
      * @param src - The input array
      * @param mask - The mask array
      * @param gain - The gain array
      * @param dst The output array
+     * @param row0 The first row
+     * @param row1 The last row (exclusive)
      */
     template <typename T>
-    void compute_threshold(af::ref<Data<T> > table,
-                           const af::const_ref<T, af::c_grid<2> > &src,
-                           const af::const_ref<bool, af::c_grid<2> > &mask,
-                           const af::const_ref<double, af::c_grid<2> > &gain,
-                           af::ref<bool, af::c_grid<2> > dst) {
+    void compute_threshold_w_gain(af::ref<Data<T> > table,
+                                  const af::const_ref<T, af::c_grid<2> > &src,
+                                  const af::const_ref<bool, af::c_grid<2> > &mask,
+                                  const af::const_ref<double, af::c_grid<2> > &gain,
+                                  af::ref<bool, af::c_grid<2> > dst,
+                                  std::size_t row0,
+                                  std::size_t row1) {
       // Get the size of the image
       std::size_t ysize = src.accessor()[0];
       std::size_t xsize = src.accessor()[1];
@@ -523,7 +538,8 @@ namespace dials { namespace algorithms {
       int kysize = kernel_size_[0];
 
       // Calculate the local mean at every point
-      for (std::size_t j = 0, k = 0; j < ysize; ++j) {
+      DIALS_ASSERT(row0 <= row1 && row1 <= ysize);
+      for (std::size_t j = row0, k = row0 * xsize; j < row1; ++j) {
         for (std::size_t i = 0; i < xsize; ++i, ++k) {
           int i0 = i - kxsize - 1, i1 = i + kxsize;
           int j0 = j - kysize - 1, j1 = j + kysize;
@@ -598,8 +614,28 @@ namespace dials { namespace algorithms {
       // compute the summed area table
       compute_sat(table, src, mask);
 
-      // Compute the image threshold
-      compute_threshold(table, src, mask, dst);
+      // Compute the image threshold, splitting the rows between threads. The
+      // summed area table is shared so the result does not depend on the
+      // number of threads.
+      std::size_t ysize = src.accessor()[0];
+      std::size_t nthreads = std::min(nthreads_, ysize);
+      if (nthreads <= 1) {
+        compute_threshold(table, src, mask, dst, 0, ysize);
+      } else {
+        boost::thread_group threads;
+        for (std::size_t t = 0; t < nthreads; ++t) {
+          threads.create_thread(
+            boost::bind(&DispersionThreshold::compute_threshold<T>,
+                        this,
+                        table,
+                        src,
+                        mask,
+                        dst,
+                        t * ysize / nthreads,
+                        (t + 1) * ysize / nthreads));
+        }
+        threads.join_all();
+      }
     }
 
     /**
@@ -629,8 +665,27 @@ namespace dials { namespace algorithms {
       // compute the summed area table
       compute_sat(table, src, mask);
 
-      // Compute the image threshold
-      compute_threshold(table, src, mask, gain, dst);
+      // Compute the image threshold, splitting the rows between threads
+      std::size_t ysize = src.accessor()[0];
+      std::size_t nthreads = std::min(nthreads_, ysize);
+      if (nthreads <= 1) {
+        compute_threshold_w_gain(table, src, mask, gain, dst, 0, ysize);
+      } else {
+        boost::thread_group threads;
+        for (std::size_t t = 0; t < nthreads; ++t) {
+          threads.create_thread(
+            boost::bind(&DispersionThreshold::compute_threshold_w_gain<T>,
+                        this,
+                        table,
+                        src,
+                        mask,
+                        gain,
+                        dst,
+                        t * ysize / nthreads,
+                        (t + 1) * ysize / nthreads));
+        }
+        threads.join_all();
+      }
     }
 
   private:
@@ -640,6 +695,7 @@ namespace dials { namespace algorithms {
     double nsig_s_;
     double threshold_;
     int min_count_;
+    std::size_t nthreads_;
     std::vector<char> buffer_;
   };
 
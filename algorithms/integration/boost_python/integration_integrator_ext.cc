@@ -254,6 +254,7 @@ namespace dials { namespace algorithms { namespace boost_python {
       .def("finished", &ReflectionManager::finished)
       .def("accumulate", &ReflectionManager::accumulate)
       .def("split", &ReflectionManager::split)
+      .def("indices", &ReflectionManager::indices)
       .def("job", &ReflectionManager::job, return_internal_reference<>())
       .def("data", &ReflectionManager::data)
       .def("num_reflections", &ReflectionManager::num_reflections);
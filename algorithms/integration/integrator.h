@@ -544,6 +544,15 @@ namespace dials { namespace algorithms {
       return lookup_.indices(index).size();
     }
 
+    /**
+     * @returns The indices of the reflections in a particular block.
+     */
+    af::shared<std::size_t> indices(std::size_t index) const {
+      DIALS_ASSERT(index < finished_.size());
+      af::const_ref<std::size_t> ind = lookup_.indices(index);
+      return af::shared<std::size_t>(ind.begin(), ind.end());
+    }
+
     /**
      * @returns The reflections for a particular block.
      */
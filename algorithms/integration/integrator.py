@@ -6,6 +6,7 @@
 import math
 import random
 
+import libtbx
 import six
 import six.moves.cPickle as pickle
 
@@ -173,6 +174,13 @@ def generate_phil_scope():
           .type = bool
           .help = "Split shoeboxes into different files"
 
+        format = *refl store
+          .type = choice
+          .help = "The format of the saved shoeboxes. 'refl' writes reflection"
+                  "files; 'store' writes an indexed, compressed shoebox store"
+                  "(shoeboxes_*.sbx) which can be read back block by block,"
+                  "by image range or by reflection id."
+
       }
 
       integrator = *auto 3d flat3d 2d single2d stills 3d_threaded
@@ -233,6 +241,12 @@ def generate_phil_scope():
         nproc = 1
           .type = int(value_min=1)
           .help = "The number of processes to use per cluster job"
+
+        shared_memory = True
+          .type = bool
+          .help = "Pass the reflections to local worker processes in shared"
+                  "memory, rather than a copy to each. Requires Python 3.8."
+          .expert_level = 2
       }
 
       summation {
@@ -380,6 +394,7 @@ def from_phil(params):
         mp.method = params.mp.method
         mp.nproc = params.mp.nproc
         mp.njobs = params.mp.njobs
+        mp.shared_memory = params.mp.shared_memory
 
         # Set the lookup parameters
         lookup = processor.Lookup()
@@ -401,6 +416,7 @@ def from_phil(params):
             result.modelling.debug.output = params.debug.output
         result.modelling.debug.select = params.debug.select
         result.modelling.debug.separate_files = True
+        result.modelling.debug.format = params.debug.format
 
         # Set the integration processor parameters
         result.integration.mp = mp
@@ -410,6 +426,7 @@ def from_phil(params):
             result.integration.debug.output = params.debug.output
         result.integration.debug.select = params.debug.select
         result.integration.debug.separate_files = params.debug.separate_files
+        result.integration.debug.format = params.debug.format
         result.integration.summation = params.summation
 
         result.debug_reference_filename = params.debug.reference.filename
@@ -959,15 +976,19 @@ def __init__(self, experiments, reflections, params):
         self.profile_model_report = None
         self.integration_report = None
 
-    def integrate(self):
+    def integrate(self, profile_fitter=libtbx.Auto):
         """
         Integrate the data
+
+        :param profile_fitter: The reference profiles from model_profiles(), or
+                               Auto to model them from the reference spots
         """
         # Ensure we get the same random sample each time
         random.seed(0)
 
         # Init the report
-        self.profile_model_report = None
+        if profile_fitter is libtbx.Auto:
+            self.profile_model_report = None
         self.integration_report = None
 
         # Heading
@@ -1006,6 +1027,63 @@ def integrate(self):
         # Initialize the reflections
         self.initialize_reflections(self.experiments, self.params, self.reflections)
 
+        # Do profile modelling, unless given the reference profiles
+        if profile_fitter is libtbx.Auto:
+            profile_fitter = self._model_profiles()
+
+        logger.info("=" * 80)
+        logger.info("")
+        logger.info(heading("Integrating reflections"))
+        logger.info("")
+
+        # Create the data processor
+        executor = IntegratorExecutor(self.experiments, profile_fitter)
+        processor = build_processor(
+            self.ProcessorClass,
+            self.experiments,
+            self.reflections,
+            self.params.integration,
+        )
+        processor.executor = executor
+
+        # Process the reflections
+        self.reflections, _, time_info = processor.process()
+
+        # Finalize the reflections
+        self.reflections, self.experiments = self.finalize_reflections(
+            self.reflections, self.experiments, self.params
+        )
+
+        # Create the integration report
+        self.integration_report = IntegrationReport(self.experiments, self.reflections)
+        logger.info("")
+        logger.info(self.integration_report.as_str(prefix=" "))
+
+        # Print the time info
+        logger.info("Timing information for integration")
+        logger.info(str(time_info))
+        logger.info("")
+
+        # Return the reflections
+        return self.reflections
+
+    def model_profiles(self):
+        """
+        Model the reference profiles from the reference spots, without
+        integrating the reflections. The profiles can then be used to
+        integrate other reflections from the same experiments.
+
+        :return: The reference profiles, or None if not fitting profiles
+        """
+        random.seed(0)
+        self.profile_model_report = None
+        self.initialize_reflections(self.experiments, self.params, self.reflections)
+        return self._model_profiles()
+
+    def _model_profiles(self):
+        """
+        Model the reference profiles from the reference spots
+        """
         # Check if we want to do some profile fitting
         fitting_class = [e.profile.fitting_class() for e in self.experiments]
         fitting_avail = all(c is not None for c in fitting_class)
@@ -1177,41 +1255,7 @@ def integrate(self):
                 # Set to the finalized fitter
                 profile_fitter = finalized_profile_fitter
 
-        logger.info("=" * 80)
-        logger.info("")
-        logger.info(heading("Integrating reflections"))
-        logger.info("")
-
-        # Create the data processor
-        executor = IntegratorExecutor(self.experiments, profile_fitter)
-        processor = build_processor(
-            self.ProcessorClass,
-            self.experiments,
-            self.reflections,
-            self.params.integration,
-        )
-        processor.executor = executor
-
-        # Process the reflections
-        self.reflections, _, time_info = processor.process()
-
-        # Finalize the reflections
-        self.reflections, self.experiments = self.finalize_reflections(
-            self.reflections, self.experiments, self.params
-        )
-
-        # Create the integration report
-        self.integration_report = IntegrationReport(self.experiments, self.reflections)
-        logger.info("")
-        logger.info(self.integration_report.as_str(prefix=" "))
-
-        # Print the time info
-        logger.info("Timing information for integration")
-        logger.info(str(time_info))
-        logger.info("")
-
-        # Return the reflections
-        return self.reflections
+        return profile_fitter
 
     def report(self):
         """
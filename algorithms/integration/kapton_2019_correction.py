@@ -6,6 +6,7 @@
 from dials.array_family import flex
 from dials.algorithms.integration.kapton_correction import get_absorption_correction
 from dials.algorithms.shoebox import MaskCode
+from libtbx import easy_mp
 from scitbx.matrix import col
 
 logging.basicConfig()
@@ -90,6 +91,12 @@ def create_kapton_face(ori, fast, slow, image_size, pixel_size, name):
         rH = rH + offset
         # Store these edge points if needed later
         self.edge_points = [rA, rB, rC, rD, rE, rF, rG, rH]
+        # Describe the tape as a box with corner rB and three orthogonal edges
+        # so that path lengths can be computed for many rays at once
+        self.box_origin = rB
+        self.box_edges = [
+            ((r - rB).normalize(), (r - rB).length()) for r in (rA, rC, rF)
+        ]
         # Now set up the 6 faces
         faces = []
         px_off = 0
@@ -179,6 +186,39 @@ def get_kapton_path_mm(self, s1):
                 )
         return max(kapton_path_mm)
 
+    def get_kapton_path_mm_flex(self, s1_flex):
+        """Get the kapton path lengths traversed by an array of s1 vectors.
+
+        The tape is treated as a box, and each ray from the crystal is clipped
+        against the three pairs of parallel faces at once (the slab method), so
+        that the whole array is processed with a handful of vectorised
+        operations rather than a ray-panel intersection per face per vector.
+        Rays that miss the tape have a path length of zero."""
+        n = len(s1_flex)
+        t_near = flex.double(n, 0.0)
+        t_far = flex.double(n, float("inf"))
+        for axis, length in self.box_edges:
+            offset = self.box_origin.dot(axis)
+            d = s1_flex.dot(axis.elems)
+            # Rays parallel to a pair of faces are either always or never
+            # between them; a tiny component gives the same answer
+            tiny = flex.abs(d) < 1e-12
+            d.set_selected(tiny, 1e-12)
+            t1 = offset / d
+            t2 = (offset + length) / d
+            swap = t2 < t1
+            t_min = t1.deep_copy()
+            t_min.set_selected(swap, t2.select(swap))
+            t_max = t2
+            t_max.set_selected(swap, t1.select(swap))
+            sel = t_min > t_near
+            t_near.set_selected(sel, t_min.select(sel))
+            sel = t_max < t_far
+            t_far.set_selected(sel, t_max.select(sel))
+        kapton_path_mm = (t_far - t_near) * s1_flex.norms()
+        kapton_path_mm.set_selected(t_far <= t_near, 0.0)
+        return kapton_path_mm
+
     def abs_correction(self, s1):
         """Compute absorption correction using beers law. Takes in a tuple for a single s1 vector and does absorption correction"""
         kapton_path_mm = self.get_kapton_path_mm(s1)
@@ -191,19 +231,11 @@ def abs_correction(self, s1):
     def abs_correction_flex(self, s1_flex):
         """ Compute the absorption correction using beers law. Takes in a flex array of s1 vectors, determines path lengths for each
             and then determines absorption correction for each s1 vector """
-        kapton_faces = self.faces
-        from dials.algorithms.integration import get_kapton_path_cpp
-
-        # new style, much faster
-        kapton_path_mm = get_kapton_path_cpp(kapton_faces, s1_flex)
-        # old style, really slow
-        # for s1 in s1_flex:
-        #  kapton_path_mm.append(self.get_kapton_path_mm(s1))
+        kapton_path_mm = self.get_kapton_path_mm_flex(s1_flex)
         # determine absorption correction
-        if kapton_path_mm is not None:
-            absorption_correction = 1 / flex.exp(
-                -self.abs_coeff * kapton_path_mm
-            )  # unitless, >=1
+        absorption_correction = 1 / flex.exp(
+            -self.abs_coeff * kapton_path_mm
+        )  # unitless, >=1
         return absorption_correction
 
     def distance_of_point_from_line(self, r0, r1, r2):
@@ -427,7 +459,7 @@ def __init__(
         self.expt = expt
         self.refl = refl
         self.smart_sigmas = smart_sigmas
-        self.logger = logger
+        self.logger = logger or logging.getLogger(__name__)
         self.extract_params()
 
     def extract_params(self):
@@ -485,27 +517,38 @@ def correction_and_within_spot_sigma(params_version, variance_within_spot=True):
             )  # std dev of corrections for pixels within a spot, default sigma
 
             if variance_within_spot:
+                # Gather the foreground pixels of every spot, grouped by panel,
+                # and compute all of their corrections in a single pass
                 mask_code = MaskCode.Foreground | MaskCode.Valid
-                for iref in range(len(self.reflections_sele)):
-                    kapton_correction_vector = flex.double()
-                    # foreground: integration mask
-                    shoebox = self.reflections_sele[iref]["shoebox"]
-                    foreground = (
-                        (shoebox.mask.as_1d() & mask_code) == mask_code
-                    ).iselection()
-                    f_absolute, s_absolute, z_absolute = (
-                        shoebox.coords().select(foreground).parts()
-                    )
-                    panel_number = self.reflections_sele[iref]["panel"]
-                    lab_coords = detector[panel_number].get_lab_coord(
-                        detector[panel_number].pixel_to_millimeter(
-                            flex.vec2_double(f_absolute, s_absolute)
+                shoeboxes = self.reflections_sele["shoebox"]
+                panels = self.reflections_sele["panel"]
+                spans = [None] * len(self.reflections_sele)
+                pixel_s1 = flex.vec3_double()
+                for panel_number in sorted(set(panels)):
+                    fast, slow = flex.double(), flex.double()
+                    for iref in (panels == panel_number).iselection():
+                        shoebox = shoeboxes[iref]
+                        # foreground: integration mask
+                        foreground = (
+                            (shoebox.mask.as_1d() & mask_code) == mask_code
+                        ).iselection()
+                        f_absolute, s_absolute, z_absolute = (
+                            shoebox.coords().select(foreground).parts()
                         )
+                        start = len(pixel_s1) + len(fast)
+                        spans[iref] = (start, start + len(foreground))
+                        fast.extend(f_absolute)
+                        slow.extend(s_absolute)
+                    panel = detector[panel_number]
+                    lab_coords = panel.get_lab_coord(
+                        panel.pixel_to_millimeter(flex.vec2_double(fast, slow))
                     )
-                    s1 = lab_coords.each_normalize()
-                    # Real step right here
-                    kapton_correction_vector.extend(absorption.abs_correction_flex(s1))
-                    #
+                    pixel_s1.extend(lab_coords.each_normalize())
+                # Real step right here
+                pixel_corrections = absorption.abs_correction_flex(pixel_s1)
+
+                for start, end in spans:
+                    kapton_correction_vector = pixel_corrections[start:end]
                     average_kapton_correction = flex.mean(kapton_correction_vector)
                     absorption_corrections.append(average_kapton_correction)
                     try:
@@ -558,86 +601,106 @@ def correction_and_within_spot_sigma(params_version, variance_within_spot=True):
         return corrections, sigmas
 
 
+def _correct_experiment(expt, refl, params, logger=None):
+    """Apply the kapton correction to the reflections of one experiment."""
+    # extract experiment details
+    detector = expt.detector
+    panels = [p for p in detector]
+    panel_size_px = [p.get_image_size() for p in panels]
+    pixel_size_mm = [p.get_pixel_size()[0] for p in panels]
+    detector_dist_mm = [p.get_distance() for p in panels]
+    beam = expt.beam
+    wavelength_ang = beam.get_wavelength()
+
+    # exclude reflections with no foreground pixels
+    refl_valid = refl.select(
+        refl["num_pixels.valid"] > 0 and refl["num_pixels.foreground"] > 0
+    )
+    refl_zero = refl_valid.select(refl_valid["intensity.sum.value"] == 0)
+    refl_nonzero = refl_valid.select(refl_valid["intensity.sum.value"] != 0)
+
+    def correct(refl_sele, smart_sigmas=True):
+        kapton_correction = image_kapton_correction(
+            panel_size_px=panel_size_px,
+            pixel_size_mm=pixel_size_mm,
+            detector_dist_mm=detector_dist_mm,
+            wavelength_ang=wavelength_ang,
+            reflections_sele=refl_sele,
+            params=params,
+            expt=expt,
+            refl=refl,
+            smart_sigmas=smart_sigmas,
+            logger=logger,
+        )
+
+        k_corr, k_sigmas = kapton_correction()
+        refl_sele["kapton_absorption_correction"] = k_corr
+        if smart_sigmas:
+            refl_sele["kapton_absorption_correction_sigmas"] = k_sigmas
+            # apply corrections and propagate error
+            # term1 = (sig(C)/C)^2
+            # term2 = (sig(Imeas)/Imeas)^2
+            # I' = C*I
+            # sig^2(I') = (I')^2*(term1 + term2)
+            integrated_data = refl_sele["intensity.sum.value"]
+            integrated_variance = refl_sele["intensity.sum.variance"]
+            integrated_sigma = flex.sqrt(integrated_variance)
+            term1 = flex.pow(k_sigmas / k_corr, 2)
+            term2 = flex.pow(integrated_sigma / integrated_data, 2)
+            integrated_data *= k_corr
+            integrated_variance = flex.pow(integrated_data, 2) * (term1 + term2)
+            refl_sele["intensity.sum.value"] = integrated_data
+            refl_sele["intensity.sum.variance"] = integrated_variance
+            # order is purposeful: the two lines above require that integrated_data
+            # has already been corrected!
+        else:
+            refl_sele["intensity.sum.value"] *= k_corr
+            refl_sele["intensity.sum.variance"] *= flex.pow2(k_corr)
+        return refl_sele
+
+    corrected = flex.reflection_table()
+    if len(refl_zero) > 0 and params.smart_sigmas:
+        # process nonzero intensity reflections with smart sigmas as requested
+        # but turn them off for zero intensity reflections to avoid a division by zero
+        # during error propogation. Not at all certain this is the best way.
+        corrected.extend(correct(refl_nonzero, smart_sigmas=True))
+        corrected.extend(correct(refl_zero, smart_sigmas=False))
+    else:
+        corrected.extend(correct(refl_valid, smart_sigmas=params.smart_sigmas))
+    return corrected
+
+
 class multi_kapton_correction(object):
-    def __init__(self, experiments, integrated, kapton_params, logger=None):
+    def __init__(self, experiments, integrated, kapton_params, logger=None, nproc=1):
         self.experiments = experiments
         self.reflections = integrated
         self.params = kapton_params
         self.logger = logger
+        self.nproc = nproc
 
     def __call__(self):
         self.corrected_reflections = flex.reflection_table()
-        for expt, refl in zip(
-            self.experiments, self.reflections.split_by_experiment_id()
-        ):
-            # extract experiment details
-            detector = expt.detector
-            panels = [p for p in detector]
-            panel_size_px = [p.get_image_size() for p in panels]
-            pixel_size_mm = [p.get_pixel_size()[0] for p in panels]
-            detector_dist_mm = [p.get_distance() for p in panels]
-            beam = expt.beam
-            wavelength_ang = beam.get_wavelength()
-
-            # exclude reflections with no foreground pixels
-            refl_valid = refl.select(
-                refl["num_pixels.valid"] > 0 and refl["num_pixels.foreground"] > 0
+        tables = self.reflections.split_by_experiment_id()
+        if self.nproc > 1 and len(self.experiments) > 1:
+            # Experiments are independent, so correct them in separate processes.
+            # Loggers cannot be sent to the workers; they log to the module logger.
+            results = easy_mp.parallel_map(
+                _correct_experiment,
+                [
+                    (expt, refl, self.params)
+                    for expt, refl in zip(self.experiments, tables)
+                ],
+                processes=self.nproc,
+                iterable_type=easy_mp.posiargs,
+                method="multiprocessing",
+                preserve_exception_message=True,
             )
-            refl_zero = refl_valid.select(refl_valid["intensity.sum.value"] == 0)
-            refl_nonzero = refl_valid.select(refl_valid["intensity.sum.value"] != 0)
-
-            def correct(refl_sele, smart_sigmas=True):
-                kapton_correction = image_kapton_correction(
-                    panel_size_px=panel_size_px,
-                    pixel_size_mm=pixel_size_mm,
-                    detector_dist_mm=detector_dist_mm,
-                    wavelength_ang=wavelength_ang,
-                    reflections_sele=refl_sele,
-                    params=self.params,
-                    expt=expt,
-                    refl=refl,
-                    smart_sigmas=smart_sigmas,
-                    logger=self.logger,
-                )
-
-                k_corr, k_sigmas = kapton_correction()
-                refl_sele["kapton_absorption_correction"] = k_corr
-                if smart_sigmas:
-                    refl_sele["kapton_absorption_correction_sigmas"] = k_sigmas
-                    # apply corrections and propagate error
-                    # term1 = (sig(C)/C)^2
-                    # term2 = (sig(Imeas)/Imeas)^2
-                    # I' = C*I
-                    # sig^2(I') = (I')^2*(term1 + term2)
-                    integrated_data = refl_sele["intensity.sum.value"]
-                    integrated_variance = refl_sele["intensity.sum.variance"]
-                    integrated_sigma = flex.sqrt(integrated_variance)
-                    term1 = flex.pow(k_sigmas / k_corr, 2)
-                    term2 = flex.pow(integrated_sigma / integrated_data, 2)
-                    integrated_data *= k_corr
-                    integrated_variance = flex.pow(integrated_data, 2) * (term1 + term2)
-                    refl_sele["intensity.sum.value"] = integrated_data
-                    refl_sele["intensity.sum.variance"] = integrated_variance
-                    # order is purposeful: the two lines above require that integrated_data
-                    # has already been corrected!
-                else:
-                    refl_sele["intensity.sum.value"] *= k_corr
-                    refl_sele["intensity.sum.variance"] *= flex.pow2(k_corr)
-                return refl_sele
-
-            if len(refl_zero) > 0 and self.params.smart_sigmas:
-                # process nonzero intensity reflections with smart sigmas as requested
-                # but turn them off for zero intensity reflections to avoid a division by zero
-                # during error propogation. Not at all certain this is the best way.
-                self.corrected_reflections.extend(
-                    correct(refl_nonzero, smart_sigmas=True)
-                )
-                self.corrected_reflections.extend(
-                    correct(refl_zero, smart_sigmas=False)
-                )
-            else:
-                self.corrected_reflections.extend(
-                    correct(refl_valid, smart_sigmas=self.params.smart_sigmas)
-                )
+        else:
+            results = [
+                _correct_experiment(expt, refl, self.params, logger=self.logger)
+                for expt, refl in zip(self.experiments, tables)
+            ]
+        for corrected in results:
+            self.corrected_reflections.extend(corrected)
 
         return self.experiments, self.corrected_reflections
@@ -3,13 +3,16 @@
 import logging
 import math
 
+import numpy
 import psutil
 
 from libtbx import Auto
+from scitbx.array_family import shared
 
 import dials.algorithms.integration
 from dials.algorithms.integration.processor import execute_parallel_task
 from dials.algorithms.integration.processor import NullTask
+from dials.algorithms.integration.processor import save_debug_shoeboxes
 from dials.array_family import flex
 from dials.util import tabulate
 from dials.util.mp import multi_node_parallel_map
@@ -281,32 +284,250 @@ def create(experiments, params=None):
         return algorithm
 
 
-def _assert_enough_memory(required_memory, max_memory_usage):
+def _log_memory(required_memory):
     """
-    Check there is enough memory available or fail
+    Log the memory about to be allocated, with a warning if it is more than
+    is currently free
 
     :param required_memory: The required number of bytes
-    :param max_memory_usage: The maximum memory usage allowed
     """
-    total_memory = psutil.virtual_memory().total
+    available_memory = psutil.virtual_memory().available
+    if required_memory > available_memory:
+        logger.warning(
+            "Allocating %.1f MB memory but only %.1f MB is currently free",
+            required_memory / 1e6,
+            available_memory / 1e6,
+        )
+    else:
+        logger.info("Allocating %.1f MB memory", required_memory / 1e6)
+
+
+def _available_memory(max_memory_usage):
+    """
+    Get the number of bytes that may be used, based on the memory that is
+    currently free rather than the total system memory, so that other jobs
+    running on the same machine are taken into account.
+
+    :param max_memory_usage: The maximum fraction of free memory to use
+    :returns: The number of bytes
+    """
     assert max_memory_usage > 0.0, "maximum memory usage must be > 0"
     assert max_memory_usage <= 1.0, "maximum memory usage must be <= 1"
-    limit_memory = total_memory * max_memory_usage
-    if required_memory > limit_memory:
-        raise RuntimeError(
-            """
+    return int(math.floor(psutil.virtual_memory().available * max_memory_usage))
+
+
+# Bytes per shoebox pixel: float data, float background and int mask
+SHOEBOX_BYTES_PER_PIXEL = 12
+
+
+def estimate_shoebox_memory(reflections, array_range):
+    """
+    Estimate the memory needed for the shoeboxes predicted on each frame.
+
+    The shoebox of each reflection is assigned to the frame at the centre of
+    its bounding box.
+
+    :param reflections: The reflections with bounding boxes
+    :param array_range: The (first, last) frame range
+    :returns: A numpy array of the number of bytes for each frame
+    """
+    frame0, frame1 = array_range
+    assert frame1 > frame0
+    x0, x1, y0, y1, z0, z1 = [p.as_numpy_array() for p in reflections["bbox"].parts()]
+    npixels = (x1 - x0).astype(numpy.int64) * (y1 - y0) * (z1 - z0)
+    frame = numpy.clip((z0 + z1) // 2, frame0, frame1 - 1) - frame0
+    return numpy.bincount(
+        frame, weights=npixels * SHOEBOX_BYTES_PER_PIXEL, minlength=frame1 - frame0,
+    )
+
+
+def compute_adaptive_blocks(
+    array_range,
+    block_size,
+    image_memory,
+    frame_memory=None,
+    max_memory=None,
+    min_block_size=1,
+):
+    """
+    Compute a list of half-overlapping blocks of frames that each fit in memory.
+
+    With no memory limit the blocks are the same as those computed by
+    SimpleBlockList. Otherwise, where the image buffer and the shoeboxes of a
+    block would not fit in the available memory, the block is shrunk so that
+    dense regions of the sweep are processed in smaller blocks.
+
+    :param array_range: The (first, last) frame range
+    :param block_size: The maximum number of frames in a block
+    :param image_memory: The number of bytes needed to buffer one frame
+    :param frame_memory: The number of bytes of shoeboxes on each frame
+    :param max_memory: The maximum number of bytes for each block
+    :param min_block_size: The minimum number of frames in a shrunk block
+    :returns: The list of (first, last) frame ranges
+    """
+    frame0, frame1 = array_range
+    nframes = frame1 - frame0
+    assert nframes > 0, "Invalid frame range"
+    block_size = max(1, min(int(block_size), nframes))
+    if block_size == 1:
+        return [(f, f + 1) for f in range(frame0, frame1)]
+
+    # Divide the frames between blocks as evenly as possible
+    nblocks = int(math.ceil(2.0 * nframes / block_size))
+    half_block_size = int(math.ceil(nframes / nblocks))
+
+    if frame_memory is None:
+        frame_memory = numpy.zeros(nframes)
+    assert len(frame_memory) == nframes
+    cumulative = numpy.concatenate(([0], numpy.cumsum(frame_memory)))
+
+    def required_memory(z0, z1):
+        return image_memory * (z1 - z0) + (
+            cumulative[z1 - frame0] - cumulative[z0 - frame0]
+        )
+
+    # Each block spans two steps, so shrink the next step until the block
+    # ending there fits, down to the minimum block size
+    min_block_size = max(1, min(int(min_block_size), block_size))
+    indices = [frame0]
+    while indices[-1] < frame1:
+        first = indices[-2] if len(indices) > 1 else indices[-1]
+        last = indices[-1]
+        frame = min(last + half_block_size, frame1)
+        if max_memory is not None:
+            while (
+                frame > last + 1
+                and frame - first > min_block_size
+                and required_memory(first, frame) > max_memory
+            ):
+                frame -= 1
+        indices.append(frame)
+
+    if len(indices) == 2:
+        return [tuple(indices)]
+    return [(indices[i], indices[i + 2]) for i in range(len(indices) - 2)]
+
+
+def fit_blocks_in_memory(
+    array_range,
+    block_size,
+    image_memory,
+    frame_memory,
+    available_memory,
+    njobs=1,
+    min_block_size=1,
+):
+    """
+    Compute blocks of frames and a number of concurrent jobs that fit in memory.
+
+    The blocks are shrunk first, down to the minimum block size, and then the
+    number of jobs is reduced, until the memory needed by the largest block
+    of each job fits in the available memory. An error is raised if even the
+    smallest blocks do not fit for a single job.
+
+    :param array_range: The (first, last) frame range
+    :param block_size: The maximum number of frames in a block
+    :param image_memory: The number of bytes needed to buffer one frame
+    :param frame_memory: The number of bytes of shoeboxes on each frame
+    :param available_memory: The number of bytes available to all jobs
+    :param njobs: The requested number of concurrent jobs
+    :param min_block_size: The minimum number of frames in a block
+    :returns: The list of blocks, the memory needed by the largest block and
+              the number of jobs
+    """
+    frame0 = array_range[0]
+    cumulative = numpy.concatenate(([0], numpy.cumsum(frame_memory)))
+
+    def required_memory(blocks):
+        return int(
+            max(
+                image_memory * (z1 - z0)
+                + cumulative[z1 - frame0]
+                - cumulative[z0 - frame0]
+                for z0, z1 in blocks
+            )
+        )
+
+    # Only the last step of a block can be shrunk locally, so also try smaller
+    # blocks throughout before giving up on a number of jobs
+    min_block_size = max(1, min(int(min_block_size), int(block_size)))
+    for n in range(max(1, njobs), 0, -1):
+        max_memory = available_memory // n
+        for size in range(int(block_size), min_block_size - 1, -1):
+            blocks = compute_adaptive_blocks(
+                array_range,
+                size,
+                image_memory,
+                frame_memory,
+                max_memory,
+                min_block_size,
+            )
+            required = required_memory(blocks)
+            if required <= max_memory:
+                return blocks, required, n
+    raise RuntimeError(
+        """
     There was a problem allocating memory for image data. Possible solutions
     include increasing the percentage of memory allowed for shoeboxes or
-    decreasing the block size. This could also be caused by a highly mosaic
-    crystal model - is your crystal really this mosaic?
-      Total system memory: %.1f GB
-      Limit image memory: %.1f GB
+    freeing up memory used by other processes. This could also be caused by
+    a highly mosaic crystal model - is your crystal really this mosaic?
+      Free image memory: %.1f GB
       Required image memory: %.1f GB
     """
-            % (total_memory / 1e9, limit_memory / 1e9, required_memory / 1e9)
+        % (available_memory / 1e9, required / 1e9)
+    )
+
+
+def compute_block_list(reflections, imageset, block_size, params):
+    """
+    Compute the processing blocks and the number of concurrent jobs.
+
+    The blocks are sized so that the image buffer and the estimated shoebox
+    memory of each block fits in the currently free memory, shared between the
+    concurrent jobs. Blocks are never shrunk below the frame range of the
+    longest reflection, so that no more reflections are split into partials.
+
+    :param reflections: The reflections with bounding boxes
+    :param imageset: The imageset
+    :param block_size: The maximum number of frames in a block
+    :param params: The integration parameters
+    :returns: The SimpleBlockList, the maximum required memory of a block and
+              the number of jobs
+    """
+    array_range = imageset.get_array_range()
+    image_memory = MultiThreadedIntegrator.compute_required_memory(imageset, 1)
+    frame_memory = estimate_shoebox_memory(reflections, array_range)
+    available_memory = _available_memory(params.integration.block.max_memory_usage)
+    _, _, _, _, z0, z1 = reflections["bbox"].parts()
+    min_block_size = flex.max(z1 - z0) if len(reflections) else 1
+    mp = params.integration.mp
+    njobs = mp.njobs if mp.method == "multiprocessing" else 1
+    blocks, required, max_njobs = fit_blocks_in_memory(
+        array_range,
+        block_size,
+        image_memory,
+        frame_memory,
+        available_memory,
+        njobs,
+        min_block_size,
+    )
+    nominal = compute_adaptive_blocks(array_range, block_size, image_memory)
+    if len(blocks) > len(nominal):
+        logger.info(
+            "Splitting dense regions into smaller blocks to fit in memory (%d blocks rather than %d)",
+            len(blocks),
+            len(nominal),
+        )
+    if max_njobs < njobs:
+        logger.warning(
+            "Reducing the number of jobs from %d to %d to fit in free memory",
+            njobs,
+            max_njobs,
         )
+        njobs = max_njobs
     else:
-        logger.info("Allocating %.1f MB memory", required_memory / 1e6)
+        njobs = mp.njobs
+    return SimpleBlockList(shared.tiny_int_2(blocks)), required, njobs
 
 
 class IntegrationJob(object):
@@ -383,11 +604,8 @@ def __call__(self):
         except Exception:
             raise RuntimeError("Programmer Error: bad array range")
 
-        # Check the memory requirements
-        _assert_enough_memory(
-            self.compute_required_memory(imageset),
-            self.params.integration.block.max_memory_usage,
-        )
+        # Log the memory requirements
+        _log_memory(self.compute_required_memory(imageset))
 
         # Integrate
         self.integrate(imageset)
@@ -501,16 +719,7 @@ def write_debug_files(self):
         # Optionally save the shoeboxes
         debug = self.params.integration.debug
         if debug.output and debug.separate_files:
-            output = self.reflections
-            if debug.select is not None:
-                output = output.select(debug.select(output))
-            if debug.split_experiments:
-                output = output.split_by_experiment_id()
-                for table in output:
-                    i = table["id"][0]
-                    table.as_file("shoeboxes_%d_%d.refl" % (self.index, i))
-            else:
-                output.as_file("shoeboxes_%d.refl" % self.index)
+            save_debug_shoeboxes(self.reflections, self.index, debug)
 
         # Delete the shoeboxes
         if debug.separate_files or not debug.output:
@@ -691,14 +900,15 @@ def compute_blocks(self):
             else:
                 raise RuntimeError("Unknown block_size unit %r" % block.units)
             if block_size > max_block_size:
-                raise RuntimeError(
-                    """
-          The requested block size (%s) is larger than the maximum allowable block
-          size (%s). Either decrease the requested block size or increase the
-          amount of available memory.
-        """
-                    % (block_size, max_block_size)
+                logger.warning(
+                    "Requested block size (%s) > maximum block size (%s).",
+                    block_size,
+                    max_block_size,
                 )
+                logger.warning(
+                    "Setting block size to maximum; some reflections may be partial"
+                )
+                block_size = max_block_size
         block.size = block_size
         block.units = "frames"
 
@@ -707,11 +917,14 @@ def compute_jobs(self):
         Compute the jobs
         """
         imageset = self.experiments[0].imageset
-        array_range = imageset.get_array_range()
         block = self.params.integration.block
         assert block.units == "frames"
         assert block.size > 0
-        self.blocks = SimpleBlockList(array_range, block.size)
+        (
+            self.blocks,
+            self.required_memory,
+            self.params.integration.mp.njobs,
+        ) = compute_block_list(self.reflections, imageset, block.size, self.params)
         assert len(self.blocks) > 0, "Invalid number of jobs"
 
     def summary(self):
@@ -839,11 +1052,8 @@ def __call__(self):
         except Exception:
             raise RuntimeError("Programmer Error: bad array range")
 
-        # Check the memory requirements
-        _assert_enough_memory(
-            self.compute_required_memory(imageset),
-            self.params.integration.block.max_memory_usage,
-        )
+        # Log the memory requirements
+        _log_memory(self.compute_required_memory(imageset))
 
         # Integrate
         self.compute_reference_profiles(imageset)
@@ -970,16 +1180,7 @@ def write_debug_files(self):
         # Optionally save the shoeboxes
         debug = self.params.integration.debug
         if debug.output and debug.separate_files:
-            output = self.reflections
-            if debug.select is not None:
-                output = output.select(debug.select(output))
-            if debug.split_experiments:
-                output = output.split_by_experiment_id()
-                for table in output:
-                    i = table["id"][0]
-                    table.as_file("shoeboxes_%d_%d.refl" % (self.index, i))
-            else:
-                output.as_file("shoeboxes_%d.refl" % self.index)
+            save_debug_shoeboxes(self.reflections, self.index, debug)
 
         # Delete the shoeboxes
         if debug.separate_files or not debug.output:
@@ -1167,24 +1368,28 @@ def compute_blocks(self):
             else:
                 raise RuntimeError("Unknown block_size unit %r" % block.units)
             if block_size > max_block_size:
-                raise RuntimeError(
-                    """
-          The requested block size (%s) is larger than the maximum allowable block
-          size (%s). Either decrease the requested block size or increase the
-          amount of available memory.
-        """
-                    % (block_size, max_block_size)
+                logger.warning(
+                    "Requested block size (%s) > maximum block size (%s).",
+                    block_size,
+                    max_block_size,
+                )
+                logger.warning(
+                    "Setting block size to maximum; some reflections may be partial"
                 )
+                block_size = max_block_size
         block.size = block_size
         block.units = "frames"
 
     def compute_jobs(self):
         imageset = self.experiments[0].imageset
-        array_range = imageset.get_array_range()
         block = self.params.integration.block
         assert block.units == "frames"
         assert block.size > 0
-        self.blocks = SimpleBlockList(array_range, block.size)
+        (
+            self.blocks,
+            self.required_memory,
+            self.params.integration.mp.njobs,
+        ) = compute_block_list(self.reflections, imageset, block.size, self.params)
         assert len(self.blocks) > 0, "Invalid number of jobs"
 
     def summary(self):
@@ -1260,15 +1465,6 @@ def __init__(self, experiments, reflections, params=None):
         # Execute each task
         if params.integration.mp.njobs > 1:
 
-            if params.integration.mp.method == "multiprocessing":
-                _assert_enough_memory(
-                    params.integration.mp.njobs
-                    * compute_required_memory(
-                        experiments[0].imageset, params.integration.block.size
-                    ),
-                    params.integration.block.max_memory_usage,
-                )
-
             def process_output(result):
                 for message in result[1]:
                     logger.log(message.levelno, message.msg)
@@ -1340,15 +1536,6 @@ def __init__(self, experiments, reflections, reference=None, params=None):
         # Execute each task
         if params.integration.mp.njobs > 1:
 
-            if params.integration.mp.method == "multiprocessing":
-                _assert_enough_memory(
-                    params.integration.mp.njobs
-                    * compute_required_memory(
-                        experiments[0].imageset, params.integration.block.size
-                    ),
-                    params.integration.block.max_memory_usage,
-                )
-
             def process_output(result):
                 for message in result[1]:
                     logger.log(message.levelno, message.msg)
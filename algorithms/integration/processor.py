@@ -15,9 +15,9 @@
 
 import dials.algorithms.integration
 import dials.util
-from dials.array_family import flex
+from dials.array_family import flex, shared_memory
 from dials.model.data import make_image
-from dials.util import tabulate
+from dials.util import instrumentation, tabulate
 from dials.util.mp import multi_node_parallel_map
 from dials_algorithms_integration_integrator_ext import (
     Executor,
@@ -104,12 +104,14 @@ def __init__(self):
         self.nproc = 1
         self.njobs = 1
         self.nthreads = 1
+        self.shared_memory = True
 
     def update(self, other):
         self.method = other.method
         self.nproc = other.nproc
         self.njobs = other.njobs
         self.nthreads = other.nthreads
+        self.shared_memory = other.shared_memory
 
 
 class Lookup(object):
@@ -168,12 +170,14 @@ def __init__(self):
         self.select = None
         self.split_experiments = True
         self.separate_files = True
+        self.format = "refl"
 
     def update(self, other):
         self.output = other.output
         self.select = other.select
         self.split_experiments = other.split_experiments
         self.separate_files = other.separate_files
+        self.format = other.format
 
 
 class Parameters(object):
@@ -287,16 +291,29 @@ def process_output(result):
                     logger.log(message.levelno, message.msg)
                 self.manager.accumulate(result[0])
 
-            multi_node_parallel_map(
-                func=execute_parallel_task,
-                iterable=list(self.manager.tasks()),
-                njobs=mp_njobs,
-                nproc=mp_nproc,
-                callback=process_output,
-                cluster_method=mp_method,
-                preserve_order=True,
-                preserve_exception_message=True,
+            # Worker processes on this machine can read the reflections from
+            # shared memory, rather than each task carrying a copy of its rows
+            share = (
+                mp_method == "multiprocessing"
+                and self.manager.params.mp.shared_memory
+                and shared_memory.is_available()
             )
+            if share:
+                self.manager.share_reflections()
+            try:
+                multi_node_parallel_map(
+                    func=execute_parallel_task,
+                    iterable=list(self.manager.tasks()),
+                    njobs=mp_njobs,
+                    nproc=mp_nproc,
+                    callback=process_output,
+                    cluster_method=mp_method,
+                    preserve_order=True,
+                    preserve_exception_message=True,
+                )
+            finally:
+                if share:
+                    self.manager.unshare_reflections()
         else:
             for task in self.manager.tasks():
                 self.manager.accumulate(task())
@@ -404,6 +421,10 @@ def __call__(self):
         # Set the global process ID
         job.index = self.index
 
+        # Copy the reflections out of shared memory
+        if isinstance(self.reflections, shared_memory.SharedReflectionTable):
+            self.reflections = self.reflections.table()
+
         # Check all reflections have same imageset and get it
         exp_id = list(set(self.reflections["id"]))
         imageset = self.experiments[exp_id[0]].imageset
@@ -487,16 +508,7 @@ def __call__(self):
 
         # Optionally save the shoeboxes
         if self.params.debug.output and self.params.debug.separate_files:
-            output = self.reflections
-            if self.params.debug.select is not None:
-                output = output.select(self.params.debug.select(output))
-            if self.params.debug.split_experiments:
-                output = output.split_by_experiment_id()
-                for table in output:
-                    i = table["id"][0]
-                    table.as_file("shoeboxes_%d_%d.refl" % (self.index, i))
-            else:
-                output.as_file("shoeboxes_%d.refl" % self.index)
+            save_debug_shoeboxes(self.reflections, self.index, self.params.debug)
 
         # Delete the shoeboxes
         if self.params.debug.separate_files or not self.params.debug.output:
@@ -505,6 +517,12 @@ def __call__(self):
         # Finalize the executor
         self.executor.finalize()
 
+        instrumentation.record("integration.read", read_time)
+        instrumentation.record("integration.extract", processor.extract_time())
+        instrumentation.record("integration.process", processor.process_time())
+        instrumentation.count("integration.reflections", len(self.reflections))
+        instrumentation.count("integration.images", len(imageset))
+
         # Return the result
         return dials.algorithms.integration.Result(
             index=self.index,
@@ -517,6 +535,33 @@ def __call__(self):
         )
 
 
+def save_debug_shoeboxes(reflections, index, debug):
+    """
+    Save the shoeboxes of a processed task for debugging or later reuse.
+
+    :param reflections: The reflections with shoeboxes
+    :param index: The task index
+    :param debug: The integration debug parameters
+    """
+    output = reflections
+    if debug.select is not None:
+        output = output.select(debug.select(output))
+    if debug.split_experiments:
+        output = output.split_by_experiment_id()
+        names = ["shoeboxes_%d_%d" % (index, table["id"][0]) for table in output]
+    else:
+        output = [output]
+        names = ["shoeboxes_%d" % index]
+    for table, name in zip(output, names):
+        if debug.format == "store":
+            from dials.model.serialize.shoebox import ShoeboxWriter
+
+            with ShoeboxWriter(name + ".sbx") as writer:
+                writer.write(table)
+        else:
+            table.as_file(name + ".refl")
+
+
 class _Manager(object):
     """
     A class to manage processing book-keeping
@@ -537,6 +582,7 @@ def __init__(self, experiments, reflections, params):
         # Save some data
         self.experiments = experiments
         self.reflections = reflections
+        self.shared = None
 
         # Other data
         self.data = {}
@@ -590,7 +636,12 @@ def task(self, index):
         assert expr_id[0] >= 0, "Invalid experiment id"
         assert expr_id[1] <= len(self.experiments), "Invalid experiment id"
         experiments = self.experiments  # [expr_id[0]:expr_id[1]]
-        reflections = self.manager.split(index)
+        if self.shared is not None and self.manager.num_reflections(index):
+            reflections = self.shared.subset(
+                self.manager.indices(index).as_numpy_array()
+            )
+        else:
+            reflections = self.manager.split(index)
         if len(reflections) == 0:
             logger.warning("No reflections in job %d ***", index)
             task = NullTask(index=index, reflections=reflections)
@@ -612,6 +663,21 @@ def tasks(self):
         for i in range(len(self)):
             yield self.task(i)
 
+    def share_reflections(self):
+        """
+        Copy the reflections into shared memory, so that the tasks hold a
+        handle to their rows rather than a copy of them.
+        """
+        self.shared = shared_memory.SharedReflectionTable(self.reflections)
+
+    def unshare_reflections(self):
+        """
+        Free the shared memory.
+        """
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
     def accumulate(self, result):
         """Accumulate the results."""
         self.data[result.index] = result.data
@@ -8,10 +8,7 @@
     merging_stats_from_scaled_array,
 )
 from dials.algorithms.scaling.scaling_utilities import DialsMergingStatisticsError
-from dials.algorithms.scaling.Ih_table import (
-    _reflection_table_to_iobs,
-    map_indices_to_asu,
-)
+from dials.algorithms.scaling.Ih_table import _reflection_table_to_iobs
 from dials.algorithms.symmetry.absences.run_absences_checks import (
     run_systematic_absences_checks,
 )
@@ -60,9 +57,7 @@ def prepare_merged_reflection_table(
 
     # now merge
     space_group = experiments[0].crystal.get_space_group()
-    reflections["asu_miller_index"] = map_indices_to_asu(
-        reflections["miller_index"], space_group
-    )
+    reflections["asu_miller_index"] = reflections.asu_index(space_group).miller_index
     reflections["inverse_scale_factor"] = flex.double(reflections.size(), 1.0)
     merged = (
         _reflection_table_to_iobs(
@@ -9,6 +9,17 @@
     XYPhiPredictionParameterisation,
     SparseGradientVectorMixin,
 )
+from dials.algorithms.refinement.refinement_helpers import sorted_groups
+
+# The frame at the centre of a block, the indices of the reflections in the
+# block and the indices of those reflections on each panel
+_Block = namedtuple("_Block", ["frame", "isel", "panels"])
+
+# The blocks of an experiment, the indices of its reflections in block order
+# with the position of the block of each, and its reflections on each panel
+_ExperimentBlocks = namedtuple(
+    "_ExperimentBlocks", ["blocks", "isel", "block_index", "panels"]
+)
 
 
 class StateDerivativeCache(object):
@@ -179,6 +190,9 @@ def __init__(
         # is set to True
         self.set_scan_varying_errors = False
 
+        # grouping of the reflections by block, reused between calls to compose
+        self._block_groups_cache = None
+
     def _get_xl_orientation_parameterisation(self, experiment_id):
         """Return the crystal orientation parameterisation for the requested
         experiment number (or None if the crystal orientation in that experiment
@@ -281,6 +295,60 @@ def _prepare_for_compose(self, reflections, skip_derivatives=False):
         self._derivative_cache.clear()
         self._derivative_cache.nref = nref
 
+    def _block_groups(self, reflections):
+        """Group the reflections of each experiment by block, and the reflections
+        of each block by panel. The groups are cached and reused for as long as
+        the id, block and panel columns are unchanged, which is normally the
+        whole of refinement"""
+
+        columns = [reflections[k] for k in ("id", "block", "block_centre", "panel")]
+        if self._block_groups_cache is not None:
+            cached, groups = self._block_groups_cache
+            if all(
+                len(a) == len(b) and (a == b).all_eq(True)
+                for a, b in zip(cached, columns)
+            ):
+                return groups
+
+        exp_ids, blocks, block_centres, panels = columns
+        rows = dict(sorted_groups(exp_ids))
+        groups = []
+        for iexp in range(len(self._experiments)):
+            isel = rows.get(iexp, flex.size_t())
+            exp_blocks = []
+            block_isel = flex.size_t()
+            block_index = flex.size_t()
+            for _, perm in sorted_groups(blocks.select(isel)):
+                subsel = isel.select(perm)
+
+                # get the integer frame number nearest the centre of that block
+                frames = block_centres.select(subsel)
+
+                # can only be false if original block assignment has gone wrong
+                assert frames.all_eq(
+                    frames[0]
+                ), "Failing: a block contains reflections that shouldn't be there"
+                frame = int(math.floor(frames[0]))
+
+                block_panels = {
+                    panel_id: subsel.select(p)
+                    for panel_id, p in sorted_groups(panels.select(subsel))
+                }
+                block_isel.extend(subsel)
+                block_index.extend(flex.size_t(len(subsel), len(exp_blocks)))
+                exp_blocks.append(_Block(frame, subsel, block_panels))
+
+            exp_panels = {
+                panel_id: isel.select(p)
+                for panel_id, p in sorted_groups(panels.select(isel))
+            }
+            groups.append(
+                _ExperimentBlocks(exp_blocks, block_isel, block_index, exp_panels)
+            )
+
+        self._block_groups_cache = ([c.deep_copy() for c in columns], groups)
+        return groups
+
     def compose(self, reflections, skip_derivatives=False):
         """Compose scan-varying crystal parameterisations at the specified image
         number, for the specified experiment, for each image. Put the varying
@@ -288,13 +356,13 @@ def compose(self, reflections, skip_derivatives=False):
 
         self._prepare_for_compose(reflections, skip_derivatives)
 
-        for iexp, exp in enumerate(self._experiments):
+        block_groups = self._block_groups(reflections)
 
-            # select the reflections of interest
-            sel = reflections["id"] == iexp
-            isel = sel.iselection()
+        for iexp, exp in enumerate(self._experiments):
 
-            blocks = reflections["block"].select(isel)
+            exp_blocks = block_groups[iexp]
+            if not exp_blocks.blocks:
+                continue
 
             # identify which parameterisations to use for this experiment
             xl_op = self._get_xl_orientation_parameterisation(iexp)
@@ -306,25 +374,20 @@ def compose(self, reflections, skip_derivatives=False):
             # reset current frame cache for scan-varying parameterisations
             self._current_frame = {}
 
-            # get state and derivatives for each block
-            for block in range(flex.min(blocks), flex.max(blocks) + 1):
-
-                # determine the subset of reflections this affects
-                subsel = isel.select(blocks == block)
-                if len(subsel) == 0:
-                    continue
+            # model states for each block, to be set for all reflections at once
+            U_states = flex.mat3_double()
+            B_states = flex.mat3_double()
+            s0_states = flex.vec3_double()
+            S_states = flex.mat3_double()
+            d_states = flex.mat3_double()
+            D_states = flex.mat3_double()
 
-                # get the panels hit by these reflections
-                panels = reflections["panel"].select(subsel)
-
-                # get the integer frame number nearest the centre of that block
-                frames = reflections["block_centre"].select(subsel)
+            # get state and derivatives for each block
+            for block in exp_blocks.blocks:
 
-                # can only be false if original block assignment has gone wrong
-                assert frames.all_eq(
-                    frames[0]
-                ), "Failing: a block contains reflections that shouldn't be there"
-                frame = int(math.floor(frames[0]))
+                # the subset of reflections this affects and the frame at its centre
+                subsel = block.isel
+                frame = block.frame
 
                 # model states at current frame
                 U = self._get_state_from_parameterisation(xl_op, frame)
@@ -343,11 +406,11 @@ def compose(self, reflections, skip_derivatives=False):
                 if S is None:
                     S = matrix.sqr(exp.goniometer.get_setting_rotation())
 
-                # set states for crystal, beam and goniometer
-                reflections["u_matrix"].set_selected(subsel, U.elems)
-                reflections["b_matrix"].set_selected(subsel, B.elems)
-                reflections["s0_vector"].set_selected(subsel, s0.elems)
-                reflections["S_matrix"].set_selected(subsel, S.elems)
+                # states for crystal, beam and goniometer
+                U_states.append(U.elems)
+                B_states.append(B.elems)
+                s0_states.append(s0.elems)
+                S_states.append(S.elems)
 
                 # set states and derivatives for this detector
                 if dp is not None:  # detector is parameterised
@@ -357,8 +420,8 @@ def compose(self, reflections, skip_derivatives=False):
                         for panel_id, _ in enumerate(exp.detector):
 
                             # get the right subset of array indices to set for this panel
-                            subsel2 = subsel.select(panels == panel_id)
-                            if len(subsel2) == 0:
+                            subsel2 = block.panels.get(panel_id)
+                            if subsel2 is None:
                                 # if no reflections intersect this panel, skip calculation
                                 continue
 
@@ -386,8 +449,8 @@ def compose(self, reflections, skip_derivatives=False):
                         if dmat is None:
                             dmat = exp.detector[0].get_d_matrix()
                         Dmat = exp.detector[0].get_D_matrix()
-                        reflections["d_matrix"].set_selected(subsel, dmat)
-                        reflections["D_matrix"].set_selected(subsel, Dmat)
+                        d_states.append(matrix.sqr(dmat).elems)
+                        D_states.append(matrix.sqr(Dmat).elems)
 
                         if self._varying_detectors and not skip_derivatives:
                             for j, dd in enumerate(dp.get_ds_dp(use_none_as_null=True)):
@@ -395,21 +458,6 @@ def compose(self, reflections, skip_derivatives=False):
                                     continue
                                 self._derivative_cache.append(dp, j, dd, subsel)
 
-                else:  # set states for unparameterised detector (dp is None)
-                    # loop through the panels in this detector
-                    for panel_id, _ in enumerate(exp.detector):
-
-                        # get the right subset of array indices to set for this panel
-                        subsel2 = subsel.select(panels == panel_id)
-                        if len(subsel2) == 0:
-                            # if no reflections intersect this panel, skip to the next
-                            continue
-
-                        dmat = exp.detector[panel_id].get_d_matrix()
-                        Dmat = exp.detector[panel_id].get_D_matrix()
-                        reflections["d_matrix"].set_selected(subsel2, dmat)
-                        reflections["D_matrix"].set_selected(subsel2, Dmat)
-
                 # set derivatives of the states for crystal, beam and goniometer
                 if not skip_derivatives:
                     if xl_op is not None and self._varying_xl_orientations:
@@ -433,6 +481,30 @@ def compose(self, reflections, skip_derivatives=False):
                                 continue
                             self._derivative_cache.append(gp, j, dS, subsel)
 
+            # set the states of all blocks with one indexed write per column
+            isel = exp_blocks.isel
+            block_index = exp_blocks.block_index
+            reflections["u_matrix"].set_selected(isel, U_states.select(block_index))
+            reflections["b_matrix"].set_selected(isel, B_states.select(block_index))
+            reflections["s0_vector"].set_selected(isel, s0_states.select(block_index))
+            reflections["S_matrix"].set_selected(isel, S_states.select(block_index))
+            if dp is not None and not dp.is_multi_state():
+                reflections["d_matrix"].set_selected(isel, d_states.select(block_index))
+                reflections["D_matrix"].set_selected(isel, D_states.select(block_index))
+
+            if dp is None:  # set states for unparameterised detector
+                # loop through the panels in this detector
+                for panel_id, panel in enumerate(exp.detector):
+
+                    # get the right subset of array indices to set for this panel
+                    subsel = exp_blocks.panels.get(panel_id)
+                    if subsel is None:
+                        # if no reflections intersect this panel, skip to the next
+                        continue
+
+                    reflections["d_matrix"].set_selected(subsel, panel.get_d_matrix())
+                    reflections["D_matrix"].set_selected(subsel, panel.get_D_matrix())
+
         # set the UB matrices for prediction
         reflections["ub_matrix"] = reflections["u_matrix"] * reflections["b_matrix"]
 
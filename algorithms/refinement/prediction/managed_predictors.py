@@ -9,7 +9,10 @@
 from __future__ import absolute_import, division, print_function
 
 from math import pi
+from multiprocessing.pool import ThreadPool
+
 from scitbx.array_family import flex
+from dials.algorithms.refinement.refinement_helpers import sorted_groups
 from dials.algorithms.spot_prediction import ScanStaticRayPredictor
 from dials.algorithms.spot_prediction import ScanStaticReflectionPredictor as sc
 from dials.algorithms.spot_prediction import ScanVaryingReflectionPredictor as sv
@@ -63,31 +66,154 @@ class ExperimentsPredictor(object):
     Predict for relps based on the current states of models of the experimental
     geometry. This version manages multiple experiments, selecting the correct
     predictor in each case.
+
+    Experiments may be predicted in parallel threads. If reuse_predictions is
+    set and the predicted columns are known, the predictions for each
+    experiment are kept, and reused for as long as neither its models nor its
+    reflections change.
     """
 
-    def __init__(self, experiments):
+    # Columns used as input to the prediction of each reflection
+    _input_columns = (
+        "miller_index",
+        "entering",
+        "panel",
+        "ub_matrix",
+        "s0_vector",
+        "d_matrix",
+        "S_matrix",
+    )
+
+    # Columns set by prediction. If None, nothing is reused between calls
+    _predicted_columns = None
+
+    def __init__(self, experiments, nthreads=1, reuse_predictions=False):
         """Construct by linking to instances of experimental model classes"""
 
         self._experiments = experiments
+        self._nthreads = nthreads
+        self._reuse_predictions = reuse_predictions
+        self._cache = {}
 
     def __call__(self, reflections):
         """Predict for all reflections at the current model geometry"""
 
+        rows = dict(sorted_groups(reflections["id"]))
+        jobs = []
         for iexp, e in enumerate(self._experiments):
 
             # select the reflections for this experiment only
-            sel = reflections["id"] == iexp
-            refs = reflections.select(sel)
+            isel = rows.get(iexp)
+            if isel is None:
+                continue
+
+            # reuse the last predictions if nothing has changed
+            state = self._model_state(e)
+            if self._restore_predictions(iexp, state, reflections, isel):
+                continue
+
+            jobs.append((iexp, e, isel, state, reflections.select(isel)))
+
+        if self._nthreads > 1 and len(jobs) > 1:
+            pool = ThreadPool(min(self._nthreads, len(jobs)))
+            try:
+                pool.map(lambda job: self._predict_one_experiment(job[1], job[4]), jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for _, e, _, _, refs in jobs:
+                self._predict_one_experiment(e, refs)
 
-            self._predict_one_experiment(e, refs)
+        for iexp, _, isel, state, refs in jobs:
 
             # write predictions back to overall reflections
-            reflections.set_selected(sel, refs)
+            reflections.set_selected(isel, refs)
+            self._store_predictions(iexp, state, refs)
 
         reflections = self._post_prediction(reflections)
 
         return reflections
 
+    def _model_state(self, experiment):
+        """Return the values of the experimental models that prediction depends
+        on, or None if predictions are not to be reused"""
+
+        if not self._reuse_predictions or self._predicted_columns is None:
+            return None
+
+        crystal = experiment.crystal
+        state = [experiment.beam.get_s0(), crystal.get_A()]
+        for name in ("get_domain_size_ang", "get_half_mosaicity_deg"):
+            if hasattr(crystal, name):
+                state.append(getattr(crystal, name)())
+        for panel in experiment.detector:
+            state.extend(
+                (
+                    panel.get_d_matrix(),
+                    panel.get_pixel_size(),
+                    panel.get_image_size(),
+                    panel.get_thickness(),
+                    panel.get_mu(),
+                )
+            )
+        if experiment.goniometer is not None:
+            state.extend(
+                (
+                    experiment.goniometer.get_rotation_axis_datum(),
+                    experiment.goniometer.get_fixed_rotation(),
+                    experiment.goniometer.get_setting_rotation(),
+                )
+            )
+        if experiment.scan is not None:
+            state.extend(
+                (experiment.scan.get_image_range(), experiment.scan.get_oscillation())
+            )
+        return state
+
+    def _restore_predictions(self, iexp, state, reflections, isel):
+        """Set the kept predictions for an experiment if its models and
+        reflections are unchanged. Return True if this was done"""
+
+        cached = self._cache.get(iexp)
+        if state is None or cached is None or cached["state"] != state:
+            return False
+        if len(cached["predicted"]) != len(isel):
+            return False
+        if any(c not in reflections for c in cached["outputs"]):
+            return False
+        inputs = [c for c in self._input_columns if c in reflections]
+        if sorted(inputs) != sorted(cached["inputs"]):
+            return False
+        for column in inputs:
+            if not (
+                reflections[column].select(isel) == cached["inputs"][column]
+            ).all_eq(True):
+                return False
+
+        for column, values in cached["outputs"].items():
+            reflections[column].set_selected(isel, values)
+        reflections.unset_flags(isel, reflections.flags.predicted)
+        reflections.set_flags(
+            isel.select(cached["predicted"]), reflections.flags.predicted
+        )
+        return True
+
+    def _store_predictions(self, iexp, state, refs):
+        """Keep the predictions for an experiment, to reuse while nothing
+        changes"""
+
+        if state is None:
+            return
+        # refs is a selection made for this call alone, so its columns can be
+        # kept without copying
+        self._cache[iexp] = {
+            "state": state,
+            "inputs": {c: refs[c] for c in self._input_columns if c in refs},
+            "outputs": {c: refs[c] for c in self._predicted_columns},
+            "predicted": refs.get_flags(refs.flags.predicted),
+        }
+
     def _predict_one_experiment(self, experiment, reflections):
 
         raise NotImplementedError()
@@ -100,6 +226,9 @@ def _post_prediction(self, reflections):
 
 
 class ScansExperimentsPredictor(ExperimentsPredictor):
+
+    _predicted_columns = ("s1", "xyzcal.px", "xyzcal.mm")
+
     def _predict_one_experiment(self, experiment, reflections):
 
         # scan-varying
@@ -136,8 +265,11 @@ def _match_full_turns(self, reflections):
         reflections["xyzcal.mm"] = flex.vec3_double(x_calc, y_calc, phi_calc)
 
         # Update xyzcal.px with the correct z_px values in keeping with above
+        rows = dict(sorted_groups(reflections["id"]))
         for iexp, e in enumerate(self._experiments):
-            sel = reflections["id"] == iexp
+            sel = rows.get(iexp)
+            if sel is None:
+                continue
             x_px, y_px, z_px = reflections["xyzcal.px"].select(sel).parts()
             scan = e.scan
             if scan is not None:
@@ -155,6 +287,8 @@ class StillsExperimentsPredictor(ExperimentsPredictor):
 
     spherical_relp_model = False
 
+    _predicted_columns = ("s1", "xyzcal.px", "xyzcal.mm", "delpsical.rad")
+
     def _predict_one_experiment(self, experiment, reflections):
 
         predictor = st(experiment, spherical_relp=self.spherical_relp_model)
@@ -164,7 +298,13 @@ def _predict_one_experiment(self, experiment, reflections):
 
 class ExperimentsPredictorFactory(object):
     @staticmethod
-    def from_experiments(experiments, force_stills=False, spherical_relp=False):
+    def from_experiments(
+        experiments,
+        force_stills=False,
+        spherical_relp=False,
+        nthreads=1,
+        reuse_predictions=False,
+    ):
 
         # Determine whether or not to use a stills predictor
         if not force_stills:
@@ -175,9 +315,13 @@ def from_experiments(experiments, force_stills=False, spherical_relp=False):
 
         # Construct the predictor
         if force_stills:
-            predictor = StillsExperimentsPredictor(experiments)
+            predictor = StillsExperimentsPredictor(
+                experiments, nthreads=nthreads, reuse_predictions=reuse_predictions
+            )
             predictor.spherical_relp_model = spherical_relp
         else:
-            predictor = ScansExperimentsPredictor(experiments)
+            predictor = ScansExperimentsPredictor(
+                experiments, nthreads=nthreads, reuse_predictions=reuse_predictions
+            )
 
         return predictor
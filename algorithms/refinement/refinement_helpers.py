@@ -2,6 +2,7 @@
 
 from __future__ import absolute_import, division, print_function
 
+import bisect
 import logging
 import math
 import random
@@ -265,6 +266,25 @@ def string_sel(l, full_names, prefix=""):
     return sel
 
 
+def sorted_groups(values):
+    """Group the indices of an array by value, using a single stable sort.
+
+    Returns a list of (value, indices) tuples in ascending order of value. The
+    indices of each group are in ascending order, as would be given by
+    (values == value).iselection()"""
+
+    perm = flex.sort_permutation(values, stable=True)
+    ordered = values.select(perm)
+    groups = []
+    start = 0
+    while start < len(ordered):
+        value = ordered[start]
+        stop = bisect.bisect_right(ordered, value, start)
+        groups.append((value, perm[start:stop]))
+        start = stop
+    return groups
+
+
 def calculate_frame_numbers(reflections, experiments):
     """calculate observed frame numbers for all reflections, if not already
     set"""
@@ -355,6 +355,7 @@ def _build_components(cls, params, reflections, experiments):
             experiments,
             force_stills=do_stills,
             spherical_relp=params.refinement.parameterisation.spherical_relp_model,
+            nthreads=params.refinement.mp.nproc,
         )
 
         # Predict for the managed observations, set columns for residuals and set
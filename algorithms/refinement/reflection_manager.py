@@ -2,6 +2,7 @@
 principally ReflectionManager."""
 from __future__ import absolute_import, division, print_function
 
+import bisect
 import logging
 import math
 import random
@@ -16,6 +17,7 @@
 from dials.algorithms.refinement.refinement_helpers import (
     calculate_frame_numbers,
     set_obs_s1,
+    sorted_groups,
 )
 from dials.array_family import flex
 import libtbx
@@ -110,6 +112,16 @@
 phil_scope = parse(phil_str)
 
 
+def _rows_by_experiment(ids, n_experiments):
+    """Group row indices by experiment id using a single stable sort.
+
+    Returns a list with, for each experiment, the indices of its rows in
+    ascending order, as would be given by (ids == iexp).iselection()"""
+
+    groups = dict(sorted_groups(ids))
+    return [groups.get(iexp, flex.size_t()) for iexp in range(n_experiments)]
+
+
 class BlockCalculator(object):
     """Utility class to calculate and set columns in the provided reflection
     table, which will be used during scan-varying refinement. The columns are a
@@ -132,6 +144,12 @@ def _create_block_columns(self):
         self._reflections["block"] = flex.size_t(len(self._reflections))
         self._reflections["block_centre"] = flex.double(len(self._reflections))
 
+    def _set_blocks(self, isel, blocks, block_centres):
+        """Set the block columns for the rows of one experiment"""
+
+        self._reflections["block"].set_selected(isel, blocks)
+        self._reflections["block_centre"].set_selected(isel, block_centres)
+
     def per_width(self, width, deg=True):
         """Set blocks for all experiments according to a constant width"""
 
@@ -141,11 +159,11 @@ def per_width(self, width, deg=True):
 
         # get observed phi in radians
         phi_obs = self._reflections["xyzobs.mm.value"].parts()[2]
+        rows = _rows_by_experiment(self._reflections["id"], len(self._experiments))
 
         for iexp, exp in enumerate(self._experiments):
 
-            sel = self._reflections["id"] == iexp
-            isel = sel.iselection()
+            isel = rows[iexp]
             exp_phi = phi_obs.select(isel)
 
             start, stop = exp.scan.get_oscillation_range(deg=False)
@@ -167,12 +185,22 @@ def per_width(self, width, deg=True):
                 for e in block_starts
             ]
 
+            # sort phi once, so that the reflections in each block are a slice of
+            # the sort permutation. Later blocks take the reflections that lie
+            # exactly on a boundary, as when testing the blocks in turn
+            perm = flex.sort_permutation(exp_phi)
+            sorted_phi = exp_phi.select(perm)
+            exp_blocks = flex.size_t(len(isel), 0)
+            exp_centres = flex.double(len(isel), 0.0)
             for b_num, (b_start, b_cent) in enumerate(zip(block_starts, block_centres)):
-                sub_isel = isel.select(
-                    (b_start <= exp_phi) & (exp_phi <= (b_start + _width))
-                )
-                self._reflections["block"].set_selected(sub_isel, b_num)
-                self._reflections["block_centre"].set_selected(sub_isel, b_cent)
+                lo = bisect.bisect_left(sorted_phi, b_start)
+                hi = bisect.bisect_right(sorted_phi, b_start + _width)
+                if hi <= lo:
+                    continue
+                sub_isel = perm[lo:hi]
+                exp_blocks.set_selected(sub_isel, b_num)
+                exp_centres.set_selected(sub_isel, b_cent)
+            self._set_blocks(isel, exp_blocks, exp_centres)
 
         return self._reflections
 
@@ -183,25 +211,26 @@ def per_image(self):
 
         # get observed phi in radians
         phi_obs = self._reflections["xyzobs.mm.value"].parts()[2]
+        rows = _rows_by_experiment(self._reflections["id"], len(self._experiments))
 
         for iexp, exp in enumerate(self._experiments):
 
-            sel = self._reflections["id"] == iexp
-            isel = sel.iselection()
+            isel = rows[iexp]
+            if len(isel) == 0:
+                continue
             exp_phi = phi_obs.select(isel)
 
             # convert phi to integer frames
             frames = exp.scan.get_array_index_from_angle(exp_phi, deg=False)
             frames = flex.floor(frames).iround()
 
-            start, stop = flex.min(frames), flex.max(frames)
-            frame_range = range(start, stop + 1)
-
-            for f_num, f in enumerate(frame_range):
-                sub_isel = isel.select(frames == f)
-                f_cent = f + 0.5
-                self._reflections["block"].set_selected(sub_isel, f_num)
-                self._reflections["block_centre"].set_selected(sub_isel, f_cent)
+            # blocks are numbered from the first frame with a reflection, so that
+            # the block number is the frame offset from that
+            start = flex.min(frames)
+            exp_blocks = flex.size_t(len(isel), 0)
+            for f, sub_isel in sorted_groups(frames):
+                exp_blocks.set_selected(sub_isel, f - start)
+            self._set_blocks(isel, exp_blocks, frames.as_double() + 0.5)
 
         return self._reflections
 
@@ -381,16 +410,11 @@ def __init__(
         # and proceed to sort by id and panel. This is required for the C++ extension
         # modules to allow for nlogn subselection of values used in refinement.
         l_id = reflections["id"]
-        id0 = l_id[0]
-        for id_x in l_id[1:]:
-            if id0 <= id_x:
-                id0 = id_x
-            else:
-                reflections.sort("id")  # Ensuring the ref_table is sorted by id
-                reflections.subsort(
-                    "id", "panel"
-                )  # Ensuring that within each sorted id block, sorting is next performed by panel
-                break
+        if (l_id[1:] >= l_id[:-1]).count(False) > 0:
+            reflections.sort("id")  # Ensuring the ref_table is sorted by id
+            reflections.subsort(
+                "id", "panel"
+            )  # Ensuring that within each sorted id block, sorting is next performed by panel
 
         # set up the reflection inclusion criteria
         self._close_to_spindle_cutoff = close_to_spindle_cutoff  # close to spindle
@@ -529,22 +553,28 @@ def _id_refs_to_keep(self, obs_data):
         # combine selections
         sel = sel1 & sel2
         inc = flex.size_t_range(len(obs_data)).select(sel)
-        obs_data = obs_data.select(sel)
 
         # Default to True to pass the following test if there is no rotation axis
         # for a particular experiment
         to_keep = flex.bool(len(inc), True)
 
+        # only the columns needed for the tests are selected, rather than the
+        # whole table, and the rows of each experiment are found in one pass
+        groups = _rows_by_experiment(obs_data["id"].select(inc), len(self._experiments))
+        obs_s1 = None
         for iexp, exp in enumerate(self._experiments):
             axis = self._axes[iexp]
             if not axis or exp.scan is None:
                 continue
             if exp.scan.is_still():
                 continue
-            sel = obs_data["id"] == iexp
+            if obs_s1 is None:
+                obs_s1 = obs_data["s1"].select(inc)
+                obs_phi = obs_data["xyzobs.mm.value"].parts()[2].select(inc)
+            sel = groups[iexp]
             s0 = self._s0vecs[iexp]
-            s1 = obs_data["s1"].select(sel)
-            phi = obs_data["xyzobs.mm.value"].parts()[2].select(sel)
+            s1 = obs_s1.select(sel)
+            phi = obs_phi.select(sel)
 
             # first test: reject reflections for which the parallelepiped formed
             # between the gonio axis, s0 and s1 has a volume of less than the cutoff.
@@ -599,11 +629,10 @@ def _create_working_set(self):
         """Make a subset of the indices of reflections to use in refinement"""
 
         working_isel = flex.size_t()
+        groups = _rows_by_experiment(self._reflections["id"], len(self._experiments))
         for iexp, exp in enumerate(self._experiments):
 
-            sel = self._reflections["id"] == iexp
-            isel = sel.iselection()
-            # refs = self._reflections.select(sel)
+            isel = groups[iexp]
             nrefs = sample_size = len(isel)
 
             # set sample size according to nref_per_degree (per experiment)
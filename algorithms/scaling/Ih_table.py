@@ -221,11 +221,8 @@ def _determine_required_block_structures(self, reflection_tables):
         """
         joint_asu_indices = flex.miller_index()
         for table in reflection_tables:
-            if "asu_miller_index" not in table:
-                table["asu_miller_index"] = map_indices_to_asu(
-                    table["miller_index"], self.space_group, self.anomalous
-                )
-            joint_asu_indices.extend(table["asu_miller_index"])
+            asu_index = table.asu_index(self.space_group, self.anomalous)
+            joint_asu_indices.extend(asu_index.miller_index)
         sorted_joint_asu_indices, _ = get_sorted_asu_indices(
             joint_asu_indices, self.space_group, self.anomalous
         )
@@ -291,12 +288,12 @@ def _create_empty_Ih_table_blocks(self):
     def _add_dataset_to_blocks(
         self, dataset_id, reflections, indices_array=None, additional_cols=None
     ):
-        sorted_asu_indices, perm = get_sorted_asu_indices(
-            reflections["asu_miller_index"], self.space_group, self.anomalous
-        )
+        asu_index = reflections.asu_index(self.space_group, self.anomalous)
+        perm = asu_index.permutation
+        sorted_asu_indices = asu_index.miller_index.select(perm)
         r = flex.reflection_table()
         r["intensity"] = reflections["intensity"]
-        r["asu_miller_index"] = reflections["asu_miller_index"]
+        r["asu_miller_index"] = asu_index.miller_index
         r["variance"] = reflections["variance"]
         r["inverse_scale_factor"] = reflections["inverse_scale_factor"]
         if isinstance(additional_cols, list):
@@ -343,7 +340,7 @@ def extract_free_set(self, free_set_percentage, offset=0):
         """Extract a free set from all blocks."""
         assert not self.free_Ih_table
         interval_between_groups = int(100 / free_set_percentage)
-        free_reflection_table = flex.reflection_table()
+        free_tables = []
         free_indices = flex.size_t()
         for j, block in enumerate(self.Ih_table_blocks):
             n_groups = block.h_index_matrix.n_cols
@@ -353,7 +350,7 @@ def extract_free_set(self, free_set_percentage, offset=0):
             )
             groups_for_free_set.set_selected(for_free, True)
             free_block = block.select_on_groups(groups_for_free_set)
-            free_reflection_table.extend(free_block.Ih_table)
+            free_tables.append(free_block.Ih_table)
             for sel in free_block.block_selections:
                 free_indices.extend(sel)
             self.Ih_table_blocks[j] = block.select_on_groups(~groups_for_free_set)
@@ -370,6 +367,7 @@ def extract_free_set(self, free_set_percentage, offset=0):
         self.blocked_selection_list = [
             block.block_selections for block in self.Ih_table_blocks
         ]
+        free_reflection_table = flex.reflection_table.concat(free_tables)
         # now split by dataset and use to instantiate another Ih_table
         datasets = set(free_reflection_table["dataset_id"])
         tables = []
@@ -395,7 +393,7 @@ def as_miller_array(self, unit_cell, return_free_set_data=False):
             else:
                 blocked_data_list = blocked_data_list[:-1]
         if len(blocked_data_list) > 1:
-            joint_table = flex.reflection_table()
+            tables = []
             for block in blocked_data_list:
                 # better to just create many miller arrays and join them?
                 refl_for_joint_table = flex.reflection_table()
@@ -406,7 +404,8 @@ def as_miller_array(self, unit_cell, return_free_set_data=False):
                     "variance",
                 ]:
                     refl_for_joint_table[col] = block.Ih_table[col]
-                joint_table.extend(refl_for_joint_table)
+                tables.append(refl_for_joint_table)
+            joint_table = flex.reflection_table.concat(tables)
         else:
             joint_table = blocked_data_list[0].Ih_table
         # Filter out negative scale factors to avoid merging statistics errors.
@@ -309,12 +309,10 @@ def finish(self):
                 del experiment.scaling_model.components[component].data
         gc.collect()
 
-        joint_table = flex.reflection_table()
-        for i in range(len(self.reflections)):
-            joint_table.extend(self.reflections[i])
-            # del reflection_table
-            self.reflections[i] = 0
-            gc.collect()
+        joint_table = flex.reflection_table.concat(self.reflections)
+        # del reflection tables
+        self.reflections = [0] * len(self.reflections)
+        gc.collect()
 
         # remove reflections with very low scale factors
         sel = joint_table["inverse_scale_factor"] <= 0.001
@@ -379,9 +377,7 @@ def run(self):
             logger.info("\nPerforming a round of filtering.\n")
 
             # need to reduce to single table.
-            joined_reflections = flex.reflection_table()
-            for table in self.reflections:
-                joined_reflections.extend(table)
+            joined_reflections = flex.reflection_table.concat(self.reflections)
 
             script = deltaccscript(
                 delta_cc_params, self.experiments, joined_reflections
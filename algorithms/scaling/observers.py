@@ -42,6 +42,7 @@
     make_image_range_table,
 )
 from dials.algorithms.scaling.scale_and_filter import make_scaling_filtering_plots
+from dials.util.async_report import downsample, start_report
 from dials.util.batch_handling import batch_manager, get_image_ranges
 from dials.util.exclude_images import get_valid_image_ranges
 from jinja2 import Environment, ChoiceLoader, PackageLoader
@@ -210,13 +211,20 @@ def make_scaling_html(self, scaling_script):
         json_file = scaling_script.params.output.json
         if not (html_file or json_file):
             return
+        if html_file:
+            logger.info("Writing html report to: %s", html_file)
+        if json_file:
+            logger.info("Writing html report data to: %s", json_file)
+        start_report(self.write_report, html_file, json_file)
+
+    def write_report(self, html_file, json_file):
+        """Make the plots and write the html and json files."""
         self.data.update(ScalingModelObserver().make_plots())
         self.data.update(ScalingOutlierObserver().make_plots())
         self.data.update(ErrorModelObserver().make_plots())
         self.data.update(MergingStatisticsObserver().make_plots())
         self.data.update(FilteringObserver().make_plots())
         if html_file:
-            logger.info("Writing html report to: %s", html_file)
             loader = ChoiceLoader(
                 [
                     PackageLoader("dials", "templates"),
@@ -243,7 +251,6 @@ def make_scaling_html(self, scaling_script):
             with open(html_file, "wb") as f:
                 f.write(html.encode("utf-8", "xmlcharrefreplace"))
         if json_file:
-            logger.info("Writing html report data to: %s", json_file)
             with open(json_file, "w") as outfile:
                 json.dump(self.data, outfile)
 
@@ -328,6 +335,10 @@ def update(self, scaler):
             x, y, z = (
                 scaler.reflection_table["xyzobs.px.value"].select(outlier_isel).parts()
             )
+            # Plot the positions of a sample of the outliers, but count them all
+            sample = downsample(len(x))
+            x = x.select(sample)
+            y = y.select(sample)
             if scaler.experiment.scan:
                 zrange = [
                     i / scaler.experiment.scan.get_oscillation()[1]
@@ -367,17 +378,21 @@ def update(self, scaler):
         if scaler.error_model:
             if scaler.error_model.filtered_Ih_table:
                 table = scaler.error_model.filtered_Ih_table
-                self.data["intensity"] = table.intensities
                 sigmaprime = calc_sigmaprime(scaler.error_model.parameters, table)
-                self.data["delta_hl"] = calc_deltahl(table, table.calc_nh(), sigmaprime)
-                self.data["inv_scale"] = table.inverse_scale_factors
-                self.data["sigma"] = sigmaprime * self.data["inv_scale"]
+                delta_hl = calc_deltahl(table, table.calc_nh(), sigmaprime)
+                # Plot the distributions for a sample of the reflections
+                sample = downsample(delta_hl.size())
+                self.data["intensity"] = table.intensities.select(sample)
+                self.data["delta_hl"] = delta_hl.select(sample)
+                self.data["inv_scale"] = table.inverse_scale_factors.select(sample)
+                self.data["sigma"] = sigmaprime.select(sample) * self.data["inv_scale"]
                 self.data["binning_info"] = scaler.error_model.binner.binning_info
                 scaler.error_model.clear_Ih_table()
             if scaler.params.weighting.error_model.basic.minimisation == "regression":
                 x, y = calculate_regression_x_y(scaler.error_model.filtered_Ih_table)
-                self.data["regression_x"] = x
-                self.data["regression_y"] = y
+                sample = downsample(x.size())
+                self.data["regression_x"] = x.select(sample)
+                self.data["regression_y"] = y.select(sample)
                 self.data["model_a"] = scaler.error_model.parameters[0]
                 self.data["model_b"] = scaler.error_model.parameters[1]
             self.data["summary"] = str(scaler.error_model)
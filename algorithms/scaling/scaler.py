@@ -864,19 +864,17 @@ def remove_datasets(self, scalers, n_list):
     def get_free_set_reflections(self):
         """Get all reflections in the free set if it exists."""
         if self._free_Ih_table:
-            refls = flex.reflection_table()
-            for scaler in self.active_scalers:
-                refls.extend(scaler.get_free_set_reflections())
-            return refls
+            return flex.reflection_table.concat(
+                [scaler.get_free_set_reflections() for scaler in self.active_scalers]
+            )
         return None
 
     def get_work_set_reflections(self):
         """Get all reflections in the free set if it exists."""
         if self._free_Ih_table:
-            refls = flex.reflection_table()
-            for scaler in self.active_scalers:
-                refls.extend(scaler.get_work_set_reflections())
-            return refls
+            return flex.reflection_table.concat(
+                [scaler.get_work_set_reflections() for scaler in self.active_scalers]
+            )
         return None
 
     def expand_scales_to_all_reflections(self, caller=None, calc_cov=False):
@@ -0,0 +1,248 @@
+"""
+Simulation of rotation datasets as miniCBF image files.
+
+The images are generated from predicted reflection positions, with a Gaussian
+spot profile, a flat background and Poisson counting noise. The intensities
+depend only on the symmetry-unique Miller index, so that datasets simulated
+from crystals of the same unit cell can be scaled and merged together. Nothing
+is downloaded or read, so datasets of any size can be generated offline.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import math
+import random
+
+import numpy
+
+from cctbx import crystal, miller, sgtbx, uctbx
+from dxtbx.model import (
+    BeamFactory,
+    Crystal,
+    DetectorFactory,
+    GoniometerFactory,
+    ScanFactory,
+)
+from dxtbx.model.experiment_list import Experiment
+from scitbx import matrix
+
+from dials.array_family import flex
+
+_erf = numpy.vectorize(math.erf, otypes=[float])
+
+
+def simulate_rotation_experiment(
+    unit_cell,
+    space_group,
+    n_images=90,
+    oscillation=0.5,
+    image_size=1024,
+    pixel_size=0.172,
+    distance=150.0,
+    wavelength=0.9795,
+    seed=0,
+):
+    """
+    Create the models for a rotation dataset with a randomly oriented crystal.
+
+    The detector is a single panel normal to the beam with the beam at its
+    centre, and the rotation axis is along x, matching the models that are
+    read back from the miniCBF header.
+
+    :param unit_cell: The unit cell parameters
+    :param space_group: The space group symbol
+    :param n_images: The number of images
+    :param oscillation: The oscillation width of each image in degrees
+    :param image_size: The number of pixels along each side of the detector
+    :param pixel_size: The pixel size in mm
+    :param distance: The detector distance in mm
+    :param wavelength: The wavelength in Angstrom
+    :param seed: The random seed for the crystal orientation
+    :returns: An experiment without an imageset
+    """
+    beam = BeamFactory.make_beam(wavelength=wavelength, sample_to_source=(0, 0, 1))
+    centre = image_size * pixel_size / 2
+    detector = DetectorFactory.simple(
+        sensor="PAD",
+        distance=distance,
+        beam_centre=(centre, centre),
+        fast_direction="+x",
+        slow_direction="-y",
+        pixel_size=(pixel_size, pixel_size),
+        image_size=(image_size, image_size),
+        trusted_range=(-1, 1e6),
+    )
+    goniometer = GoniometerFactory.known_axis((1, 0, 0))
+    scan = ScanFactory.make_scan(
+        image_range=(1, n_images),
+        exposure_times=0.1,
+        oscillation=(0, oscillation),
+        epochs=list(range(n_images)),
+        deg=True,
+    )
+
+    rng = random.Random(seed)
+    axis = matrix.col([rng.gauss(0, 1) for _ in range(3)]).normalize()
+    U = axis.axis_and_angle_as_r3_rotation_matrix(rng.uniform(0, 2 * math.pi))
+    uc = uctbx.unit_cell(unit_cell)
+    B = matrix.sqr(uc.fractionalization_matrix()).transpose()
+    direct_matrix = (U * B).inverse()
+    xtal = Crystal(
+        direct_matrix[0:3],
+        direct_matrix[3:6],
+        direct_matrix[6:9],
+        space_group=sgtbx.space_group_info(space_group).group(),
+    )
+    return Experiment(
+        beam=beam, detector=detector, goniometer=goniometer, scan=scan, crystal=xtal
+    )
+
+
+def simulate_intensities(
+    unit_cell, space_group, d_min, mean_intensity=1000, b_factor=20, seed=0
+):
+    """
+    Generate random intensities for the symmetry-unique reflections.
+
+    :param unit_cell: The unit cell parameters
+    :param space_group: The space group symbol
+    :param d_min: The resolution limit
+    :param mean_intensity: The mean intensity at low resolution
+    :param b_factor: The B factor of the fall-off with resolution
+    :param seed: The random seed
+    :returns: A dictionary of intensities keyed by the asymmetric unit index
+    """
+    symmetry = crystal.symmetry(unit_cell=unit_cell, space_group_symbol=space_group)
+    ms = miller.build_set(symmetry, anomalous_flag=False, d_min=d_min)
+    stol_sq = ms.sin_theta_over_lambda_sq().data().as_numpy_array()
+    rng = numpy.random.RandomState(seed)
+    intensities = rng.exponential(mean_intensity, ms.size()) * numpy.exp(
+        -2 * b_factor * stol_sq
+    )
+    return dict(zip(ms.indices(), intensities))
+
+
+class RotationImageSimulator(object):
+    """
+    Generate the images of a simulated rotation dataset.
+    """
+
+    def __init__(
+        self,
+        experiment,
+        intensities,
+        d_min,
+        background=10,
+        spot_sigma=1.0,
+        frame_sigma=0.6,
+        seed=0,
+    ):
+        """
+        Predict the reflections to simulate.
+
+        :param experiment: The experiment to simulate
+        :param intensities: The intensities from simulate_intensities
+        :param d_min: The resolution limit
+        :param background: The mean background counts per pixel
+        :param spot_sigma: The standard deviation of the spot profile in pixels
+        :param frame_sigma: The standard deviation of the spot profile in frames
+        :param seed: The random seed for the counting noise
+        """
+        from dials.algorithms.spot_prediction import ScanStaticReflectionPredictor
+
+        assert len(experiment.detector) == 1, "Only single panels can be simulated"
+        self.experiment = experiment
+        self.background = background
+        self.spot_sigma = spot_sigma
+        self.frame_sigma = frame_sigma
+        self._rng = numpy.random.RandomState(seed)
+
+        predictor = ScanStaticReflectionPredictor(experiment, dmin=d_min)
+        self.reflections = predictor.for_ub(experiment.crystal.get_A())
+        asu = miller.set(
+            crystal.symmetry(
+                unit_cell=experiment.crystal.get_unit_cell(),
+                space_group=experiment.crystal.get_space_group(),
+            ),
+            self.reflections["miller_index"],
+            anomalous_flag=False,
+        ).map_to_asu()
+        self.reflections["intensity.sum.value"] = flex.double(
+            [intensities.get(h, 0.0) for h in asu.indices()]
+        )
+        self.reflections["id"] = flex.int(len(self.reflections), 0)
+
+        x, y, z = self.reflections["xyzcal.px"].parts()
+        self._x = x.as_numpy_array()
+        self._y = y.as_numpy_array()
+        self._z = z.as_numpy_array()
+        self._counts = self.reflections["intensity.sum.value"].as_numpy_array()
+
+    def __len__(self):
+        return self.experiment.scan.get_num_images()
+
+    def image(self, index):
+        """
+        Generate one image.
+
+        :param index: The index of the image in the scan, from 0
+        :returns: A 2D numpy array of counts
+        """
+        nx, ny = self.experiment.detector[0].get_image_size()
+        expected = numpy.full((ny, nx), float(self.background))
+
+        # The fraction of each spot recorded on this frame
+        reach = 4 * self.frame_sigma
+        near = (self._z > index - reach) & (self._z < index + 1 + reach)
+        z = self._z[near]
+        scale = math.sqrt(2) * self.frame_sigma
+        fraction = 0.5 * (_erf((index + 1 - z) / scale) - _erf((index - z) / scale))
+
+        half = int(math.ceil(3 * self.spot_sigma))
+        offsets = numpy.arange(-half, half + 1)
+        for xc, yc, counts in zip(
+            self._x[near], self._y[near], self._counts[near] * fraction
+        ):
+            rows = offsets + int(yc)
+            cols = offsets + int(xc)
+            row_ok = (rows >= 0) & (rows < ny)
+            col_ok = (cols >= 0) & (cols < nx)
+            if not row_ok.any() or not col_ok.any():
+                continue
+            gy = numpy.exp(-0.5 * ((rows + 0.5 - yc) / self.spot_sigma) ** 2)
+            gx = numpy.exp(-0.5 * ((cols + 0.5 - xc) / self.spot_sigma) ** 2)
+            profile = numpy.outer(gy, gx)
+            profile *= counts / profile.sum()
+            rows, cols = rows[row_ok], cols[col_ok]
+            expected[rows[0] : rows[-1] + 1, cols[0] : cols[-1] + 1] += profile[
+                numpy.ix_(row_ok, col_ok)
+            ]
+        return self._rng.poisson(expected).astype(numpy.int32)
+
+    def write(self, template):
+        """
+        Write all the images as miniCBF files.
+
+        :param template: The filename template, e.g. "image_%04d.cbf"
+        :returns: The list of filenames written
+        """
+        from dxtbx.format.FormatCBFMini import FormatCBFMini
+
+        experiment = self.experiment
+        first = experiment.scan.get_image_range()[0]
+        filenames = []
+        for i in range(len(self)):
+            image = self.image(i)
+            data = flex.int(numpy.ascontiguousarray(image).ravel())
+            data.reshape(flex.grid(*image.shape))
+            filename = template % (first + i)
+            FormatCBFMini.as_file(
+                experiment.detector,
+                experiment.beam,
+                experiment.goniometer,
+                experiment.scan[i],
+                data,
+                filename,
+            )
+            filenames.append(filename)
+        return filenames
@@ -122,6 +122,13 @@ def generate_phil_scope():
       min_chunksize = 20
         .type = int(value_min=1)
         .help = "When chunksize is auto, this is the minimum chunksize"
+
+      nthreads = 1
+        .type = int(value_min=1)
+        .help = "The number of threads to use per process to threshold each"
+                "image. Detector panels are thresholded in parallel; for a"
+                "single panel detector the threshold algorithm splits the"
+                "image between threads, if supported."
     }
   }
   """,
@@ -471,6 +478,7 @@ def from_parameters(params=None, experiments=None):
             max_spot_size=params.spotfinder.filter.max_spot_size,
             no_shoeboxes_2d=no_shoeboxes_2d,
             min_chunksize=params.spotfinder.mp.min_chunksize,
+            mp_nthreads=params.spotfinder.mp.nthreads,
         )
 
     @staticmethod
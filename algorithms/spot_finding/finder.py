@@ -3,6 +3,7 @@
 import logging
 import math
 import os
+from multiprocessing.pool import ThreadPool
 
 from dials.array_family import flex
 from dials.util import Sorry
@@ -45,6 +46,7 @@ def __init__(
         region_of_interest,
         max_strong_pixel_fraction,
         compute_mean_background,
+        nthreads=1,
     ):
         """
         Initialise the class
@@ -54,6 +56,7 @@ def __init__(
         :param mask: The image mask
         :param region_of_interest: A region of interest to process
         :param max_strong_pixel_fraction: The maximum fraction of pixels allowed
+        :param nthreads: The number of threads to use to threshold each image
         """
         self.threshold_function = threshold_function
         self.imageset = imageset
@@ -61,10 +64,12 @@ def __init__(
         self.region_of_interest = region_of_interest
         self.max_strong_pixel_fraction = max_strong_pixel_fraction
         self.compute_mean_background = compute_mean_background
+        self.nthreads = nthreads
         if self.mask is not None:
             detector = self.imageset.get_detector()
             assert len(self.mask) == len(detector)
         self.first = True
+        self.first_threshold = True
 
     def __call__(self, index):
         """
@@ -109,26 +114,15 @@ def __call__(self, index):
             % (index, sum(m.count(False) for m in mask))
         )
 
+        # Threshold the panels. With more than one panel, the panels are
+        # thresholded in parallel threads; a single panel is split between
+        # threads by the threshold algorithm itself.
+        threshold_masks = self._compute_thresholds(image, mask)
+
         # Add the images to the pixel lists
         num_strong = 0
         average_background = 0
-        for im, mk in zip(image, mask):
-            if self.region_of_interest is not None:
-                x0, x1, y0, y1 = self.region_of_interest
-                height, width = im.all()
-                assert x0 < x1, "x0 < x1"
-                assert y0 < y1, "y0 < y1"
-                assert x0 >= 0, "x0 >= 0"
-                assert y0 >= 0, "y0 >= 0"
-                assert x1 <= width, "x1 <= width"
-                assert y1 <= height, "y1 <= height"
-                im_roi = im[y0:y1, x0:x1]
-                mk_roi = mk[y0:y1, x0:x1]
-                tm_roi = self.threshold_function.compute_threshold(im_roi, mk_roi)
-                threshold_mask = flex.bool(im.accessor(), False)
-                threshold_mask[y0:y1, x0:x1] = tm_roi
-            else:
-                threshold_mask = self.threshold_function.compute_threshold(im, mk)
+        for im, mk, threshold_mask in zip(image, mask, threshold_masks):
 
             # Add the pixel list
             plist = PixelList(frame, im, threshold_mask)
@@ -172,6 +166,65 @@ def __call__(self, index):
         # Return the result
         return Result(pixel_list)
 
+    def _compute_threshold(self, im, mk, nthreads=1):
+        """
+        Compute the threshold mask for a single panel
+
+        :param im: The panel image
+        :param mk: The panel mask
+        :param nthreads: The number of threads for the threshold algorithm
+        :returns: The threshold mask
+        """
+        kwargs = {}
+        if nthreads > 1:
+            kwargs["nthreads"] = nthreads
+        if self.region_of_interest is not None:
+            x0, x1, y0, y1 = self.region_of_interest
+            height, width = im.all()
+            assert x0 < x1, "x0 < x1"
+            assert y0 < y1, "y0 < y1"
+            assert x0 >= 0, "x0 >= 0"
+            assert y0 >= 0, "y0 >= 0"
+            assert x1 <= width, "x1 <= width"
+            assert y1 <= height, "y1 <= height"
+            im_roi = im[y0:y1, x0:x1]
+            mk_roi = mk[y0:y1, x0:x1]
+            tm_roi = self.threshold_function.compute_threshold(im_roi, mk_roi, **kwargs)
+            threshold_mask = flex.bool(im.accessor(), False)
+            threshold_mask[y0:y1, x0:x1] = tm_roi
+        else:
+            threshold_mask = self.threshold_function.compute_threshold(im, mk, **kwargs)
+        return threshold_mask
+
+    def _compute_thresholds(self, image, mask):
+        """
+        Compute the threshold masks for all panels of an image
+
+        :param image: The panel images
+        :param mask: The panel masks
+        :returns: The list of threshold masks
+        """
+        if self.nthreads <= 1:
+            return [self._compute_threshold(im, mk) for im, mk in zip(image, mask)]
+        if len(image) == 1:
+            return [self._compute_threshold(image[0], mask[0], self.nthreads)]
+
+        # The threshold function may set up state (e.g. an automatic global
+        # threshold) from the first panel it sees, so do that one first
+        masks = []
+        panels = list(zip(image, mask))
+        if self.first_threshold:
+            masks.append(self._compute_threshold(*panels[0]))
+            panels = panels[1:]
+            self.first_threshold = False
+        pool = ThreadPool(min(self.nthreads, len(panels)))
+        try:
+            masks.extend(pool.map(lambda p: self._compute_threshold(*p), panels))
+        finally:
+            pool.close()
+            pool.join()
+        return masks
+
 
 class ExtractPixelsFromImage2DNoShoeboxes(ExtractPixelsFromImage):
     """
@@ -189,6 +242,7 @@ def __init__(
         min_spot_size,
         max_spot_size,
         filter_spots,
+        nthreads=1,
     ):
         """
         Initialise the class
@@ -198,6 +252,7 @@ def __init__(
         :param mask: The image mask
         :param region_of_interest: A region of interest to process
         :param max_strong_pixel_fraction: The maximum fraction of pixels allowed
+        :param nthreads: The number of threads to use to threshold each image
         """
         super(ExtractPixelsFromImage2DNoShoeboxes, self).__init__(
             imageset,
@@ -206,6 +261,7 @@ def __init__(
             region_of_interest,
             max_strong_pixel_fraction,
             compute_mean_background,
+            nthreads=nthreads,
         )
 
         # Save some stuff
@@ -272,6 +328,86 @@ def __call__(self, task):
         return result, handlers[0].messages()
 
 
+class LabelledChunk(object):
+    """
+    The spots found in a chunk of consecutive images.
+
+    Spots lying entirely within the chunk are labelled by the worker and held
+    as shoeboxes. The pixels of spots touching the first or last image of the
+    chunk are kept as they are, to be joined to the spots in the neighbouring
+    chunks.
+    """
+
+    def __init__(self, frame_range):
+        self.frame_range = frame_range
+        self.shoeboxes = []
+        self.spot_size = []
+        self.hot_pixels = []
+        self.boundary_coords = []
+        self.boundary_values = []
+        self.image_size = []
+
+
+def _is_twod(imageset):
+    """
+    Check if spots in the imageset should be labelled image by image
+    """
+    from dxtbx.imageset import ImageSequence
+
+    if isinstance(imageset, ImageSequence):
+        return imageset.get_scan().is_still()
+    return True
+
+
+class ExtractSpotsChunkTask(object):
+    """
+    Extract the strong pixels from a chunk of images and label them
+
+    Labelling each chunk in the worker means only the pixels of spots crossing
+    the chunk boundaries are left to be joined in the parent process.
+    """
+
+    def __init__(self, function, pixel_list_to_shoeboxes, twod, num_images):
+        """
+        Initialise with the pixel extraction function and the labelling options
+        """
+        self.function = function
+        self.pixel_list_to_shoeboxes = pixel_list_to_shoeboxes
+        self.twod = twod
+        self.num_images = num_images
+
+    def __call__(self, indices):
+        """
+        Extract and label the pixels on the images and save the IO
+        """
+        from dials.model.data import PixelListLabeller
+        from dials.util import log
+
+        log.config_simple_cached()
+        pixel_labeller = None
+        for index in indices:
+            result = self.function(index)
+            if pixel_labeller is None:
+                pixel_labeller = [PixelListLabeller() for p in result.pixel_list]
+            for plabeller, plist in zip(pixel_labeller, result.pixel_list):
+                plabeller.add(plist)
+
+        # Spots on the first or last image of the chunk may continue into the
+        # neighbouring chunks, unless that is the end of the imageset
+        edge_frames = []
+        frame_range = pixel_labeller[0].frame_range()
+        if indices[0] > 0:
+            edge_frames.append(frame_range[0])
+        if indices[-1] < self.num_images - 1:
+            edge_frames.append(frame_range[1] - 1)
+        chunk = self.pixel_list_to_shoeboxes.label_chunk(
+            pixel_labeller, self.twod, edge_frames
+        )
+        handlers = logging.getLogger("dials").handlers
+        assert len(handlers) == 1, "Invalid number of logging handlers"
+        return chunk, handlers[0].messages()
+
+
 class PixelListToShoeboxes(object):
     """
     A helper class to convert pixel list to shoeboxes
@@ -289,20 +425,11 @@ def __call__(self, imageset, pixel_labeller):
         """
         Convert the pixel list to shoeboxes
         """
-        from dxtbx.imageset import ImageSequence
-
         # Extract the pixel lists into a list of reflections
         shoeboxes = flex.shoebox()
         spotsizes = flex.size_t()
         hotpixels = tuple(flex.size_t() for i in range(len(imageset.get_detector())))
-        if isinstance(imageset, ImageSequence):
-            scan = imageset.get_scan()
-            if scan.is_still():
-                twod = True
-            else:
-                twod = False
-        else:
-            twod = True
+        twod = _is_twod(imageset)
         for i, (p, hp) in enumerate(zip(pixel_labeller, hotpixels)):
             if p.num_pixels() > 0:
                 creator = flex.PixelListShoeboxCreator(
@@ -317,6 +444,146 @@ def __call__(self, imageset, pixel_labeller):
                 shoeboxes.extend(creator.result())
                 spotsizes.extend(creator.spot_size())
                 hp.extend(creator.hot_pixels())
+
+        # Return the shoeboxes
+        return self._select_allocated(shoeboxes, spotsizes), hotpixels
+
+    def label_chunk(self, pixel_labeller, twod, edge_frames):
+        """
+        Label the pixels from a chunk of images
+
+        :param pixel_labeller: The pixel labeller for each panel
+        :param twod: Label the spots on each image separately
+        :param edge_frames: The frames on which spots may join other chunks
+        :return: A LabelledChunk
+        """
+        import numpy
+
+        frame_range = None
+        if pixel_labeller and pixel_labeller[0].num_frames() > 0:
+            frame_range = pixel_labeller[0].frame_range()
+        chunk = LabelledChunk(frame_range)
+        for i, p in enumerate(pixel_labeller):
+            shoeboxes = flex.shoebox()
+            spot_size = flex.size_t()
+            hot_pixels = flex.size_t()
+            coords = flex.vec3_int()
+            values = flex.double()
+            if p.num_pixels() > 0:
+                creator = flex.PixelListShoeboxCreator(
+                    p,
+                    i,  # panel
+                    0,  # zrange
+                    twod,  # twod
+                    self.min_spot_size,  # min_pixels
+                    self.max_spot_size,  # max_pixels
+                    self.write_hot_pixel_mask,
+                )
+                shoeboxes = creator.result()
+                spot_size = creator.spot_size()
+                hot_pixels = creator.hot_pixels()
+                if not twod and edge_frames:
+                    # The labels are the indices of the shoeboxes, so find the
+                    # spots with a pixel on an edge frame and split them off
+                    labels = p.labels_3d().as_numpy_array()
+                    z = p.coords().as_vec3_double().parts()[0].as_numpy_array()
+                    on_edge = numpy.isin(numpy.rint(z).astype(int), edge_frames)
+                    at_boundary = numpy.zeros(len(shoeboxes), dtype=numpy.int32)
+                    at_boundary[labels[on_edge]] = 1
+                    interior = flex.int(at_boundary) == 0
+                    boundary = flex.int(at_boundary[labels]) == 1
+                    shoeboxes = shoeboxes.select(interior)
+                    spot_size = spot_size.select(interior)
+                    coords = p.coords().select(boundary)
+                    values = p.values().select(boundary)
+            chunk.shoeboxes.append(shoeboxes)
+            chunk.spot_size.append(spot_size)
+            chunk.hot_pixels.append(hot_pixels)
+            chunk.boundary_coords.append(coords)
+            chunk.boundary_values.append(values)
+            chunk.image_size.append(p.size())
+        return chunk
+
+    def from_chunks(self, imageset, chunks):
+        """
+        Combine the spots labelled in chunks of images into shoeboxes
+
+        :param imageset: The imageset
+        :param chunks: The LabelledChunk from each chunk of images
+        :return: The shoeboxes and hot pixels
+        """
+        import numpy
+        from dials.model.data import PixelList, PixelListLabeller
+
+        chunks = sorted(
+            (c for c in chunks if c.frame_range is not None),
+            key=lambda c: c.frame_range[0],
+        )
+        num_panels = len(imageset.get_detector())
+        shoeboxes = flex.shoebox()
+        spotsizes = flex.size_t()
+        hotpixels = []
+        for i in range(num_panels):
+            coords = flex.vec3_int()
+            values = flex.double()
+            hot = None
+            for chunk in chunks:
+                shoeboxes.extend(chunk.shoeboxes[i])
+                spotsizes.extend(chunk.spot_size[i])
+                coords.extend(chunk.boundary_coords[i])
+                values.extend(chunk.boundary_values[i])
+                if hot is None:
+                    hot = set(chunk.hot_pixels[i])
+                else:
+                    hot &= set(chunk.hot_pixels[i])
+            hotpixels.append(flex.size_t(sorted(hot or [])))
+
+            # Label the spots crossing chunk boundaries. Chunks cover
+            # consecutive frames so the pixels are already in order.
+            if len(coords) == 0:
+                continue
+            nx = chunks[0].image_size[i][1]
+            z, y, x = coords.as_vec3_double().parts()
+            z = z.iround()
+            index = (y * nx + x).iround()
+            frames = numpy.arange(flex.min(z), flex.max(z) + 2)
+            bounds = numpy.searchsorted(z.as_numpy_array(), frames)
+            labeller = PixelListLabeller()
+            for frame, first, last in zip(frames, bounds[:-1], bounds[1:]):
+                first, last = int(first), int(last)
+                labeller.add(
+                    PixelList(
+                        int(frame),
+                        chunks[0].image_size[i],
+                        values[first:last],
+                        flex.size_t(list(index[first:last])),
+                    )
+                )
+            creator = flex.PixelListShoeboxCreator(
+                labeller,
+                i,  # panel
+                0,  # zrange
+                False,  # twod
+                self.min_spot_size,  # min_pixels
+                self.max_spot_size,  # max_pixels
+                False,
+            )
+            shoeboxes.extend(creator.result())
+            spotsizes.extend(creator.spot_size())
+
+        # Put the spots in the order they would be labelled in one pass
+        bbox = shoeboxes.bounding_boxes()
+        key = shoeboxes.panels().as_double() * 1e9 + bbox.parts()[4].as_double()
+        order = flex.sort_permutation(key, stable=True)
+        shoeboxes = shoeboxes.select(order)
+        spotsizes = spotsizes.select(order)
+
+        return self._select_allocated(shoeboxes, spotsizes), tuple(hotpixels)
+
+    def _select_allocated(self, shoeboxes, spotsizes):
+        """
+        Select the shoeboxes of spots within the size limits
+        """
         logger.info("")
         logger.info("Extracted {} spots".format(len(shoeboxes)))
 
@@ -332,9 +599,7 @@ def __call__(self, imageset, pixel_labeller):
         logger.info(
             "Removed %d spots with size > %d pixels" % (ntoolarge, self.max_spot_size)
         )
-
-        # Return the shoeboxes
-        return shoeboxes, hotpixels
+        return shoeboxes
 
 
 class ShoeboxesToReflectionTable(object):
@@ -402,6 +667,16 @@ def __call__(self, imageset, pixel_labeller):
 
         return self.shoeboxes_to_reflection_table(imageset, shoeboxes), hot_pixels
 
+    def from_chunks(self, imageset, chunks):
+        """
+        Convert spots labelled in chunks of images to reflection table
+        """
+        shoeboxes, hot_pixels = self.pixel_list_to_shoeboxes.from_chunks(
+            imageset, chunks
+        )
+
+        return self.shoeboxes_to_reflection_table(imageset, shoeboxes), hot_pixels
+
 
 class ExtractSpots(object):
     """
@@ -425,6 +700,7 @@ def __init__(
         no_shoeboxes_2d=False,
         min_chunksize=50,
         write_hot_pixel_mask=False,
+        mp_nthreads=1,
     ):
         """
         Initialise the class with the strategy
@@ -434,6 +710,7 @@ def __init__(
         :param mp_method: The multi processing method
         :param nproc: The number of processors
         :param max_strong_pixel_fraction: The maximum number of strong pixels
+        :param mp_nthreads: The number of threads to threshold each image
         """
         # Set the required strategies
         self.threshold_function = threshold_function
@@ -442,6 +719,7 @@ def __init__(
         self.mp_chunksize = mp_chunksize
         self.mp_nproc = mp_nproc
         self.mp_njobs = mp_njobs
+        self.mp_nthreads = mp_nthreads
         self.max_strong_pixel_fraction = max_strong_pixel_fraction
         self.compute_mean_background = compute_mean_background
         self.region_of_interest = region_of_interest
@@ -487,7 +765,7 @@ def _find_spots(self, imageset):
         :return: The list of spot shoeboxes
         """
         from dials.model.data import PixelListLabeller
-        from dials.util.mp import batch_multi_node_parallel_map
+        from dials.util.mp import multi_node_parallel_map
 
         # Change the number of processors if necessary
         mp_nproc = self.mp_nproc
@@ -527,6 +805,7 @@ def _find_spots(self, imageset):
             max_strong_pixel_fraction=self.max_strong_pixel_fraction,
             compute_mean_background=self.compute_mean_background,
             region_of_interest=self.region_of_interest,
+            nthreads=self.mp_nthreads,
         )
 
         # The indices to iterate over
@@ -545,27 +824,43 @@ def _find_spots(self, imageset):
             )
         else:
             logger.info(" Using multiprocessing with %d parallel job(s)\n" % (mp_nproc))
+
+        # Create shoeboxes from pixel list
+        converter = PixelListToReflectionTable(
+            self.min_spot_size,
+            self.max_spot_size,
+            self.filter_spots,
+            self.write_hot_pixel_mask,
+        )
+
         if mp_nproc > 1 or mp_njobs > 1:
 
             def process_output(result):
                 for message in result[1]:
                     logger.log(message.levelno, message.msg)
-                assert len(pixel_labeller) == len(
-                    result[0].pixel_list
-                ), "Inconsistent size"
-                for plabeller, plist in zip(pixel_labeller, result[0].pixel_list):
-                    plabeller.add(plist)
-                result[0].pixel_list = None
 
-            batch_multi_node_parallel_map(
-                func=ExtractSpotsParallelTask(function),
-                iterable=indices,
+            # Each worker labels the spots in its own chunk of images so that
+            # only spots crossing chunk boundaries are labelled here
+            chunks = [
+                indices[i : i + mp_chunksize]
+                for i in range(0, len(indices), mp_chunksize)
+            ]
+            results = multi_node_parallel_map(
+                func=ExtractSpotsChunkTask(
+                    function,
+                    converter.pixel_list_to_shoeboxes,
+                    _is_twod(imageset),
+                    len(imageset),
+                ),
+                iterable=chunks,
                 nproc=mp_nproc,
                 njobs=mp_njobs,
                 cluster_method=mp_method,
-                chunksize=mp_chunksize,
                 callback=process_output,
+                preserve_order=True,
+                preserve_exception_message=True,
             )
+            return converter.from_chunks(imageset, [r[0] for r in results])
         else:
             for task in indices:
                 result = function(task)
@@ -576,13 +871,6 @@ def process_output(result):
                     plabeller.add(plist)
                     result.pixel_list = None
 
-        # Create shoeboxes from pixel list
-        converter = PixelListToReflectionTable(
-            self.min_spot_size,
-            self.max_spot_size,
-            self.filter_spots,
-            self.write_hot_pixel_mask,
-        )
         return converter(imageset, pixel_labeller)
 
     def _find_spots_2d_no_shoeboxes(self, imageset):
@@ -633,6 +921,7 @@ def _find_spots_2d_no_shoeboxes(self, imageset):
             min_spot_size=self.min_spot_size,
             max_spot_size=self.max_spot_size,
             filter_spots=self.filter_spots,
+            nthreads=self.mp_nthreads,
         )
 
         # The indices to iterate over
@@ -700,6 +989,7 @@ def __init__(
         max_spot_size=20,
         no_shoeboxes_2d=False,
         min_chunksize=50,
+        mp_nthreads=1,
     ):
         """
         Initialise the class.
@@ -726,6 +1016,7 @@ def __init__(
         self.mp_chunksize = mp_chunksize
         self.mp_nproc = mp_nproc
         self.mp_njobs = mp_njobs
+        self.mp_nthreads = mp_nthreads
         self.no_shoeboxes_2d = no_shoeboxes_2d
         self.min_chunksize = min_chunksize
 
@@ -835,6 +1126,7 @@ def _find_spots_in_imageset(self, imageset):
             no_shoeboxes_2d=self.no_shoeboxes_2d,
             min_chunksize=self.min_chunksize,
             write_hot_pixel_mask=self.write_hot_mask,
+            mp_nthreads=self.mp_nthreads,
         )
 
         # Get the max scan range
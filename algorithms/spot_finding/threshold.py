@@ -39,6 +39,7 @@ def __init__(self, **kwargs):
         self._n_sigma_s = kwargs.get("n_sigma_s", 3)
         self._min_count = kwargs.get("min_count", 2)
         self._threshold = kwargs.get("global_threshold", 0)
+        self._nthreads = kwargs.get("nthreads", 1)
 
         # Save the constant gain
         self._gain_map = None
@@ -68,6 +69,7 @@ def __call__(self, image, mask):
                 self._n_sigma_s,
                 self._threshold,
                 self._min_count,
+                self._nthreads,
             )
             self.algorithm[image.all()] = algorithm
 
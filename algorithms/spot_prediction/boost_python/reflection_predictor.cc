@@ -10,12 +10,44 @@
  */
 #include <boost/python.hpp>
 #include <boost/python/def.hpp>
+#include <dials/util/scoped_gil_release.h>
 #include <dials/algorithms/spot_prediction/reflection_predictor.h>
 
 namespace dials { namespace algorithms { namespace boost_python {
 
   using namespace boost::python;
 
+  using dials::util::scoped_gil_release;
+
+  template <typename Predictor>
+  void for_reflection_table_nogil(Predictor &self,
+                                  af::reflection_table table,
+                                  const mat3<double> &ub) {
+    scoped_gil_release release;
+    self.for_reflection_table(table, ub);
+  }
+
+  template <typename Predictor>
+  void for_reflection_table_with_individual_ub_nogil(
+    Predictor &self,
+    af::reflection_table table,
+    const af::const_ref<mat3<double> > &ub) {
+    scoped_gil_release release;
+    self.for_reflection_table_with_individual_ub(table, ub);
+  }
+
+  template <typename Predictor>
+  void for_reflection_table_with_individual_models_nogil(
+    Predictor &self,
+    af::reflection_table table,
+    const af::const_ref<mat3<double> > &ub,
+    const af::const_ref<vec3<double> > &s0,
+    const af::const_ref<mat3<double> > &d,
+    const af::const_ref<mat3<double> > &S) {
+    scoped_gil_release release;
+    self.for_reflection_table(table, ub, s0, d, S);
+  }
+
   void export_scan_static_reflection_predictor() {
     typedef ScanStaticReflectionPredictor Predictor;
 
@@ -31,10 +63,13 @@ namespace dials { namespace algorithms { namespace boost_python {
                 double>())
       .def("for_ub_old_index_generator", &Predictor::for_ub_old_index_generator)
       .def("for_ub", &Predictor::for_ub)
+      .def("for_ub_on_frame_range", &Predictor::for_ub_on_frame_range)
+      .def("frame_range", &Predictor::frame_range)
       .def("for_hkl", &Predictor::for_hkl)
       .def("for_hkl", &Predictor::for_hkl_with_individual_ub)
-      .def("for_reflection_table", &Predictor::for_reflection_table)
-      .def("for_reflection_table", &Predictor::for_reflection_table_with_individual_ub);
+      .def("for_reflection_table", &for_reflection_table_nogil<Predictor>)
+      .def("for_reflection_table",
+           &for_reflection_table_with_individual_ub_nogil<Predictor>);
   }
 
   void export_scan_varying_reflection_predictor() {
@@ -51,10 +86,15 @@ namespace dials { namespace algorithms { namespace boost_python {
                 double>())
       .def("for_ub", &Predictor::for_ub)
       .def("for_ub_on_single_image", &Predictor::for_ub_on_single_image)
+      .def("for_ub_on_frame_range", &Predictor::for_ub_on_frame_range)
       .def("for_varying_models", &Predictor::for_varying_models)
+      .def("for_varying_models_on_frame_range",
+           &Predictor::for_varying_models_on_frame_range)
+      .def("frame_range", &Predictor::frame_range)
       .def("for_varying_models_on_single_image",
            &Predictor::for_varying_models_on_single_image)
-      .def("for_reflection_table", &Predictor::for_reflection_table);
+      .def("for_reflection_table",
+           &for_reflection_table_with_individual_models_nogil<Predictor>);
   }
 
   void export_stills_delta_psi_reflection_predictor() {
@@ -85,8 +125,9 @@ namespace dials { namespace algorithms { namespace boost_python {
       .def("__call__", predict_observed)
       .def("__call__", predict_observed_with_panel)
       .def("__call__", predict_observed_with_panel_list)
-      .def("for_reflection_table", &Predictor::for_reflection_table)
-      .def("for_reflection_table", &Predictor::for_reflection_table_with_individual_ub);
+      .def("for_reflection_table", &for_reflection_table_nogil<Predictor>)
+      .def("for_reflection_table",
+           &for_reflection_table_with_individual_ub_nogil<Predictor>);
   }
 
   void export_nave_stills_reflection_predictor() {
@@ -119,8 +160,9 @@ namespace dials { namespace algorithms { namespace boost_python {
       .def("__call__", predict_observed)
       .def("__call__", predict_observed_with_panel)
       .def("__call__", predict_observed_with_panel_list)
-      .def("for_reflection_table", &Predictor::for_reflection_table)
-      .def("for_reflection_table", &Predictor::for_reflection_table_with_individual_ub);
+      .def("for_reflection_table", &for_reflection_table_nogil<Predictor>)
+      .def("for_reflection_table",
+           &for_reflection_table_with_individual_ub_nogil<Predictor>);
   }
 
   void export_spherical_relp_stills_reflection_predictor() {
@@ -151,8 +193,9 @@ namespace dials { namespace algorithms { namespace boost_python {
       .def("__call__", predict_observed)
       .def("__call__", predict_observed_with_panel)
       .def("__call__", predict_observed_with_panel_list)
-      .def("for_reflection_table", &Predictor::for_reflection_table)
-      .def("for_reflection_table", &Predictor::for_reflection_table_with_individual_ub);
+      .def("for_reflection_table", &for_reflection_table_nogil<Predictor>)
+      .def("for_reflection_table",
+           &for_reflection_table_with_individual_ub_nogil<Predictor>);
   }
 
   void export_reflection_predictor() {
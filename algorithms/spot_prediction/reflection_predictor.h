@@ -138,13 +138,36 @@ namespace dials { namespace algorithms {
      * @returns A reflection table.
      */
     af::reflection_table for_ub(const mat3<double> &ub) const {
-      // Get the array range and loop through all the images
+      vec2<int> frames = frame_range();
+      return for_ub_on_frame_range(ub, frames[0], frames[1]);
+    }
+
+    /**
+     * @returns The range of frames to predict on, including the padding
+     */
+    vec2<int> frame_range() const {
       double a0 = scan_.get_oscillation_range()[0];
       double a1 = scan_.get_oscillation_range()[1];
       int z0 =
         std::floor(scan_.get_array_index_from_angle(a0 - padding_ * pi / 180.0) + 0.5);
       int z1 =
         std::floor(scan_.get_array_index_from_angle(a1 + padding_ * pi / 180.0) + 0.5);
+      return vec2<int>(z0, z1);
+    }
+
+    /**
+     * Predict reflections for UB on a range of frames. Only reflections whose
+     * predicted centroid lies on a frame in the range are returned so that
+     * predictions on consecutive ranges do not overlap.
+     * @param ub The UB matrix
+     * @param z0 The first frame
+     * @param z1 The last frame (exclusive)
+     * @returns A reflection table.
+     */
+    af::reflection_table for_ub_on_frame_range(const mat3<double> &ub,
+                                               int z0,
+                                               int z1) const {
+      DIALS_ASSERT(z1 >= z0);
 
       // Get the rotation axis and beam vector
       vec3<double> m2 = goniometer_.get_rotation_axis_datum();
@@ -459,21 +482,43 @@ namespace dials { namespace algorithms {
      * @returns The reflection table
      */
     af::reflection_table for_ub(const af::const_ref<mat3<double> > &A) const {
-      DIALS_ASSERT(A.size() == scan_.get_num_images() + 1);
-
-      // Create the table and local stuff
-      af::reflection_table table;
-      prediction_data predictions(table);
+      vec2<int> frames = frame_range();
+      return for_ub_on_frame_range(A, frames[0], frames[1]);
+    }
 
-      // Get the array range and loop through all the images
-      vec2<int> array_range = scan_.get_array_range();
+    /**
+     * @returns The range of frames to predict on, including the padding
+     */
+    vec2<int> frame_range() const {
       double a0 = scan_.get_oscillation_range()[0];
       double a1 = scan_.get_oscillation_range()[1];
       int z0 =
         std::floor(scan_.get_array_index_from_angle(a0 - padding_ * pi / 180.0) + 0.5);
       int z1 =
         std::floor(scan_.get_array_index_from_angle(a1 + padding_ * pi / 180.0) + 0.5);
-      const int offset = array_range[0];
+      return vec2<int>(z0, z1);
+    }
+
+    /**
+     * Predict the reflections on a range of frames given an array of UB
+     * matrices.
+     * @param A The UB matrix recorded at scan points
+     * @param z0 The first frame
+     * @param z1 The last frame (exclusive)
+     * @returns The reflection table
+     */
+    af::reflection_table for_ub_on_frame_range(const af::const_ref<mat3<double> > &A,
+                                               int z0,
+                                               int z1) const {
+      DIALS_ASSERT(A.size() == scan_.get_num_images() + 1);
+      DIALS_ASSERT(z1 >= z0);
+
+      // Create the table and local stuff
+      af::reflection_table table;
+      prediction_data predictions(table);
+
+      // Loop through all the images
+      const int offset = scan_.get_array_range()[0];
       for (int frame = z0; frame < z1; ++frame) {
         int i = frame - offset;
         if (i < 0) i = 0;
@@ -523,23 +568,37 @@ namespace dials { namespace algorithms {
       const af::const_ref<mat3<double> > &A,
       const af::const_ref<vec3<double> > &s0,
       const af::const_ref<mat3<double> > &S) const {
+      vec2<int> frames = frame_range();
+      return for_varying_models_on_frame_range(A, s0, S, frames[0], frames[1]);
+    }
+
+    /**
+     * Predict the reflections on a range of frames given arrays of models that
+     * are allowed to vary.
+     * @param A The UB matrix recorded at scan points
+     * @param s0 The s0 vector recorded at scan points
+     * @param S The setting rotation matrix recorded at scan points
+     * @param z0 The first frame
+     * @param z1 The last frame (exclusive)
+     * @returns The reflection table
+     */
+    af::reflection_table for_varying_models_on_frame_range(
+      const af::const_ref<mat3<double> > &A,
+      const af::const_ref<vec3<double> > &s0,
+      const af::const_ref<mat3<double> > &S,
+      int z0,
+      int z1) const {
       DIALS_ASSERT(A.size() == scan_.get_num_images() + 1);
       DIALS_ASSERT(s0.size() == A.size());
       DIALS_ASSERT(S.size() == A.size());
+      DIALS_ASSERT(z1 >= z0);
 
       // Create the table and local stuff
       af::reflection_table table;
       prediction_data predictions(table);
 
-      // Get the array range and loop through all the images
-      vec2<int> array_range = scan_.get_array_range();
-      double a0 = scan_.get_oscillation_range()[0];
-      double a1 = scan_.get_oscillation_range()[1];
-      int z0 =
-        std::floor(scan_.get_array_index_from_angle(a0 - padding_ * pi / 180.0) + 0.5);
-      int z1 =
-        std::floor(scan_.get_array_index_from_angle(a1 + padding_ * pi / 180.0) + 0.5);
-      const int offset = array_range[0];
+      // Loop through all the images
+      const int offset = scan_.get_array_range()[0];
       for (int frame = z0; frame < z1; ++frame) {
         int i = frame - offset;
         if (i < 0) i = 0;
@@ -61,12 +61,17 @@ def __init__(
         from dials.array_family import flex
 
         class Predictor(object):
-            def __init__(self, name, func):
+            def __init__(self, name, func, func_for_range=None, frame_range=None):
                 self.name = name
                 self.func = func
+                self.func_for_range = func_for_range
+                self.frame_range = frame_range
 
-            def __call__(self):
-                result = self.func()
+            def __call__(self, frames=None):
+                if frames is None:
+                    result = self.func()
+                else:
+                    result = self.func_for_range(*frames)
                 if dmax is not None:
                     assert dmax > 0
                     result.compute_d_single(experiment)
@@ -104,6 +109,10 @@ def __call__(self):
                     predict = Predictor(
                         "scan varying crystal prediction",
                         lambda: predictor.for_ub(flex.mat3_double(A)),
+                        lambda z0, z1: predictor.for_ub_on_frame_range(
+                            flex.mat3_double(A), z0, z1
+                        ),
+                        predictor.frame_range(),
                     )
 
                 else:
@@ -139,6 +148,14 @@ def __call__(self):
                             flex.vec3_double(s0),
                             flex.mat3_double(S),
                         ),
+                        lambda z0, z1: predictor.for_varying_models_on_frame_range(
+                            flex.mat3_double(A),
+                            flex.vec3_double(s0),
+                            flex.mat3_double(S),
+                            z0,
+                            z1,
+                        ),
+                        predictor.frame_range(),
                     )
             else:
                 predictor = ScanStaticReflectionPredictor(
@@ -152,9 +169,15 @@ def __call__(self):
                 else:
                     predict_method = predictor.for_ub
 
+                # Prediction on a range of frames always uses the per-image
+                # index generator so that each range can be predicted alone
                 predict = Predictor(
                     "scan static prediction",
                     lambda: predict_method(experiment.crystal.get_A()),
+                    lambda z0, z1: predictor.for_ub_on_frame_range(
+                        experiment.crystal.get_A(), z0, z1
+                    ),
+                    predictor.frame_range(),
                 )
         else:
             predictor = StillsReflectionPredictor(experiment, dmin=dmin)
@@ -178,6 +201,29 @@ def __call__(self):
         logger.info("Predicted %d reflections" % len(table))
         return table
 
+    def frame_range(self):
+        """
+        Get the range of frames on which reflections are predicted, including
+        any padding. Stills have no frame range.
+
+        :return: The (first, last) frames or None
+        """
+        return self._predict.frame_range
+
+    def for_frame_range(self, z0, z1):
+        """
+        Predict the reflections whose centroids lie on a range of frames.
+
+        :param z0: The first frame
+        :param z1: The last frame (exclusive)
+        :return: A reflection table
+        """
+        if self._predict.func_for_range is None:
+            raise RuntimeError(
+                "%s cannot be done on a range of frames" % self._predict.name
+            )
+        return self._predict((z0, z1))
+
     def predictor(self, index):
         """
         Get the predictor for the given experiment index.
@@ -6,8 +6,6 @@
 from collections import defaultdict
 from math import sqrt, floor
 
-from cctbx import miller
-from cctbx import crystal
 from dials.array_family import flex
 import six
 
@@ -235,12 +233,9 @@ def compute_overall_stats(self):
 
     def map_to_asu(self):
         """Map the miller indices to the ASU"""
-        # d = flex.double([self.mean_unit_cell.d(h) for h in reflection_table["miller_index"]])
-        cs = crystal.symmetry(self.mean_unit_cell, space_group=self.space_group)
-        ms = miller.set(cs, self.reflection_table["miller_index"], anomalous_flag=False)
-        ms_asu = ms.map_to_asu()
-        self.reflection_table["miller_index"] = ms_asu.indices()
-        self.reflection_table["d"] = ms_asu.d_spacings().data()
+        asu_indices = self.reflection_table.asu_index(self.space_group).miller_index
+        self.reflection_table["miller_index"] = asu_indices.deep_copy()
+        self.reflection_table["d"] = self.mean_unit_cell.d(asu_indices)
 
     def d_filter(self):
         """Filter on d_min, d_max"""
@@ -13,27 +13,47 @@
     ScrewAxis63c,
     ScrewAxis31c,
     ScrewAxisObserver,
+    score_screw_axes_in_datasets,
 )
 
 
-def score_screw_axes(laue_group_info, reflection_table, significance_level=0.95):
-    """Get the relevant screw axes and score them. Print pretty table."""
-    scores = []
+def _screw_axes(laue_group_info):
+    """Get the unique screw axes of a laue group, with their equivalent axes."""
     axes = []
     for axis in laue_group_info["unique_axes"]:
         a = axis()
-        a.register_observer(
-            event="selected data for scoring", observer=ScrewAxisObserver()
-        )
         if "equivalent_axes" in laue_group_info:
             if axis in laue_group_info["equivalent_axes"]:
                 for equivalent in laue_group_info["equivalent_axes"][axis]:
                     a.add_equivalent_axis(equivalent())
-        scores.append(a.score_axis(reflection_table, significance_level))
         axes.append(a)
+    return axes
+
+
+def score_screw_axes(laue_group_info, reflection_table, significance_level=0.95):
+    """Get the relevant screw axes and score them. Print pretty table."""
+    ((axes, scores),) = score_screw_axes_in_datasets(
+        _screw_axes(laue_group_info), [reflection_table], significance_level
+    )
+    for a in axes:
+        a.register_observer(
+            event="selected data for scoring", observer=ScrewAxisObserver()
+        )
+        a.notify(event="selected data for scoring")
     return axes, scores
 
 
+def score_screw_axes_multi(laue_group_info, reflection_tables, significance_level=0.95):
+    """
+    Score the screw axes of a laue group in a number of datasets at once.
+
+    :returns: A list of (screw axes, scores) pairs, one for each dataset
+    """
+    return score_screw_axes_in_datasets(
+        _screw_axes(laue_group_info), reflection_tables, significance_level
+    )
+
+
 def score_space_groups(screw_axis_scores, laue_group_info):
     """Score the space groups in a laue group based on axes scores."""
     space_groups = []
@@ -1,7 +1,9 @@
 """Definitions of screw axes with methods for scoring against data."""
 from __future__ import absolute_import, division, print_function
+import collections
 import math
 import logging
+import numpy
 from scitbx.array_family import flex
 from dials.algorithms.symmetry.absences.plots import plot_screw_axes
 from dials.util.observer import Observer, Subject, singleton
@@ -10,6 +12,163 @@
 
 logger = logging.getLogger("dials.space_group")
 
+# Sums over the reflections expected present and absent for a screw axis, and
+# the largest I/sigma of the absent reflections with its intensity
+ScrewAxisStatistics = collections.namedtuple(
+    "ScrewAxisStatistics",
+    [
+        "n_present",
+        "n_absent",
+        "sum_i_over_sigma",
+        "sum_i_over_sigma_abs",
+        "sum_intensity",
+        "sum_intensity_abs",
+        "max_i_over_sigma_abs",
+        "intensity_of_max_abs",
+    ],
+)
+
+
+def axial_reflections(axes, miller_indices):
+    """
+    Find the reflections along each of a number of screw axes in one pass.
+
+    A reflection is selected for a screw axis if it lies along the axis or one
+    of its equivalent axes, so a reflection can be selected for more than one
+    screw axis.
+
+    :param axes: The screw axes
+    :param miller_indices: The Miller indices
+    :returns: Numpy arrays of the row of each selected reflection, the index of
+              the screw axis it was selected for, and its index along the axis
+    """
+    hkl = miller_indices.as_vec3_double().as_numpy_array()
+    zero = hkl == 0
+    on_axis = [
+        numpy.flatnonzero(zero[:, 1] & zero[:, 2]),
+        numpy.flatnonzero(zero[:, 0] & zero[:, 2]),
+        numpy.flatnonzero(zero[:, 0] & zero[:, 1]),
+    ]
+    rows, groups, values = [], [], []
+    for i, axis in enumerate(axes):
+        for a in [axis] + axis.equivalent_axes:
+            selected = on_axis[a.axis_idx]
+            rows.append(selected)
+            groups.append(numpy.full(selected.size, i, dtype=numpy.int64))
+            values.append(hkl[selected, a.axis_idx])
+    if not rows:
+        return (numpy.zeros(0, dtype=numpy.int64),) * 2 + (numpy.zeros(0),)
+    return numpy.concatenate(rows), numpy.concatenate(groups), numpy.concatenate(values)
+
+
+def screw_axis_statistics(groups, values, intensities, sigmas, repeats):
+    """
+    Compute the statistics for scoring many screw axes with grouped sums.
+
+    :param groups: The group of each reflection, indexing the repeats
+    :param values: The index of each reflection along its axis
+    :param intensities: The intensities
+    :param sigmas: The intensity sigmas
+    :param repeats: The repeat of present reflections along the axis of each group
+    :returns: A list of ScrewAxisStatistics, one for each group
+    """
+    n_groups = len(repeats)
+    repeats = numpy.asarray(repeats, dtype=numpy.int64)
+    absent = numpy.rint(values).astype(numpy.int64) % repeats[groups] != 0
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        i_over_sigma = intensities / sigmas
+
+    # Even bins hold the reflections expected present, odd bins the absent
+    bins = 2 * groups + absent
+    n = numpy.bincount(bins, minlength=2 * n_groups)
+    sum_i_over_sigma = numpy.bincount(bins, i_over_sigma, minlength=2 * n_groups)
+    sum_intensity = numpy.bincount(bins, intensities, minlength=2 * n_groups)
+
+    # The last of the absent reflections of each group, sorted by I/sigma
+    max_i_over_sigma = numpy.zeros(n_groups)
+    intensity_of_max = numpy.zeros(n_groups)
+    order = numpy.lexsort((i_over_sigma, groups))
+    order = order[absent[order]]
+    if order.size:
+        sorted_groups = groups[order]
+        last = numpy.flatnonzero(
+            numpy.append(sorted_groups[1:] != sorted_groups[:-1], True)
+        )
+        max_i_over_sigma[groups[order[last]]] = i_over_sigma[order[last]]
+        intensity_of_max[groups[order[last]]] = intensities[order[last]]
+
+    return [
+        ScrewAxisStatistics(
+            int(n[2 * i]),
+            int(n[2 * i + 1]),
+            sum_i_over_sigma[2 * i],
+            sum_i_over_sigma[2 * i + 1],
+            sum_intensity[2 * i],
+            sum_intensity[2 * i + 1],
+            max_i_over_sigma[i],
+            intensity_of_max[i],
+        )
+        for i in range(n_groups)
+    ]
+
+
+def score_screw_axes_in_datasets(axes, reflection_tables, significance_level=0.95):
+    """
+    Score a set of screw axes against a number of datasets at once.
+
+    The axial reflections of all datasets are found and the statistics for all
+    the axes and datasets are computed in one pass. New screw axis objects are
+    created for each dataset, with the scoring results set.
+
+    :param axes: The screw axes, with any equivalent axes added
+    :param reflection_tables: The reflection tables of merged data
+    :param significance_level: The significance level of the tests
+    :returns: A list of (screw axes, scores) pairs, one for each dataset
+    """
+    if not reflection_tables:
+        return []
+    groups, values, intensities, sigmas = [], [], [], []
+    for i, table in enumerate(reflection_tables):
+        r, g, v = axial_reflections(axes, table["miller_index"])
+        groups.append(g + i * len(axes))
+        values.append(v)
+        intensities.append(table["intensity"].as_numpy_array()[r])
+        sigmas.append(numpy.sqrt(table["variance"].as_numpy_array()[r]))
+    groups = numpy.concatenate(groups)
+    values = numpy.concatenate(values)
+    intensities = numpy.concatenate(intensities)
+    sigmas = numpy.concatenate(sigmas)
+    statistics = screw_axis_statistics(
+        groups,
+        values,
+        intensities,
+        sigmas,
+        [a.axis_repeat for a in axes] * len(reflection_tables),
+    )
+
+    # Split the reflections by group, keeping their order within each group
+    order = numpy.argsort(groups, kind="mergesort")
+    bounds = numpy.searchsorted(groups[order], numpy.arange(len(statistics) + 1))
+    values, intensities, sigmas = values[order], intensities[order], sigmas[order]
+
+    results = []
+    for i in range(len(reflection_tables)):
+        dataset_axes = []
+        scores = []
+        for j, axis in enumerate(axes):
+            g = i * len(axes) + j
+            group = slice(bounds[g], bounds[g + 1])
+            a = axis.copy()
+            a.set_suitable_reflections(
+                flex.double(values[group]),
+                flex.double(intensities[group]),
+                flex.double(sigmas[group]),
+            )
+            scores.append(a.score_statistics(statistics[g], significance_level))
+            dataset_axes.append(a)
+        results.append((dataset_axes, scores))
+    return results
+
 
 @singleton
 class ScrewAxisObserver(Observer):
@@ -67,6 +226,12 @@ def add_equivalent_axis(self, equivalent):
         """Add a symmetry equivalent axis."""
         self.equivalent_axes.append(equivalent)
 
+    def copy(self):
+        """Create a new screw axis of the same type, with the same equivalent axes."""
+        axis = self.__class__()
+        axis.equivalent_axes = list(self.equivalent_axes)
+        return axis
+
     def select_axial_reflections(self, miller_indices):
         """Select reflections along the screw axis."""
         h, k, l = miller_indices.as_vec3_double().parts()
@@ -78,53 +243,55 @@ def select_axial_reflections(self, miller_indices):
             selection = (h == 0) & (k == 0)
         return selection
 
+    def set_suitable_reflections(self, miller_axis_vals, intensities, sigmas):
+        """Set the reflections along the axis used for scoring."""
+        self.miller_axis_vals = miller_axis_vals
+        self.intensities = intensities
+        self.sigmas = sigmas
+        self.i_over_sigma = intensities / sigmas
+
     @Subject.notify_event(event="selected data for scoring")
     def get_all_suitable_reflections(self, reflection_table):
         """Select suitable reflections for testing the screw axis."""
-        refl = reflection_table
-        sel = self.select_axial_reflections(refl["miller_index"])
-        miller_idx = refl["miller_index"].select(sel)
-        self.miller_axis_vals = miller_idx.as_vec3_double().parts()[self.axis_idx]
-        self.intensities = refl["intensity"].select(sel)
-        self.sigmas = flex.sqrt(refl["variance"].select(sel))
-        self.i_over_sigma = self.intensities / self.sigmas
-
-        if self.equivalent_axes:
-            for a in self.equivalent_axes:
-                sel = a.select_axial_reflections(refl["miller_index"])
-                miller_idx = refl["miller_index"].select(sel)
-                intensities = refl["intensity"].select(sel)
-                sigmas = flex.sqrt(refl["variance"].select(sel))
-                self.i_over_sigma.extend(intensities / sigmas)
-                self.miller_axis_vals.extend(
-                    miller_idx.as_vec3_double().parts()[a.axis_idx]
-                )
-                self.intensities.extend(intensities)
-                self.sigmas.extend(sigmas)
+        rows, _, values = axial_reflections([self], reflection_table["miller_index"])
+        rows = flex.size_t(rows.tolist())
+        self.set_suitable_reflections(
+            flex.double(values),
+            reflection_table["intensity"].select(rows),
+            flex.sqrt(reflection_table["variance"].select(rows)),
+        )
 
     def score_axis(self, reflection_table, significance_level=0.95):
         """Score the axis give a reflection table of data."""
         assert significance_level in [0.95, 0.975, 0.99]
         self.get_all_suitable_reflections(reflection_table)
+        (statistics,) = screw_axis_statistics(
+            numpy.zeros(self.intensities.size(), dtype=numpy.int64),
+            self.miller_axis_vals.as_numpy_array(),
+            self.intensities.as_numpy_array(),
+            self.sigmas.as_numpy_array(),
+            [self.axis_repeat],
+        )
+        return self.score_statistics(statistics, significance_level)
 
-        expected_sel = self.miller_axis_vals.iround() % self.axis_repeat == 0
-
-        expected = self.i_over_sigma.select(expected_sel)
-        expected_abs = self.i_over_sigma.select(~expected_sel)
-        self.n_refl_used = (expected.size(), expected_abs.size())
+    def score_statistics(self, statistics, significance_level=0.95):
+        """Score the axis given the ScrewAxisStatistics of its reflections."""
+        assert significance_level in [0.95, 0.975, 0.99]
+        s = statistics
+        self.n_refl_used = (s.n_present, s.n_absent)
         # Limit to best #n reflections to avoid weak at high res - use wilson B?
-        if not expected or not expected_abs:
+        if not s.n_present or not s.n_absent:
             return 0.0
 
         # z = (sample mean - population mean) / standard error
         S_E_abs = 1.0  # errors probably correlated so say standard error = 1
         S_E_pres = 1.0  # / expected.size() ** 0.5
 
-        self.mean_I_sigma_abs = flex.mean(expected_abs)
-        self.mean_I_sigma = flex.mean(expected)
+        self.mean_I_sigma_abs = s.sum_i_over_sigma_abs / s.n_absent
+        self.mean_I_sigma = s.sum_i_over_sigma / s.n_present
 
-        self.mean_I = flex.mean(self.intensities.select(expected_sel))
-        self.mean_I_abs = flex.mean(self.intensities.select(~expected_sel))
+        self.mean_I = s.sum_intensity / s.n_present
+        self.mean_I_abs = s.sum_intensity_abs / s.n_absent
 
         z_score_absent = self.mean_I_sigma_abs / S_E_abs
         z_score_present = self.mean_I_sigma / S_E_pres
@@ -152,12 +319,12 @@ def score_axis(self, reflection_table, significance_level=0.95):
 from the expected 'absent' reflections."""
                 % self.name
             )
-            if expected_abs.size() <= 1:
+            if s.n_absent <= 1:
                 logger.info(outlier_msg)
                 return P_present
-            sel = flex.sort_permutation(expected_abs)
-            sorted_exp_abs = expected_abs.select(sel)
-            mean_i_sigma_abs = flex.mean(sorted_exp_abs[:-1])
+            mean_i_sigma_abs = (s.sum_i_over_sigma_abs - s.max_i_over_sigma_abs) / (
+                s.n_absent - 1
+            )
             if (mean_i_sigma_abs / S_E_abs) > cutoff:
                 # Still looks like reflections in expected absent
                 logger.info(
@@ -170,8 +337,8 @@ def score_axis(self, reflection_table, significance_level=0.95):
                 return (1.0 - P_absent) * P_present
             # Looks like there was an outlier, now 'absent' reflections ~ 0.
             self.mean_I_sigma_abs = mean_i_sigma_abs
-            self.mean_I_abs = flex.mean(
-                self.intensities.select(~expected_sel).select(sel)[:-1]
+            self.mean_I_abs = (s.sum_intensity_abs - s.intensity_of_max_abs) / (
+                s.n_absent - 1
             )
             if z_score_present > cutoff:
                 logger.info(outlier_msg)
@@ -6,6 +6,7 @@
     score_space_groups,
     laue_groups,
     score_screw_axes,
+    score_screw_axes_multi,
 )
 
 
@@ -27,6 +28,16 @@ def test_score_screw_axes_equivalent_axes():
     assert axes[0].name == "21a"
     assert scores[0] > 0.99
 
+    # Score the same data, and the data with the axis absent, in one batch
+    absent = reflections.select(flex.bool(4, True))
+    absent["intensity"] = flex.double([100.0, 100.0, 100.0, 100.0])
+    results = score_screw_axes_multi(laue_group_info, [reflections, absent])
+    assert len(results) == 2
+    (axes, batch_scores), (_, absent_scores) = results
+    assert axes[0].name == "21a"
+    assert batch_scores == pytest.approx(scores)
+    assert absent_scores[0] < 0.01
+
 
 def test_score_space_group():
     """Test scoring of space groups by combining axis scores."""
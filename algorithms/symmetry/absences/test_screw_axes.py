@@ -1,11 +1,15 @@
 """Test scoring of screw axes."""
 from __future__ import absolute_import, division, print_function
+import pytest
 from dials.array_family import flex
 from dials.algorithms.symmetry.absences.screw_axes import (
     ScrewAxis41c,
     ScrewAxis42c,
     ScrewAxis61c,
+    ScrewAxis21a,
+    ScrewAxis21b,
     ScrewAxis21c,
+    score_screw_axes_in_datasets,
 )
 
 # take some actual data for difficult cases - merged I, sigma values
@@ -141,3 +145,59 @@ def test_not_screw_axes():
 
     assert score_41 < 0.01
     assert score_42 < 0.01
+
+
+def test_screw_axis_statistics():
+    """Test the grouped sums against those of the selected reflections."""
+    refls = make_test_data_thermo_61c()
+    axis = ScrewAxis61c()
+    axis.score_axis(refls)
+    absent = flex.bool([int(v) % 6 != 0 for v in axis.miller_axis_vals])
+    assert axis.n_refl_used == (absent.count(False), absent.count(True))
+    assert axis.mean_I == pytest.approx(flex.mean(axis.intensities.select(~absent)))
+    assert axis.mean_I_sigma == pytest.approx(
+        flex.mean(axis.i_over_sigma.select(~absent))
+    )
+    # The outlier at (0, 0, 11) is removed from the absent reflections
+    i_over_sigma_abs = axis.i_over_sigma.select(absent)
+    i_abs = axis.intensities.select(absent)
+    perm = flex.sort_permutation(i_over_sigma_abs)[:-1]
+    assert axis.mean_I_sigma_abs == pytest.approx(
+        flex.mean(i_over_sigma_abs.select(perm))
+    )
+    assert axis.mean_I_abs == pytest.approx(flex.mean(i_abs.select(perm)))
+
+
+def test_score_screw_axes_in_datasets():
+    """Test scoring many axes against many datasets in one pass."""
+    datasets = [
+        make_test_data_LCY_21c(),
+        make_test_data_thermo_61c(),
+        make_test_data_thaumatin_41c(),
+    ]
+    axis_21a = ScrewAxis21a()
+    axis_21a.add_equivalent_axis(ScrewAxis21b())
+    axis_21a.add_equivalent_axis(ScrewAxis21c())
+    axes = [ScrewAxis21c(), ScrewAxis41c(), ScrewAxis42c(), ScrewAxis61c(), axis_21a]
+
+    results = score_screw_axes_in_datasets(axes, datasets)
+    assert len(results) == len(datasets)
+    for refls, (dataset_axes, scores) in zip(datasets, results):
+        assert [a.name for a in dataset_axes] == [a.name for a in axes]
+        for axis, a, score in zip(axes, dataset_axes, scores):
+            assert a is not axis
+            expected = axis.copy()
+            assert score == pytest.approx(expected.score_axis(refls))
+            assert a.n_refl_used == expected.n_refl_used
+            assert a.mean_I_sigma_abs == pytest.approx(expected.mean_I_sigma_abs)
+            assert list(a.miller_axis_vals) == list(expected.miller_axis_vals)
+            assert list(a.intensities) == pytest.approx(list(expected.intensities))
+
+    # No datasets, or no reflections along the axes
+    assert score_screw_axes_in_datasets(axes, []) == []
+    refls = flex.reflection_table()
+    refls["miller_index"] = flex.miller_index([(1, 1, 1)])
+    refls["intensity"] = flex.double([1.0])
+    refls["variance"] = flex.double([1.0])
+    ((dataset_axes, scores),) = score_screw_axes_in_datasets(axes, [refls])
+    assert scores == [0.0] * len(axes)
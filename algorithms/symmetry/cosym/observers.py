@@ -9,6 +9,7 @@
 from dials.algorithms.symmetry.cosym.plots import plot_coords, plot_rij_histogram
 from dials.algorithms.symmetry.cosym import SymmetryAnalysis
 from dials.algorithms.clustering.observers import UnitCellAnalysisObserver
+from dials.util.async_report import start_report
 from dials.util.observer import Observer, singleton
 from jinja2 import Environment, ChoiceLoader, PackageLoader
 
@@ -41,10 +42,14 @@ def make_html(self, cosym_script):
         filename = cosym_script.params.output.html
         if not filename:
             return
+        print("Writing html report to: %s" % filename)
+        start_report(self.write_html, filename)
+
+    def write_html(self, filename):
+        """Make the plots and write the html."""
         self.data.update(CosymClusterAnalysisObserver().make_plots())
         self.data.update(UnitCellAnalysisObserver().make_plots())
         self.data.update(SymmetryAnalysisObserver().make_tables())
-        print("Writing html report to: %s" % filename)
         loader = ChoiceLoader(
             [
                 PackageLoader("dials", "templates"),
@@ -74,10 +79,14 @@ def make_json(self, cosym_script):
         filename = cosym_script.params.output.json
         if not filename:
             return
+        print("Writing json to: %s" % filename)
+        start_report(self.write_json, filename)
+
+    def write_json(self, filename):
+        """Make the plots and write the json."""
         self.data.update(CosymClusterAnalysisObserver().make_plots())
         self.data.update(UnitCellAnalysisObserver().make_plots())
         self.data.update(SymmetryAnalysisObserver().get_data())
-        print("Writing json to: %s" % filename)
         with open(filename, "w") as f:
             json.dump(self.data, f)
 
@@ -7,6 +7,7 @@
 
 import dials.util
 import libtbx
+import numpy
 import scipy.stats
 from cctbx import crystal, sgtbx
 from dials.algorithms.symmetry import symmetry_base
@@ -140,19 +141,8 @@ def _estimate_cc_sig_fac(self):
             self.cc_sig_fac = 0
             return
 
-        mean_ccs = flex.double()
-        rms_ccs = flex.double()
-        ns = flex.double()
-        for n in range(min_n_group, max_n_group + 1):
-            ns.append(n)
-            ccs = flex.double()
-            for i in range(200):
-                isel = flex.random_selection(a.size(), n)
-                corr = CorrelationCoefficientAccumulator(a.select(isel), b.select(isel))
-                ccs.append(corr.coefficient())
-
-            mean_ccs.append(flex.mean(ccs))
-            rms_ccs.append(flex.mean(flex.pow2(ccs)) ** 0.5)
+        ns = flex.double(range(min_n_group, max_n_group + 1))
+        rms_ccs = bootstrap_cc_rms(a, b, range(min_n_group, max_n_group + 1))
 
         x = 1 / flex.pow(ns, 0.5)
         y = rms_ccs
@@ -210,12 +200,13 @@ def _estimate_cc_true(self):
 
     def _score_symmetry_elements(self):
         self.sym_op_scores = []
+        lookup = MillerIndexLookup(self.intensities.indices())
         for smx in self.lattice_group.smx():
             if smx.r().info().sense() < 0:
                 continue
             self.sym_op_scores.append(
                 ScoreSymmetryElement(
-                    self.intensities, smx, self.cc_true, self.cc_sig_fac
+                    self.intensities, smx, self.cc_true, self.cc_sig_fac, lookup=lookup,
                 )
             )
 
@@ -485,7 +476,7 @@ class ScoreSymmetryElement(object):
     <https://doi.org/10.1107/S090744491003982X>`_
     """
 
-    def __init__(self, intensities, sym_op, cc_true, cc_sig_fac):
+    def __init__(self, intensities, sym_op, cc_true, cc_sig_fac, lookup=None):
         """Initialise a ScoreSymmetryElement object.
 
         Args:
@@ -495,6 +486,8 @@ def __init__(self, intensities, sym_op, cc_true, cc_sig_fac):
           cc_true (float): the expected value of CC if the symmetry element is present,
             E(CC; S)
           cc_sig_fac (float): Estimation of sigma(CC) as a function of sample size.
+          lookup (MillerIndexLookup): Optional lookup of the intensity indices,
+            which may be shared between the symmetry operations being scored.
         """
         self.sym_op = sym_op
         assert self.sym_op.r().info().sense() >= 0
@@ -504,20 +497,30 @@ def __init__(self, intensities, sym_op, cc_true, cc_sig_fac):
         if self.sym_op.r().order() > 2:
             # include inverse symmetry operation
             cb_ops.append(cb_op.inverse())
+        if lookup is None:
+            lookup = MillerIndexLookup(intensities.indices())
+        data = intensities.data().as_numpy_array()
+        epsilon = (
+            sgtbx.space_group()
+            .expand_smx(self.sym_op)
+            .epsilon(intensities.indices())
+            .as_numpy_array()
+        )
         for cb_op in cb_ops:
             if cb_op.is_identity_op():
                 cb_op = sgtbx.change_of_basis_op("-x,-y,-z")
             reindexed_intensities = intensities.change_basis(cb_op).map_to_asu()
-            x, y = intensities.common_sets(
-                reindexed_intensities, assert_is_similar_symmetry=False
-            )
-            sel = sgtbx.space_group().expand_smx(self.sym_op).epsilon(x.indices()) == 1
-            x = x.select(sel)
-            y = y.select(sel)
 
-            outliers = flex.bool(len(x.data()), False)
+            # pair each reflection with the reflection whose reindexed index
+            # matches its own, as intensities.common_sets(reindexed_intensities)
+            i_x, i_y = lookup.matches(reindexed_intensities.indices())
+            sel = epsilon[i_x] == 1
+            x = flex.double(data[i_x[sel]])
+            y = flex.double(data[i_y[sel]])
+
+            outliers = flex.bool(len(x), False)
             iqr_multiplier = 20  # very generous tolerance
-            for col in (x.data(), y.data()):
+            for col in (x, y):
                 if col.size():
                     min_x, q1_x, med_x, q3_x, max_x = five_number_summary(col)
                     iqr_x = q3_x - q1_x
@@ -532,7 +535,7 @@ def __init__(self, intensities, sym_op, cc_true, cc_sig_fac):
                 x = x.select(~outliers)
                 y = y.select(~outliers)
 
-            self.cc += CorrelationCoefficientAccumulator(x.data(), y.data())
+            self.cc += CorrelationCoefficientAccumulator(x, y)
 
         self.n_refs = self.cc.n()
         if self.n_refs <= 0:
@@ -806,6 +809,105 @@ def __iadd__(self, other):
         return self
 
 
+def bootstrap_cc_rms(x, y, group_sizes, n_trials=200):
+    """Estimate the rms correlation coefficient of random groups of pairs.
+
+    Each trial draws one random ordering of the pairs, so that the random group
+    of each size is a prefix of that ordering. The sums needed for the
+    correlation coefficients of every group size are then cumulative sums, and
+    those of all the trials are calculated together as arrays.
+
+    Args:
+      x (scitbx.array_family.flex.double): The `x` values of the pairs.
+      y (scitbx.array_family.flex.double): The `y` values of the pairs.
+      group_sizes (list): The group sizes, each no larger than the number of pairs.
+      n_trials (int): The number of random groups of each size.
+
+    Returns:
+      scitbx.array_family.flex.double: The rms CC for each group size.
+    """
+    assert x.size() == y.size()
+    group_sizes = numpy.array(list(group_sizes), dtype=numpy.int64)
+    max_n = int(group_sizes.max())
+    assert max_n <= x.size()
+
+    # random ordering of the first max_n pairs of each trial
+    keys = flex.random_double(n_trials * x.size()).as_numpy_array()
+    keys = keys.reshape(n_trials, x.size())
+    if max_n < x.size():
+        isel = numpy.argpartition(keys, max_n - 1, axis=1)[:, :max_n]
+    else:
+        isel = numpy.argsort(keys, axis=1)
+    rows = numpy.arange(n_trials)[:, numpy.newaxis]
+    isel = isel[rows, numpy.argsort(keys[rows, isel], axis=1)]
+
+    x = x.as_numpy_array()[isel]
+    y = y.as_numpy_array()[isel]
+    cols = group_sizes - 1
+    sum_x = numpy.cumsum(x, axis=1)[:, cols]
+    sum_y = numpy.cumsum(y, axis=1)[:, cols]
+    sum_xy = numpy.cumsum(x * y, axis=1)[:, cols]
+    sum_x_sq = numpy.cumsum(x * x, axis=1)[:, cols]
+    sum_y_sq = numpy.cumsum(y * y, axis=1)[:, cols]
+
+    # the single-pass formula of CorrelationCoefficientAccumulator
+    n = group_sizes.astype(numpy.float64)
+    numerator = n * sum_xy - sum_x * sum_y
+    denominator = numpy.sqrt(n * sum_x_sq - sum_x ** 2) * numpy.sqrt(
+        n * sum_y_sq - sum_y ** 2
+    )
+    cc = numerator / denominator
+    return flex.double(numpy.sqrt(numpy.mean(cc ** 2, axis=0)))
+
+
+class MillerIndexLookup(object):
+    """Find the positions of Miller indices in an array of unique indices.
+
+    The indices are sorted once, so that a single lookup can be shared between
+    many reindexed copies of the same array.
+    """
+
+    def __init__(self, indices):
+        """Initialise a MillerIndexLookup object.
+
+        Args:
+          indices (cctbx.array_family.flex.miller_index): The unique indices.
+        """
+        keys = self._keys(indices)
+        self._perm = numpy.argsort(keys, kind="mergesort")
+        self._sorted_keys = keys[self._perm]
+
+    @staticmethod
+    def _keys(indices):
+        """Encode each Miller index as a single integer."""
+        h, k, l = (
+            p.as_numpy_array().round().astype(numpy.int64) + (1 << 20)
+            for p in indices.as_vec3_double().parts()
+        )
+        return (h << 42) | (k << 21) | l
+
+    def matches(self, indices):
+        """Find pairs of positions with matching indices.
+
+        Args:
+          indices (cctbx.array_family.flex.miller_index): The indices to look up.
+
+        Returns:
+          tuple: Arrays of the positions in the lookup indices and in `indices`
+          of each pair of matching indices.
+        """
+        keys = self._keys(indices)
+        if not len(self._sorted_keys):
+            return (
+                numpy.array([], dtype=numpy.int64),
+                numpy.array([], dtype=numpy.int64),
+            )
+        pos = numpy.searchsorted(self._sorted_keys, keys)
+        pos = numpy.minimum(pos, len(self._sorted_keys) - 1)
+        found = self._sorted_keys[pos] == keys
+        return self._perm[pos[found]], numpy.flatnonzero(found)
+
+
 def trunccauchy_pdf(x, a, b, loc=0, scale=1):
     """Calculate a truncated Cauchy probability density function.
 
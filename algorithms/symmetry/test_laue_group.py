@@ -4,7 +4,13 @@
 
 from cctbx import crystal, miller, sgtbx
 from dials.algorithms.symmetry.cosym._generate_test_data import generate_intensities
-from dials.algorithms.symmetry.laue_group import LaueGroupAnalysis
+from dials.algorithms.symmetry.laue_group import (
+    CorrelationCoefficientAccumulator,
+    LaueGroupAnalysis,
+    MillerIndexLookup,
+    bootstrap_cc_rms,
+)
+from scitbx.array_family import flex
 
 
 def generate_fake_intensities(crystal_symmetry):
@@ -73,3 +79,45 @@ def test_determine_space_group_best_monoclinic_beta():
     assert cs.change_basis(
         sgtbx.change_of_basis_op(d["subgroup_scores"][0]["cb_op"])
     ).is_similar_symmetry(result.best_solution.subgroup["best_subsym"])
+
+
+def test_bootstrap_cc_rms():
+    flex.set_random_seed(42)
+    x = flex.random_double(1000)
+    y = x + flex.random_double(1000)
+    rms_ccs = bootstrap_cc_rms(x, y, [5, 20, 100], n_trials=500)
+    assert len(rms_ccs) == 3
+
+    # compare with the rms CC of independently drawn random groups
+    for n, rms_cc in zip([5, 20, 100], rms_ccs):
+        ccs = flex.double()
+        for i in range(500):
+            isel = flex.random_selection(x.size(), n)
+            ccs.append(
+                CorrelationCoefficientAccumulator(
+                    x.select(isel), y.select(isel)
+                ).coefficient()
+            )
+        assert rms_cc == pytest.approx(flex.mean(flex.pow2(ccs)) ** 0.5, abs=0.05)
+
+    # perfectly correlated pairs
+    assert list(bootstrap_cc_rms(x, x, [5, 200])) == pytest.approx([1.0, 1.0])
+
+
+def test_miller_index_lookup():
+    cs = crystal.symmetry(unit_cell=(10, 11, 12, 90, 90, 90), space_group_symbol="P1")
+    intensities = generate_fake_intensities(cs)
+    lookup = MillerIndexLookup(intensities.indices())
+    cb_op = sgtbx.change_of_basis_op("-x,-y,z")
+    reindexed = intensities.change_basis(cb_op).map_to_asu()
+    i_x, i_y = lookup.matches(reindexed.indices())
+    x, y = intensities.common_sets(reindexed, assert_is_similar_symmetry=False)
+    assert len(i_x) == len(i_y) == x.size()
+    matched = sorted(
+        zip(
+            intensities.indices().select(flex.size_t([int(i) for i in i_x])),
+            reindexed.indices().select(flex.size_t([int(i) for i in i_y])),
+        )
+    )
+    assert all(h == k for h, k in matched)
+    assert sorted(matched) == sorted(zip(x.indices(), y.indices()))
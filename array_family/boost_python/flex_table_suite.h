@@ -598,6 +598,100 @@ namespace dials { namespace af { namespace boost_python { namespace flex_table_s
     reflection_table_extend_identifiers(self, other);
   }
 
+  /**
+   * A visitor to add an empty column of the same type to a table
+   */
+  template <typename T>
+  struct add_column_visitor : public boost::static_visitor<void> {
+    T &self;
+    typename T::key_type key;
+
+    add_column_visitor(T &self_, typename T::key_type key_)
+        : self(self_), key(key_) {}
+
+    template <typename U>
+    void operator()(const U &) {
+      U self_column = self[key];
+    }
+  };
+
+  /**
+   * A visitor to copy column data from another table into a block of rows
+   */
+  template <typename T>
+  struct copy_to_rows_visitor : public boost::static_visitor<void> {
+    T &self;
+    typename T::key_type key;
+    typename T::size_type offset;
+
+    copy_to_rows_visitor(T &self_,
+                         typename T::key_type key_,
+                         typename T::size_type offset_)
+        : self(self_), key(key_), offset(offset_) {}
+
+    template <typename U>
+    void operator()(const U &other_column) {
+      typename T::iterator it = self.find(key);
+      DIALS_ASSERT(it != self.end());
+      U self_column = boost::get<U>(it->second);
+      DIALS_ASSERT(offset + other_column.size() <= self_column.size());
+      std::copy(
+        other_column.begin(), other_column.end(), self_column.begin() + offset);
+    }
+  };
+
+  /**
+   * Concatenate a number of tables. The result is the same as extending an
+   * empty table by each table in turn, but every column is allocated once.
+   * @param tables The tables to concatenate
+   * @returns The concatenated table
+   */
+  template <typename T>
+  T concat(const std::vector<T> &tables) {
+    typedef typename T::const_iterator iterator;
+    typename T::size_type nrows = 0;
+    for (std::size_t i = 0; i < tables.size(); ++i) {
+      nrows += tables[i].nrows();
+    }
+
+    // Create every column at its final size
+    T result(nrows);
+    for (std::size_t i = 0; i < tables.size(); ++i) {
+      for (iterator it = tables[i].begin(); it != tables[i].end(); ++it) {
+        if (!result.contains(it->first)) {
+          add_column_visitor<T> visitor(result, it->first);
+          it->second.apply_visitor(visitor);
+        }
+      }
+    }
+
+    // Copy each table into its block of rows
+    typename T::size_type offset = 0;
+    for (std::size_t i = 0; i < tables.size(); ++i) {
+      for (iterator it = tables[i].begin(); it != tables[i].end(); ++it) {
+        copy_to_rows_visitor<T> visitor(result, it->first, offset);
+        it->second.apply_visitor(visitor);
+      }
+      reflection_table_extend_identifiers(result, tables[i]);
+      offset += tables[i].nrows();
+    }
+    return result;
+  }
+
+  /**
+   * Concatenate a python sequence of tables.
+   * @param tables The tables to concatenate
+   * @returns The concatenated table
+   */
+  template <typename T>
+  T concat_sequence(object tables) {
+    std::vector<T> items;
+    for (std::size_t i = 0; i < len(tables); ++i) {
+      items.push_back(extract<const T &>(tables[i])());
+    }
+    return concat(items);
+  }
+
   /**
    * Update the table with column data from another table. New columns are added
    * to the table and exisiting columns are over-written by columns from the
@@ -1271,6 +1365,8 @@ namespace dials { namespace af { namespace boost_python { namespace flex_table_s
         .def("append", &append<flex_table_type>)
         .def("insert", &insert<flex_table_type>)
         .def("extend", &extend<flex_table_type>)
+        .def("concat", &concat_sequence<flex_table_type>)
+        .staticmethod("concat")
         .def("update", &update<flex_table_type>)
         .def("nrows", &flex_table_type::nrows)
         .def("ncols", &flex_table_type::ncols)
@@ -136,5 +136,6 @@
 
 from dials.array_family.flex_ext import (  # noqa: F401; lgtm
     real,
+    reflection_table_builder,
     reflection_table_selector,
 )
@@ -28,6 +28,7 @@
 
 __all__ = [
     "real",
+    "reflection_table_builder",
     "reflection_table_selector",
 ]
 
@@ -42,6 +43,13 @@
     raise TypeError('unknown "real" type')
 
 
+# The Miller indices mapped to the asymmetric unit, the permutation sorting
+# them and the offsets of each group of equivalent reflections in that order
+_asu_index = collections.namedtuple(
+    "asu_index", ["miller_index", "permutation", "group_offsets"]
+)
+
+
 @boost.python.inject_into(dials_array_family_flex_ext.reflection_table)
 class _(object):
     """
@@ -118,7 +126,7 @@ def from_predictions_multi(
         :param padding: Padding in degrees
         :return: The reflection table of predictions
         """
-        result = dials_array_family_flex_ext.reflection_table()
+        tables = []
         for i, e in enumerate(experiments):
             rlist = dials_array_family_flex_ext.reflection_table.from_predictions(
                 e,
@@ -131,8 +139,95 @@ def from_predictions_multi(
             rlist["id"] = cctbx.array_family.flex.int(len(rlist), i)
             if e.identifier:
                 rlist.experiment_identifiers()[i] = e.identifier
-            result.extend(rlist)
-        return result
+            tables.append(rlist)
+        return dials_array_family_flex_ext.reflection_table.concat(tables)
+
+    @staticmethod
+    def iter_predictions_multi(
+        experiments,
+        block_size,
+        dmin=None,
+        dmax=None,
+        margin=1,
+        force_static=False,
+        padding=0,
+    ):
+        """
+        Construct reflection tables from predictions, one block of frames at a
+        time. The blocks are aligned with the integration blocks, starting at
+        the first image of the scan, and do not overlap, so peak memory scales
+        with the block size rather than with the length of the scan. Stills are
+        all predicted in the first block.
+
+        :param experiments: The experiment list to predict from
+        :param block_size: The number of frames in each block
+        :param dmin: The maximum resolution
+        :param dmax: The minimum resolution
+        :param margin: The margin to predict around
+        :param force_static: Do static prediction with a scan varying model
+        :param padding: Padding in degrees
+        :return: An iterator over ((z0, z1), reflection table) pairs
+        """
+        from dials.algorithms.spot_prediction.reflection_predictor import (
+            ReflectionPredictor,
+        )
+
+        assert block_size > 0, "Block size must be > 0"
+        predictors = [
+            ReflectionPredictor(
+                e,
+                dmin=dmin,
+                dmax=dmax,
+                margin=margin,
+                force_static=force_static,
+                padding=padding,
+            )
+            for e in experiments
+        ]
+
+        def block_table(predict_on):
+            tables = []
+            for i, (e, predictor) in enumerate(zip(experiments, predictors)):
+                rlist = predict_on(predictor)
+                if rlist is None:
+                    continue
+                rlist["id"] = cctbx.array_family.flex.int(len(rlist), i)
+                if e.identifier:
+                    rlist.experiment_identifiers()[i] = e.identifier
+                tables.append(rlist)
+            return dials_array_family_flex_ext.reflection_table.concat(tables)
+
+        ranges = [p.frame_range() for p in predictors if p.frame_range() is not None]
+        stills = block_table(lambda p: p() if p.frame_range() is None else None)
+        if not ranges:
+            yield None, stills
+            return
+
+        origin = min(e.scan.get_array_range()[0] for e in experiments if e.scan)
+        end = max(e.scan.get_array_range()[1] for e in experiments if e.scan)
+        first = min(r[0] for r in ranges)
+        last = max(r[1] for r in ranges)
+        z0 = first
+        while z0 < last:
+            # Frames predicted in the padding go in the first and last blocks
+            z1 = origin + (max(z0 - origin, 0) // block_size + 1) * block_size
+            if z1 >= end:
+                z1 = last
+
+            def predict_on(p):
+                if p.frame_range() is None:
+                    return None
+                f0, f1 = p.frame_range()
+                if f1 <= z0 or f0 >= z1:
+                    return None
+                return p.for_frame_range(max(z0, f0), min(z1, f1))
+
+            table = block_table(predict_on)
+            if stills is not None:
+                table.extend(stills)
+                stills = None
+            yield (z0, z1), table
+            z0 = z1
 
     @staticmethod
     def from_observations(experiments, params=None):
@@ -1023,6 +1118,57 @@ def compute_miller_indices_in_asu(self, experiments):
 
         return self["miller_index_asu"]
 
+    def asu_index(self, space_group, anomalous=False):
+        """
+        Map the Miller indices to the asymmetric unit and group the symmetry
+        equivalent reflections, reusing the result of an earlier call.
+
+        The result is remembered by the table object and reused while the
+        space group, the anomalous flag and the Miller indices are unchanged,
+        so it is always recomputed for a new table, e.g. one read from a file
+        or made by selection. The table itself is not modified, and the
+        returned arrays are shared between calls so must not be modified.
+
+        :param space_group: The space group
+        :param anomalous: Keep Friedel mates in separate groups
+        :returns: The mapped Miller indices, the permutation sorting the
+                  reflections by them, and the offsets of each group of
+                  symmetry equivalent reflections in the sorted order
+        """
+        # Tables of merged data may only have the mapped indices
+        if "miller_index" in self:
+            indices = self["miller_index"]
+        else:
+            indices = self["asu_miller_index"]
+        key = (space_group.type().hall_symbol(), bool(anomalous))
+        memo = getattr(self, "_asu_index_memo", None)
+        if (
+            memo is not None
+            and memo[0] == key
+            and len(memo[1]) == len(indices)
+            and (indices == memo[1]).all_eq(True)
+        ):
+            return memo[2]
+
+        asu_indices = indices.deep_copy()
+        cctbx.miller.map_to_asu(space_group.type(), anomalous, asu_indices)
+        permutation = cctbx.miller.set(
+            crystal_symmetry=cctbx.crystal.symmetry(space_group=space_group),
+            indices=asu_indices,
+            anomalous_flag=anomalous,
+        ).sort_permutation(by_value="packed_indices")
+        group_offsets = cctbx.array_family.flex.size_t([0])
+        if len(asu_indices):
+            sorted_indices = asu_indices.select(permutation)
+            group_offsets.extend(
+                (sorted_indices[1:] != sorted_indices[:-1]).iselection() + 1
+            )
+            group_offsets.append(len(asu_indices))
+        result = _asu_index(asu_indices, permutation, group_offsets)
+        # Keep a copy of the Miller indices, so that changes are noticed
+        self._asu_index_memo = (key, indices.deep_copy(), result)
+        return result
+
     def select_on_experiment_identifiers(self, list_of_identifiers):
         """
         Given a list of experiment identifiers (strings), perform a selection
@@ -1372,3 +1518,62 @@ def __call__(self, reflections):
         else:
             mask1 = mask2
         return mask1
+
+
+class reflection_table_builder(object):
+    """
+    A class to build a reflection table from many smaller tables.
+
+    Extending a table reallocates every column, so building a table from many
+    pieces with extend copies the rows again and again. The builder keeps the
+    pieces until the table is needed, and then concatenates them with every
+    column allocated once.
+    """
+
+    def __init__(self, tables=None):
+        """
+        Initialise the builder
+
+        :param tables: The tables to start with
+        """
+        self._tables = []
+        self._nrows = 0
+        if tables is not None:
+            self.extend(tables)
+
+    def append(self, table):
+        """
+        Add a table to the end of the result
+
+        :param table: The reflection table
+        """
+        self._tables.append(table)
+        self._nrows += table.size()
+
+    def extend(self, tables):
+        """
+        Add a number of tables to the end of the result
+
+        :param tables: The reflection tables
+        """
+        for table in tables:
+            self.append(table)
+
+    def __len__(self):
+        """
+        :return: The number of rows added so far
+        """
+        return self._nrows
+
+    def build(self):
+        """
+        Concatenate the tables added so far. The builder is left holding just
+        the result, so that more tables can be added after it.
+
+        :return: The reflection table
+        """
+        if len(self._tables) != 1:
+            self._tables = [
+                dials_array_family_flex_ext.reflection_table.concat(self._tables)
+            ]
+        return self._tables[0]
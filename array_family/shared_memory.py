@@ -0,0 +1,304 @@
+"""
+Reflection tables with their columns in shared memory.
+
+Passing a reflection table to a worker process pickles every column, so each
+worker pays the cost of serialising the table and holds its own copy. A
+SharedReflectionTable copies the numeric columns of a table once into blocks
+of shared memory, and pickles as a small handle naming those blocks. Workers
+on the same machine attach to the blocks and copy out only the rows and
+columns they need, so the shared data are never written to: writes go to the
+private table returned by table().
+
+Columns of types which cannot be stored as plain arrays (e.g. shoeboxes) are
+pickled with the handle as before. Shared memory needs
+multiprocessing.shared_memory (Python 3.8 or later). Without it the arrays are
+pickled with the handle, which works the same but shares nothing.
+
+Only the process which created a SharedReflectionTable frees the shared
+memory, when close() is called or the table is garbage collected. Arrays
+returned by array() must not be kept after that::
+
+  with SharedReflectionTable(reflections) as shared:
+      tasks = [Task(shared.subset(rows)) for rows in blocks]
+      results = parallel_map(run_task, tasks, ...)
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import weakref
+
+import numpy
+
+from dials.array_family import flex
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+
+def is_available():
+    """
+    :returns: True if the columns can be put in shared memory
+    """
+    return shared_memory is not None
+
+
+def _vec_parts(column):
+    return numpy.column_stack([p.as_numpy_array() for p in column.parts()])
+
+
+def _from_parts(flex_type, part_type):
+    def convert(array):
+        return flex_type(
+            *[
+                part_type(numpy.ascontiguousarray(array[:, i]))
+                for i in range(array.shape[1])
+            ]
+        )
+
+    return convert
+
+
+# The column types which can be stored as arrays, with the functions to
+# convert them to a numpy array and back
+_column_types = {
+    "double": (
+        flex.double,
+        lambda c: c.as_numpy_array(),
+        lambda a: flex.double(numpy.ascontiguousarray(a)),
+    ),
+    "int": (
+        flex.int,
+        lambda c: c.as_numpy_array(),
+        lambda a: flex.int(a.astype(numpy.int32)),
+    ),
+    "size_t": (
+        flex.size_t,
+        lambda c: c.as_numpy_array(),
+        lambda a: flex.size_t(a.astype(int)),
+    ),
+    "bool": (
+        flex.bool,
+        lambda c: c.as_numpy_array(),
+        lambda a: flex.bool(numpy.ascontiguousarray(a)),
+    ),
+    "vec2_double": (
+        flex.vec2_double,
+        _vec_parts,
+        _from_parts(flex.vec2_double, flex.double),
+    ),
+    "vec3_double": (
+        flex.vec3_double,
+        _vec_parts,
+        _from_parts(flex.vec3_double, flex.double),
+    ),
+    "miller_index": (
+        flex.miller_index,
+        lambda c: _vec_parts(c.as_vec3_double()).astype(numpy.int32),
+        lambda a: flex.miller_index(
+            *[flex.int(a[:, i].astype(numpy.int32)) for i in range(3)]
+        ),
+    ),
+    "int6": (
+        flex.int6,
+        lambda c: c.as_int().as_numpy_array().reshape(-1, 6),
+        lambda a: flex.int6(flex.int(a.astype(numpy.int32).ravel())),
+    ),
+}
+
+
+def _column_type(column):
+    for name, (flex_type, _, _) in _column_types.items():
+        if type(column) is flex_type:
+            return name
+    return None
+
+
+# The blocks attached to in this process, by name, so that each is only
+# opened once however many handles refer to it
+_attached = {}
+
+
+def _attach(name):
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return _attached[name]
+
+
+def _release(blocks, pid):
+    """Free the shared memory, if in the process which created it."""
+    if os.getpid() != pid:
+        return
+    for block in blocks:
+        _attached.pop(block.name, None)
+        block.close()
+        block.unlink()
+    del blocks[:]
+
+
+class SharedReflectionTable(object):
+    """
+    A read-only reflection table, with its numeric columns in shared memory.
+    """
+
+    def __init__(self, table, use_shared_memory=True):
+        """
+        Copy the columns of a reflection table into shared memory.
+
+        :param table: The reflection table
+        :param use_shared_memory: False to keep the arrays in this process
+        """
+        self._nrows = len(table)
+        self._rows = None
+        self._columns = {}
+        self._arrays = {}
+        self._inline = {}
+        identifiers = table.experiment_identifiers()
+        self._identifiers = {k: identifiers[k] for k in identifiers.keys()}
+        self._blocks = []
+        self._owner = None
+
+        use_shared_memory = use_shared_memory and is_available()
+        for name in table.keys():
+            column = table[name]
+            column_type = _column_type(column)
+            if column_type is None:
+                self._inline[name] = column
+                continue
+            array = _column_types[column_type][1](column)
+            if not use_shared_memory or not array.nbytes:
+                self._columns[name] = (column_type, None, array.dtype.str, array.shape)
+                self._arrays[name] = array
+                continue
+            block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+            self._blocks.append(block)
+            _attached[block.name] = block
+            shared = numpy.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            del shared
+            self._columns[name] = (
+                column_type,
+                block.name,
+                array.dtype.str,
+                array.shape,
+            )
+        self._finalizer = None
+        if self._blocks:
+            self._finalizer = weakref.finalize(
+                self, _release, self._blocks, os.getpid()
+            )
+
+    def __len__(self):
+        if self._rows is None:
+            return self._nrows
+        return self._rows.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        return {
+            "nrows": self._nrows,
+            "rows": self._rows,
+            "columns": self._columns,
+            "arrays": self._arrays,
+            "inline": self._inline,
+            "identifiers": self._identifiers,
+        }
+
+    def __setstate__(self, state):
+        self._nrows = state["nrows"]
+        self._rows = state["rows"]
+        self._columns = state["columns"]
+        self._arrays = state["arrays"]
+        self._inline = state["inline"]
+        self._identifiers = state["identifiers"]
+        self._blocks = []
+        self._owner = None
+        self._finalizer = None
+
+    def close(self):
+        """Free the shared memory, if this handle created it."""
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def keys(self):
+        """
+        :returns: The column names
+        """
+        return list(self._columns) + list(self._inline)
+
+    def __contains__(self, name):
+        return name in self._columns or name in self._inline
+
+    def array(self, name):
+        """
+        Get a column as a read-only numpy array.
+
+        Vector columns have a row for each reflection. For a table of all the
+        rows the array is a view of the shared memory, for a subset it is a
+        copy of the selected rows.
+
+        :param name: The column name
+        :returns: The numpy array
+        """
+        column_type, block, dtype, shape = self._columns[name]
+        if block is None:
+            array = self._arrays[name].view()
+        else:
+            array = numpy.ndarray(shape, dtype=dtype, buffer=_attach(block).buf)
+            if self._rows is not None:
+                array = array[self._rows]
+        array.flags.writeable = False
+        return array
+
+    def subset(self, rows):
+        """
+        Get a handle to some of the rows, sharing the same memory.
+
+        Only the row indices and the columns which are not shared are copied,
+        so the handle is cheap to pass to another process.
+
+        :param rows: The indices of the rows
+        :returns: A SharedReflectionTable of the selected rows
+        """
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        if rows.size:
+            assert 0 <= rows.min() and rows.max() < len(self), "Invalid row index"
+        selection = flex.size_t(rows.tolist())
+        other = SharedReflectionTable.__new__(SharedReflectionTable)
+        other.__setstate__(self.__getstate__())
+        other._rows = rows if self._rows is None else self._rows[rows]
+        other._arrays = {k: v[rows] for k, v in self._arrays.items()}
+        other._inline = {k: v.select(selection) for k, v in self._inline.items()}
+        # Keep the shared memory alive for as long as any subset is
+        other._owner = self._owner or self
+        return other
+
+    def table(self, columns=None):
+        """
+        Copy the rows and columns into a new reflection table.
+
+        The table is private to this process and may be modified freely.
+
+        :param columns: The names of the columns to copy, or None for all
+        :returns: The reflection table
+        """
+        if columns is None:
+            columns = self.keys()
+        result = flex.reflection_table(len(self))
+        for name in columns:
+            if name in self._inline:
+                result[name] = self._inline[name]
+                continue
+            array = self.array(name)
+            result[name] = _column_types[self._columns[name][0]][2](array)
+            del array
+        for key, value in self._identifiers.items():
+            result.experiment_identifiers()[key] = value
+        return result
@@ -0,0 +1,263 @@
+# LIBTBX_SET_DISPATCHER_NAME dev.dials.benchmark
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import iotbx.phil
+
+from dials.util import log, show_mail_on_error, tabulate
+from dials.util.options import OptionParser
+from dials.util.version import dials_version
+
+logger = logging.getLogger("dials.command_line.benchmark")
+
+help_message = """
+
+Benchmark the DIALS processing pipeline on simulated rotation datasets.
+
+The images are simulated from randomly oriented crystals of a given unit cell
+and written as miniCBF files, so nothing needs to be downloaded. The datasets
+are then processed by dials.import, dials.find_spots, dials.index, dials.refine,
+dials.integrate, dials.cosym, dials.scale and dials.export. The wall time, CPU
+time, throughput and peak memory use of each stage are written to a JSON file.
+
+Given the results of an earlier run as a baseline, the stages which have become
+slower or use more memory than the tolerance allows are reported, and the
+program exits with an error.
+
+Examples::
+
+  dev.dials.benchmark
+
+  dev.dials.benchmark n_datasets=4 n_images=360 image_size=2048 nproc=8
+
+  dev.dials.benchmark stages=find_spots+integrate baseline=benchmark_main.json
+"""
+
+phil_scope = iotbx.phil.parse(
+    """
+simulation {
+  n_datasets = 2
+    .type = int(value_min=1)
+    .help = "The number of rotation datasets, each from a different crystal"
+  n_images = 90
+    .type = int(value_min=1)
+    .help = "The number of images in each dataset"
+  oscillation = 0.5
+    .type = float(value_min=0)
+    .help = "The oscillation width of each image in degrees"
+  image_size = 1024
+    .type = int(value_min=64)
+    .help = "The number of pixels along each side of the detector"
+  d_min = 2.0
+    .type = float(value_min=0)
+  unit_cell = 40 50 60 90 90 90
+    .type = unit_cell
+  space_group = P222
+    .type = space_group
+  background = 10
+    .type = float(value_min=0)
+    .help = "The mean background counts per pixel"
+  seed = 42
+    .type = int(value_min=0)
+}
+stages = *import *find_spots *index *refine *integrate *cosym *scale *export
+  .type = choice(multi=True)
+  .help = "The stages to report. The stages before them are run but not timed."
+nproc = 1
+  .type = int(value_min=1)
+repeats = 1
+  .type = int(value_min=1)
+  .help = "Run each stage this many times and report the fastest"
+directory = None
+  .type = path
+  .help = "The directory to simulate and process the data in. By default a"
+          "temporary directory is used and removed afterwards."
+baseline = None
+  .type = path
+  .help = "The results of an earlier benchmark to compare against"
+tolerance = 0.2
+  .type = float(value_min=0)
+  .help = "The fractional increase in time or memory reported as a regression"
+output {
+  json = dials.benchmark.json
+    .type = path
+  log = dials.benchmark.log
+    .type = path
+}
+"""
+)
+
+
+def simulate(params, directory):
+    """
+    Write the simulated datasets.
+
+    :returns: The filename templates and the total number of images
+    """
+    from dials.algorithms.simulation.images import (
+        RotationImageSimulator,
+        simulate_intensities,
+        simulate_rotation_experiment,
+    )
+
+    sim = params.simulation
+    unit_cell = sim.unit_cell.parameters()
+    space_group = str(sim.space_group).replace(" ", "")
+    intensities = simulate_intensities(unit_cell, space_group, sim.d_min, seed=sim.seed)
+    templates = []
+    for i in range(sim.n_datasets):
+        experiment = simulate_rotation_experiment(
+            unit_cell,
+            space_group,
+            n_images=sim.n_images,
+            oscillation=sim.oscillation,
+            image_size=sim.image_size,
+            seed=sim.seed + i,
+        )
+        simulator = RotationImageSimulator(
+            experiment,
+            intensities,
+            sim.d_min,
+            background=sim.background,
+            seed=sim.seed + i,
+        )
+        prefix = os.path.join(directory, "dataset_%02d_" % (i + 1))
+        simulator.write(prefix + "%04d.cbf")
+        simulator.reflections.as_file(prefix[:-1] + ".refl")
+        templates.append(prefix + "####.cbf")
+        logger.info(
+            "Simulated %d reflections on %d images for dataset %d",
+            len(simulator.reflections),
+            len(simulator),
+            i + 1,
+        )
+    return templates, sim.n_images * sim.n_datasets
+
+
+def _show_results(results):
+    rows = []
+    for name, stage in results["stages"].items():
+        rows.append(
+            [
+                name,
+                "%.1f" % stage["wall_time"],
+                "%.1f" % stage["cpu_time"] if stage["cpu_time"] is not None else "-",
+                "%.1f %s/s" % (stage["throughput"], stage["unit"]),
+                "%.0f" % (stage["peak_memory"] / 2 ** 20)
+                if stage["peak_memory"]
+                else "-",
+            ]
+        )
+    logger.info(
+        tabulate(
+            rows,
+            ["Stage", "Wall time (s)", "CPU time (s)", "Throughput", "Memory (MB)"],
+        )
+    )
+
+
+def benchmark(params):
+    """
+    Simulate the datasets, and run and time the pipeline.
+
+    :returns: The benchmark results
+    """
+    from dials.util import benchmark as bench
+
+    directory = params.directory
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="dials_benchmark_")
+    elif not os.path.isdir(directory):
+        os.makedirs(directory)
+    directory = os.path.abspath(directory)
+
+    try:
+        start = time.time()
+        templates, n_images = simulate(params, directory)
+        simulation_time = time.time() - start
+
+        stages = bench.pipeline(
+            templates,
+            n_images,
+            params.simulation.unit_cell.parameters(),
+            str(params.simulation.space_group).replace(" ", ""),
+            nproc=params.nproc,
+        )
+        stage_results = bench.run_pipeline(
+            stages, directory, selected=params.stages, repeats=params.repeats
+        )
+    finally:
+        if params.directory is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "version": bench.RESULTS_VERSION,
+        "dials_version": dials_version(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": bench.host_information(),
+        "parameters": phil_scope.format(params).as_str(),
+        "simulation_time": simulation_time,
+        "stages": stage_results,
+    }
+
+
+def run(args=None):
+    usage = "dev.dials.benchmark [options]"
+
+    parser = OptionParser(usage=usage, phil=phil_scope, epilog=help_message)
+    params, options = parser.parse_args(args=args, show_diff_phil=False)
+
+    log.config(verbosity=options.verbose, logfile=params.output.log)
+    logger.info(dials_version())
+
+    diff_phil = parser.diff_phil.as_str()
+    if diff_phil:
+        logger.info("The following parameters have been modified:\n%s", diff_phil)
+
+    from dials.util import benchmark as bench
+
+    baseline = None
+    if params.baseline:
+        try:
+            baseline = bench.load_results(params.baseline)
+        except (IOError, ValueError) as e:
+            sys.exit(str(e))
+
+    try:
+        results = benchmark(params)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    _show_results(results)
+
+    with open(params.output.json, "w") as fh:
+        json.dump(results, fh, indent=2)
+    logger.info("Written benchmark results to %s", params.output.json)
+
+    if baseline is not None:
+        regressions = bench.compare(results, baseline, tolerance=params.tolerance)
+        if not regressions:
+            logger.info("No regressions against %s", params.baseline)
+            return
+        logger.info(
+            tabulate(
+                [
+                    [name, metric, "%.4g" % before, "%.4g" % after]
+                    for name, metric, before, after in regressions
+                ],
+                ["Stage", "Metric", "Baseline", "This run"],
+            )
+        )
+        sys.exit("%d regressions against %s" % (len(regressions), params.baseline))
+
+
+if __name__ == "__main__":
+    with show_mail_on_error():
+        run()
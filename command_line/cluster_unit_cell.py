@@ -11,6 +11,7 @@
 from xfel.clustering.cluster import Cluster
 from xfel.clustering.cluster_groups import unit_cell_info
 
+from dials.algorithms.clustering.unit_cell import UnitCellCluster
 from dials.util.options import OptionParser
 from dials.util.options import flatten_experiments
 
@@ -22,6 +23,23 @@
 threshold = 5000
   .type = float(value_min=0)
   .help = 'Threshold value for the clustering'
+sparse {
+  enable = False
+    .type = bool
+    .help = "Cluster without a matrix of all pairwise distances, computing"
+            "Andrews-Bernstein distances only between cells not already in"
+            "the same cluster. Use this for very large numbers of unit cells."
+            "No dendrogram is plotted."
+  exact = False
+    .type = bool
+    .help = "Compare every pair of cells not already in the same cluster."
+            "By default only pairs whose sorted a^2, b^2 and c^2 differ by"
+            "at most the threshold are compared, which gives the same"
+            "clusters with far fewer distance calculations."
+  nproc = 1
+    .type = int(value_min=1)
+    .help = "Number of processes used to compute the distances"
+}
 plot {
   show = False
     .type = bool
@@ -76,6 +94,17 @@ def run(args):
 
 
 def do_cluster_analysis(crystal_symmetries, params):
+    if params.sparse.enable:
+        ucs = UnitCellCluster.from_crystal_symmetries(crystal_symmetries)
+        clusters = ucs.ab_cluster_sparse(
+            params.threshold,
+            exact=params.sparse.exact,
+            nproc=params.sparse.nproc,
+            write_file_lists=False,
+        )
+        print(unit_cell_info(clusters))
+        return clusters
+
     ucs = Cluster.from_crystal_symmetries(crystal_symmetries)
 
     if params.plot.show or params.plot.name is not None:
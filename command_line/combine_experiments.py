@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division, print_function
 
+import json
 import os
 import random
 import sys
@@ -178,6 +179,14 @@
       .help = "If not None, throw out any experiment with fewer than this"
               "many reflections"
 
+    deduplicate_models = False
+      .type = bool
+      .expert_level = 2
+      .help = "If true, experiments whose beam or detector models are"
+              "identical share a single model in the combined experiments,"
+              "rather than each keeping their own copy. Note that this"
+              "changes how the models are parameterised in refinement."
+
     include scope dials.algorithms.integration.stills_significance_filter.phil_scope
   }
 """,
@@ -185,23 +194,114 @@
 )
 
 
+def _experiment_models(experiment):
+    """The models of an experiment, in the order compared by equality"""
+    return (
+        experiment.imageset,
+        experiment.beam,
+        experiment.detector,
+        experiment.goniometer,
+        experiment.scan,
+        experiment.crystal,
+    )
+
+
+def _experiment_key(experiment, models):
+    """Key an experiment on the identities of its models.
+
+    Experiments compare equal when they share the same model instances, so
+    this gives the same answer as a search by equality without comparing
+    against every other experiment. The ids are only unique while the models
+    are alive, so whoever stores the key must also hold the models.
+    """
+    return (experiment.identifier,) + tuple(id(model) for model in models)
+
+
+class ExperimentIndex(object):
+    """Map experiments back to the file and position they were loaded from.
+
+    The index of the phil experiment lists is built the first time it is
+    needed, so looking up an experiment does not need a scan of every input
+    list. Experiments derived from the inputs, such as the combined
+    experiments, can be added to be traced back to their input experiment.
+    """
+
+    def __init__(self, all_experiments):
+        """
+        :param all_experiments: The list of all experiments from phil
+        :type  all_experiments: list[dials.util.phil.FilenameDataWrapper[ExperimentList]]
+        """
+        self._sources = list(all_experiments)
+        self._index = None
+        self._derived = {}
+
+    def _input_index(self):
+        if self._index is None:
+            self._index = {}
+            for source in self._sources:
+                for i, experiment in enumerate(source.data):
+                    models = _experiment_models(experiment)
+                    self._index.setdefault(
+                        _experiment_key(experiment, models),
+                        (experiment, (source.filename, i), models),
+                    )
+        return self._index
+
+    def add(self, experiment, input_experiment):
+        """Record that an experiment was derived from an input experiment.
+
+        :param Experiment experiment:       The derived experiment
+        :param Experiment input_experiment: The experiment it was derived from
+        """
+        models = _experiment_models(experiment)
+        self._derived.setdefault(
+            _experiment_key(experiment, models), (experiment, input_experiment, models)
+        )
+
+    def find(self, experiment):
+        """Find where an experiment came from.
+
+        :param Experiment experiment: The experiment to search for
+        :returns:                     The filename and experiment ID
+        :rtype:                       (str, int)
+        """
+        key = _experiment_key(experiment, _experiment_models(experiment))
+        derived = self._derived.get(key)
+        if derived is not None and derived[0] == experiment:
+            return self.find(derived[1])
+        found = self._input_index().get(key)
+        if found is not None and found[0] == experiment:
+            return found[1]
+        return self._search(experiment)
+
+    def _search(self, experiment):
+        """Find an experiment by equality, for when its models are not the
+        instances the index was built from."""
+        for source in self._sources:
+            try:
+                index = list(source.data).index(experiment)
+                return (source.filename, index)
+            except ValueError:
+                pass
+        for derived, input_experiment, _ in self._derived.values():
+            if derived == experiment:
+                return self.find(input_experiment)
+        raise ValueError("Experiment not found")
+
+
 def find_experiment_in(experiment, all_experiments):
     """Search the phil experiment list and find where an experiment came from.
 
+    Building an ExperimentIndex once is much faster when looking up many
+    experiments.
+
     :param Experiment experiment: The experiment to search for
     :param all_experiments:       The list of all experiments from phil
     :type  all_experiments:       list[dials.util.phil.FilenameDataWrapper[ExperimentList]]
     :returns:                     The filename and experiment ID
     :rtype:                       (str, int)
     """
-    for source in all_experiments:
-        try:
-            experiment_list = list(source.data)
-            index = experiment_list.index(experiment)
-            return (source.filename, index)
-        except ValueError:
-            pass
-    raise ValueError("Experiment not found")
+    return ExperimentIndex(all_experiments).find(experiment)
 
 
 class ComparisonError(Exception):
@@ -219,6 +319,7 @@ def __init__(
         crystal=None,
         detector=None,
         params=None,
+        experiment_index=None,
     ):
 
         self.ref_beam = beam
@@ -228,40 +329,69 @@ def __init__(
         self.ref_detector = detector
         self.tolerance = None
         self._last_imageset = None
+        self.experiment_index = experiment_index
+        self.deduplicate_models = False
         if params:
             if params.reference_from_experiment.compare_models:
                 self.tolerance = params.reference_from_experiment.tolerance
             self.average_detector = params.reference_from_experiment.average_detector
+            self.deduplicate_models = params.output.deduplicate_models
         else:
             self.average_detector = False
 
-    def __call__(self, experiment):
         if self.tolerance:
-            compare_beam = BeamComparison(
+            self.compare_beam = BeamComparison(
                 wavelength_tolerance=self.tolerance.beam.wavelength,
                 direction_tolerance=self.tolerance.beam.direction,
                 polarization_normal_tolerance=self.tolerance.beam.polarization_normal,
                 polarization_fraction_tolerance=self.tolerance.beam.polarization_fraction,
             )
-            compare_detector = DetectorComparison(
+            self.compare_detector = DetectorComparison(
                 fast_axis_tolerance=self.tolerance.detector.fast_axis,
                 slow_axis_tolerance=self.tolerance.detector.slow_axis,
                 origin_tolerance=self.tolerance.detector.origin,
             )
-            compare_goniometer = GoniometerComparison(
+            self.compare_goniometer = GoniometerComparison(
                 rotation_axis_tolerance=self.tolerance.goniometer.rotation_axis,
                 fixed_rotation_tolerance=self.tolerance.goniometer.fixed_rotation,
                 setting_rotation_tolerance=self.tolerance.goniometer.setting_rotation,
             )
-
         else:
-            compare_beam = None
-            compare_detector = None
-            compare_goniometer = None
+            self.compare_beam = None
+            self.compare_detector = None
+            self.compare_goniometer = None
+
+        # Models that have already passed the comparison with the reference,
+        # keyed by id(). Experiments from the same file usually share models,
+        # so each one only needs to be compared once. The models are held
+        # here to keep their ids valid.
+        self._matched = {}
+
+        # Unique models by their serialised form, if deduplicating
+        self._unique_beams = {}
+        self._unique_detectors = {}
+
+    def _matches(self, compare, reference, model):
+        """Compare a model with the reference, caching successful matches"""
+        if id(model) in self._matched:
+            return True
+        if not compare(reference, model):
+            return False
+        self._matched[id(model)] = model
+        return True
+
+    @staticmethod
+    def _unique(model, models):
+        """Return the first model seen with the same dictionary representation"""
+        if model is None:
+            return None
+        key = json.dumps(model.to_dict(), sort_keys=True)
+        return models.setdefault(key, model)
 
+    def __call__(self, experiment):
         if self.ref_beam:
-            if compare_beam:
-                if not compare_beam(self.ref_beam, experiment.beam):
+            if self.compare_beam:
+                if not self._matches(self.compare_beam, self.ref_beam, experiment.beam):
                     diff = BeamDiff(
                         wavelength_tolerance=self.tolerance.beam.wavelength,
                         direction_tolerance=self.tolerance.beam.direction,
@@ -272,14 +402,18 @@ def __call__(self, experiment):
                         "\n".join(diff(self.ref_beam, experiment.beam))
                     )
             beam = self.ref_beam
+        elif self.deduplicate_models:
+            beam = self._unique(experiment.beam, self._unique_beams)
         else:
             beam = experiment.beam
 
         if self.ref_detector and self.average_detector:
             detector = self.ref_detector
         elif self.ref_detector and not self.average_detector:
-            if compare_detector:
-                if not compare_detector(self.ref_detector, experiment.detector):
+            if self.compare_detector:
+                if not self._matches(
+                    self.compare_detector, self.ref_detector, experiment.detector
+                ):
                     diff = DetectorDiff(
                         fast_axis_tolerance=self.tolerance.detector.fast_axis,
                         slow_axis_tolerance=self.tolerance.detector.slow_axis,
@@ -289,12 +423,16 @@ def __call__(self, experiment):
                         "\n".join(diff(self.ref_detector, experiment.detector))
                     )
             detector = self.ref_detector
+        elif self.deduplicate_models:
+            detector = self._unique(experiment.detector, self._unique_detectors)
         else:
             detector = experiment.detector
 
         if self.ref_goniometer:
-            if compare_goniometer:
-                if not compare_goniometer(self.ref_goniometer, experiment.goniometer):
+            if self.compare_goniometer:
+                if not self._matches(
+                    self.compare_goniometer, self.ref_goniometer, experiment.goniometer
+                ):
                     diff = GoniometerDiff(
                         rotation_axis_tolerance=self.tolerance.goniometer.rotation_axis,
                         fixed_rotation_tolerance=self.tolerance.goniometer.fixed_rotation,
@@ -323,7 +461,7 @@ def __call__(self, experiment):
             imageset = experiment.imageset
             self._last_imageset = imageset
 
-        return Experiment(
+        combined = Experiment(
             identifier=experiment.identifier,
             beam=beam,
             detector=detector,
@@ -332,6 +470,9 @@ def __call__(self, experiment):
             crystal=crystal,
             imageset=imageset,
         )
+        if self.experiment_index is not None:
+            self.experiment_index.add(combined, experiment)
+        return combined
 
 
 class Cluster(object):
@@ -489,6 +630,8 @@ def average_detectors(target, panelgroups, depth):
                 ref_detector.hierarchy(), [e.detector.hierarchy() for e in flat_exps], 0
             )
 
+        # Where each input experiment came from, for reporting
+        experiment_index = ExperimentIndex(params.input.experiments)
         combine = CombineWithReference(
             beam=ref_beam,
             goniometer=ref_goniometer,
@@ -515,10 +658,21 @@ def average_detectors(target, panelgroups, depth):
             ids_map = dict(refs.experiment_identifiers())
             for k in refs.experiment_identifiers().keys():
                 del refs.experiment_identifiers()[k]
+            if params.output.delete_shoeboxes and "shoebox" in refs:
+                del refs["shoebox"]
+
+            # Sort the reflections by experiment so that each experiment's
+            # reflections form a contiguous range of rows, then select the
+            # kept ranges from the whole table at once.
+            order = flex.sort_permutation(refs["id"], stable=True)
+            counts = dict(refs["id"].counts()) if len(refs) else {}
+            first = sum(n for i, n in counts.items() if i < 0)
+            keep = flex.size_t()
+            new_ids = flex.int()
+            new_identifiers = {}
             for i, exp in enumerate(exps):
-                sel = refs["id"] == i
-                sub_ref = refs.select(sel)
-                n_sub_ref = len(sub_ref)
+                n_sub_ref = counts.get(i, 0)
+                start, first = first, first + n_sub_ref
                 if (
                     params.output.min_reflections_per_experiment is not None
                     and n_sub_ref < params.output.min_reflections_per_experiment
@@ -527,18 +681,16 @@ def average_detectors(target, panelgroups, depth):
                     continue
 
                 nrefs_per_exp.append(n_sub_ref)
-                sub_ref["id"] = flex.int(len(sub_ref), global_id)
+                keep.extend(flex.size_t_range(start, start + n_sub_ref))
+                new_ids.extend(flex.int(n_sub_ref, global_id))
                 # now update identifiers if set.
                 if i in ids_map:
-                    sub_ref.experiment_identifiers()[global_id] = ids_map[i]
-                if params.output.delete_shoeboxes and "shoebox" in sub_ref:
-                    del sub_ref["shoebox"]
-                reflections.extend(sub_ref)
+                    new_identifiers[global_id] = ids_map[i]
                 try:
                     experiments.append(combine(exp))
                 except ComparisonError as e:
                     # When we failed tolerance checks, give a useful error message
-                    (path, index) = find_experiment_in(exp, params.input.experiments)
+                    (path, index) = experiment_index.find(exp)
                     sys.exit(
                         "Model didn't match reference within required tolerance for experiment {} in {}:"
                         "\n{}\nAdjust tolerances or set compare_models=False to ignore differences.".format(
@@ -548,6 +700,12 @@ def average_detectors(target, panelgroups, depth):
 
                 global_id += 1
 
+            sub_ref = refs.select(order.select(keep))
+            sub_ref["id"] = new_ids
+            for k, v in new_identifiers.items():
+                sub_ref.experiment_identifiers()[k] = v
+            reflections.extend(sub_ref)
+
         if (
             params.output.min_reflections_per_experiment is not None
             and skipped_expts > 0
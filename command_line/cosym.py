@@ -13,6 +13,7 @@
 )
 from dials.array_family import flex
 from dials.util import show_mail_on_error, Sorry
+from dials.util.async_report import reports_in_background
 from dials.util.options import reflections_and_experiments_from_files
 from dials.util.multi_dataset_handling import (
     assign_unique_identifiers,
@@ -76,6 +77,11 @@
     .type = path
   html = dials.cosym.html
     .type = path
+  report_in_background = True
+    .type = bool
+    .help = "Generate the html report in a separate process, so that the data"
+            "files are written without waiting for the report."
+    .expert_level = 2
 }
 """,
     process_includes=True,
@@ -357,8 +363,9 @@ def run(args):
 
     if params.output.html or params.output.json:
         register_default_cosym_observers(cosym_instance)
-    cosym_instance.run()
-    cosym_instance.export()
+    with reports_in_background(params.output.report_in_background):
+        cosym_instance.run()
+        cosym_instance.export()
 
 
 if __name__ == "__main__":
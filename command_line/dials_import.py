@@ -134,6 +134,16 @@ def _pickle_load(fh):
     grid_size = None
       .type = ints(size=2)
       .help = "If importing as a grid scan set the size"
+
+    nproc = 1
+      .type = int(value_min=1)
+      .help = "The number of processes used to read the image headers"
+
+    cache = None
+      .type = path
+      .help = "A file in which to keep the metadata of imported images, keyed"
+              " by file path and modification time, so that importing the same"
+              " images again is fast"
   }
 
   include scope dials.util.options.format_phil_scope
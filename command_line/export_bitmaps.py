@@ -7,10 +7,12 @@
 from dials.algorithms.image.threshold import DispersionThresholdDebug
 from dials.array_family import flex
 from dials.util import Sorry
+from dials.util.image_stack import stack_images
 from dials.util.image_viewer.slip_viewer.tile_generation import (
     get_flex_image,
     get_flex_image_multipanel,
 )
+from dials.util.mp import parallel_map
 from dials.util.options import flatten_experiments
 from dials.util.options import OptionParser
 from PIL import Image
@@ -48,6 +50,15 @@
   .help = "The index/indices from an imageset to export. The first image of "
           "the set is 1."
   .expert_level=2
+stack_images = 1
+  .type = int(value_min=1)
+  .help = "The number of consecutive images to stack into each bitmap."
+stack_mode = *sum max mean
+  .type = choice
+  .help = "How to combine the stacked images."
+nproc = 1
+  .type = int(value_min=1)
+  .help = "The number of processes used to read, render and write the images."
 display = *image mean variance dispersion sigma_b \
           sigma_s threshold global_threshold
   .type = choice
@@ -125,8 +136,6 @@ def run(args):
 
 
 def imageset_as_bitmaps(imageset, params):
-    brightness = params.brightness / 100
-    vendortype = "made up"
     # check that binning is a power of 2
     binning = params.binning
     if not (binning > 0 and ((binning & (binning - 1)) == 0)):
@@ -136,16 +145,8 @@ def imageset_as_bitmaps(imageset, params):
         output_dir = "."
     elif not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    output_files = []
 
-    detector = imageset.get_detector()
-
-    panel = detector[0]
     scan = imageset.get_scan()
-    # XXX is this inclusive or exclusive?
-    saturation = panel.get_trusted_range()[1]
-    if params.saturation:
-        saturation = params.saturation
     if scan is not None and scan.get_oscillation()[1] > 0 and not params.imageset_index:
         start, end = scan.get_image_range()
     else:
@@ -156,10 +157,83 @@ def imageset_as_bitmaps(imageset, params):
         for i in range(start, end + 1)
         if not params.imageset_index or i in params.imageset_index
     ]
+    # Each bitmap is named after the first of the images stacked into it
+    image_range = image_range[:: params.stack_images]
     if params.output.file and len(image_range) != 1:
         sys.exit("output.file can only be specified if a single image is exported")
+
+    jobs = []
     for i_image in image_range:
-        image = imageset.get_raw_data(i_image - start)
+        if params.output.file:
+            path = os.path.join(output_dir, params.output.file)
+        else:
+            path = os.path.join(
+                output_dir,
+                "{prefix}{image:0{padding}}.{format}".format(
+                    image=i_image,
+                    prefix=params.output.prefix,
+                    padding=params.padding,
+                    format=params.output.format,
+                ),
+            )
+        jobs.append((i_image, path))
+
+    exporter = _BitmapExporter(imageset, params, start, end)
+    nproc = min(params.nproc, len(jobs))
+    if nproc > 1:
+        parallel_map(
+            func=exporter,
+            iterable=jobs,
+            processes=nproc,
+            method="multiprocessing",
+            preserve_order=True,
+        )
+    else:
+        for job in jobs:
+            exporter(job)
+
+    return [path for _, path in jobs]
+
+
+class _BitmapExporter(object):
+    """
+    Render and write a single bitmap. Picklable so that images can be exported
+    in parallel processes.
+    """
+
+    def __init__(self, imageset, params, start, end):
+        self.imageset = imageset
+        self.params = params
+        self.start = start
+        self.end = end
+
+    def __call__(self, job):
+        i_image, path = job
+        params = self.params
+        imageset = self.imageset
+        start = self.start
+        brightness = params.brightness / 100
+        vendortype = "made up"
+        binning = params.binning
+
+        detector = imageset.get_detector()
+
+        panel = detector[0]
+        # XXX is this inclusive or exclusive?
+        saturation = panel.get_trusted_range()[1]
+        if params.saturation:
+            saturation = params.saturation
+
+        if params.stack_images > 1:
+            last = min(i_image + params.stack_images, self.end + 1)
+            image = stack_images(
+                imageset,
+                range(i_image - start, last - start),
+                mode=params.stack_mode,
+                raw=True,
+            )
+        else:
+            image = imageset.get_raw_data(i_image - start)
 
         mask = imageset.get_mask(i_image - start)
         if mask is None:
@@ -213,21 +287,8 @@ def imageset_as_bitmaps(imageset, params):
         pil_img = Image.frombytes(
             "RGB", (flex_image.ex_size2(), flex_image.ex_size1()), flex_image.as_bytes()
         )
-        if params.output.file:
-            path = os.path.join(output_dir, params.output.file)
-        else:
-            path = os.path.join(
-                output_dir,
-                "{prefix}{image:0{padding}}.{format}".format(
-                    image=i_image,
-                    prefix=params.output.prefix,
-                    padding=params.padding,
-                    format=params.output.format,
-                ),
-            )
 
         print("Exporting %s" % path)
-        output_files.append(path)
         with open(path, "wb") as tmp_stream:
             pil_img.save(
                 tmp_stream,
@@ -236,8 +297,6 @@ def imageset_as_bitmaps(imageset, params):
                 quality=params.jpeg.quality,
             )
 
-    return output_files
-
 
 def image_filter(
     raw_data,
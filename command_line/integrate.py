@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division, print_function
 
+import copy
 import logging
 
 from dials.array_family import flex
@@ -75,6 +76,16 @@
     .type = bool
     .help = "Create the profile model"
 
+  prediction_block_size = None
+    .type = int(value_min=1)
+    .help = "Predict and integrate the reflections this many images at a time,"
+            "so that the predictions for the whole scan are not held in memory"
+            "at once. The profile model and reference profiles are still"
+            "computed from all the reference spots. Only for sequences, and"
+            "ignored if the reflections are sampled, the shoeboxes are saved or"
+            "overlapping reflections are filtered."
+    .expert_level = 2
+
   sampling
     .expert_level = 1
   {
@@ -232,7 +243,6 @@ def run(self, args=None):
         logger.info("")
 
         # Initialise the integrator
-        from dials.algorithms.profile_model.factory import ProfileModelFactory
         from dials.algorithms.integration.integrator import create_integrator
 
         # Modify experiment list if scan range is set.
@@ -243,114 +253,83 @@ def run(self, args=None):
         # Modify experiment list if exclude images is set
         experiments = self.exclude_images(experiments, params.exclude_images)
 
-        # Predict the reflections
-        logger.info("")
-        logger.info("=" * 80)
-        logger.info("")
-        logger.info(heading("Predicting reflections"))
-        logger.info("")
-        predicted = flex.reflection_table.from_predictions_multi(
-            experiments,
-            dmin=params.prediction.d_min,
-            dmax=params.prediction.d_max,
-            margin=params.prediction.margin,
-            force_static=params.prediction.force_static,
-            padding=params.prediction.padding,
-        )
+        # Predict and integrate the reflections, a block of images at a time
+        # if requested
+        block_size = self.prediction_block_size(params, experiments)
+        if block_size is not None:
+            experiments, reflections, rubbish, report = self.integrate_in_blocks(
+                params, experiments, reference, rubbish, block_size
+            )
+        else:
+            # Predict the reflections
+            logger.info("")
+            logger.info("=" * 80)
+            logger.info("")
+            logger.info(heading("Predicting reflections"))
+            logger.info("")
+            predicted = flex.reflection_table.from_predictions_multi(
+                experiments,
+                dmin=params.prediction.d_min,
+                dmax=params.prediction.d_max,
+                margin=params.prediction.margin,
+                force_static=params.prediction.force_static,
+                padding=params.prediction.padding,
+            )
 
-        # Match reference with predicted
-        if reference:
-            matched, reference, unmatched = predicted.match_with_reference(reference)
-            assert len(matched) == len(predicted)
-            assert matched.count(True) <= len(reference)
-            if matched.count(True) == 0:
-                raise Sorry(
-                    """
+            # Match reference with predicted
+            if reference:
+                matched, reference, unmatched = predicted.match_with_reference(
+                    reference
+                )
+                assert len(matched) == len(predicted)
+                assert matched.count(True) <= len(reference)
+                if matched.count(True) == 0:
+                    raise Sorry(
+                        """
           Invalid input for reference reflections.
           Zero reference spots were matched to predictions
         """
-                )
-            elif len(unmatched) != 0:
-                logger.info("")
-                logger.info("*" * 80)
-                logger.info(
-                    "Warning: %d reference spots were not matched to predictions"
-                    % (len(unmatched))
-                )
-                logger.info("*" * 80)
-                logger.info("")
-            rubbish.extend(unmatched)
-
-            if len(experiments) > 1:
-                # filter out any experiments without matched reference reflections
-                # f_: filtered
-                from dxtbx.model.experiment_list import ExperimentList
-
-                f_reference = flex.reflection_table()
-                f_predicted = flex.reflection_table()
-                f_rubbish = flex.reflection_table()
-                f_experiments = ExperimentList()
-                good_expt_count = 0
-
-                def refl_extend(src, dest, eid):
-                    old_id = eid
-                    new_id = good_expt_count
-                    tmp = src.select(src["id"] == old_id)
-                    tmp["id"] = flex.int(len(tmp), good_expt_count)
-                    if old_id in tmp.experiment_identifiers():
-                        identifier = tmp.experiment_identifiers()[old_id]
-                        del tmp.experiment_identifiers()[old_id]
-                        tmp.experiment_identifiers()[new_id] = identifier
-                    dest.extend(tmp)
-
-                for expt_id, experiment in enumerate(experiments):
-                    if len(reference.select(reference["id"] == expt_id)) != 0:
-                        refl_extend(reference, f_reference, expt_id)
-                        refl_extend(predicted, f_predicted, expt_id)
-                        refl_extend(rubbish, f_rubbish, expt_id)
-                        f_experiments.append(experiment)
-                        good_expt_count += 1
-                    else:
-                        logger.info(
-                            "Removing experiment %d: no reference reflections matched to predictions"
-                            % expt_id
-                        )
-
-                reference = f_reference
-                predicted = f_predicted
-                experiments = f_experiments
-                rubbish = f_rubbish
+                    )
+                elif len(unmatched) != 0:
+                    logger.info("")
+                    logger.info("*" * 80)
+                    logger.info(
+                        "Warning: %d reference spots were not matched to predictions"
+                        % (len(unmatched))
+                    )
+                    logger.info("*" * 80)
+                    logger.info("")
+                rubbish.extend(unmatched)
+
+                if len(experiments) > 1:
+                    # filter out any experiments without matched reference reflections
+                    (
+                        experiments,
+                        reference,
+                        predicted,
+                        rubbish,
+                    ) = self.remove_unmatched_experiments(
+                        experiments, reference, predicted, rubbish
+                    )
 
-        # Select a random sample of the predicted reflections
-        if not params.sampling.integrate_all_reflections:
-            predicted = self.sample_predictions(experiments, predicted, params)
+            # Select a random sample of the predicted reflections
+            if not params.sampling.integrate_all_reflections:
+                predicted = self.sample_predictions(experiments, predicted, params)
 
-        # Compute the profile model
-        if (
-            params.create_profile_model
-            and reference is not None
-            and "shoebox" in reference
-        ):
-            experiments = ProfileModelFactory.create(params, experiments, reference)
-        else:
-            try:
-                experiments = ProfileModelFactory.create(params, experiments)
-            except RuntimeError as e:
-                raise Sorry(e)
-            for expr in experiments:
-                if expr.profile is None:
-                    raise Sorry("No profile information in experiment list")
-        del reference
+            # Compute the profile model
+            experiments = self.create_profile_model(params, experiments, reference)
+            del reference
 
-        # Compute the bounding box
-        predicted.compute_bbox(experiments)
+            # Compute the bounding box
+            predicted.compute_bbox(experiments)
 
-        # Create the integrator
-        logger.info("")
-        integrator = create_integrator(params, experiments, predicted)
+            # Create the integrator
+            logger.info("")
+            integrator = create_integrator(params, experiments, predicted)
 
-        # Integrate the reflections
-        reflections = integrator.integrate()
+            # Integrate the reflections
+            reflections = integrator.integrate()
+            report = integrator.report()
 
         # Append rubbish data onto the end
         if rubbish is not None and params.output.include_bad_reference:
@@ -417,10 +396,255 @@ def refl_extend(src, dest, eid):
 
         # Write a report if requested
         if params.output.report is not None:
-            integrator.report().as_file(params.output.report)
+            report.as_file(params.output.report)
 
         return experiments, reflections
 
+    def prediction_block_size(self, params, experiments):
+        """
+        Get the number of images to predict and integrate at a time, or None to
+        integrate all the predictions at once.
+        """
+        if params.prediction_block_size is None:
+            return None
+        overlaps = params.integration.overlaps_filter
+        if not experiments.all_sequences():
+            reason = "the experiments are not all sequences"
+        elif params.integration.integrator == "3d_threaded":
+            reason = "integrator=3d_threaded"
+        elif not params.sampling.integrate_all_reflections:
+            reason = "a sample of the reflections is integrated"
+        elif params.integration.debug.output:
+            reason = "the shoeboxes are saved"
+        elif (
+            overlaps.foreground_foreground.enable
+            or overlaps.foreground_background.enable
+        ):
+            reason = "overlapping reflections are filtered"
+        else:
+            return params.prediction_block_size
+        logger.info(
+            "Ignoring prediction_block_size and integrating all the predictions at "
+            "once, as %s" % reason
+        )
+        return None
+
+    def integrate_in_blocks(self, params, experiments, reference, rubbish, block_size):
+        """
+        Predict and integrate the reflections one block of images at a time.
+
+        A first pass over the blocks matches the reference spots with the
+        predictions, from which the profile model and the reference profiles
+        are computed once for the whole scan. A second pass predicts each block
+        again and integrates it with those reference profiles, so that only the
+        predictions for one block are held in memory at a time.
+        """
+        from dials.algorithms.integration.integrator import create_integrator
+        from dials.algorithms.integration.report import IntegrationReport
+        from dials.util.command_line import heading
+        from dials.util.report import Report
+
+        def predict_blocks(experiments):
+            return flex.reflection_table.iter_predictions_multi(
+                experiments,
+                block_size,
+                dmin=params.prediction.d_min,
+                dmax=params.prediction.d_max,
+                margin=params.prediction.margin,
+                force_static=params.prediction.force_static,
+                padding=params.prediction.padding,
+            )
+
+        def near_block(table, z0, z1):
+            # Predictions are only matched with spots within 2 pixels of them
+            z = table["xyzcal.px"].parts()[2]
+            return table.select((z >= z0 - 2) & (z < z1 + 2))
+
+        logger.info("")
+        logger.info("=" * 80)
+        logger.info("")
+        logger.info(heading("Predicting reflections"))
+        logger.info("")
+        logger.info("Predicting reflections in blocks of %d images" % block_size)
+
+        # Match the reference spots with the predictions in each block, keeping
+        # the matched predictions for profile modelling
+        modelling = flex.reflection_table()
+        if reference:
+            reference["reference_index"] = flex.size_t_range(len(reference))
+            is_unmatched = flex.bool(len(reference), True)
+            matched = flex.reflection_table()
+            for (z0, z1), predicted in predict_blocks(experiments):
+                subset = near_block(reference, z0, z1)
+                if len(predicted) == 0 or len(subset) == 0:
+                    continue
+                _, subset, _ = predicted.match_with_reference(subset)
+                is_unmatched.set_selected(subset["reference_index"], False)
+                matched.extend(subset)
+                modelling.extend(
+                    predicted.select(
+                        predicted.get_flags(predicted.flags.reference_spot)
+                    )
+                )
+            if len(matched) == 0:
+                raise Sorry(
+                    """
+          Invalid input for reference reflections.
+          Zero reference spots were matched to predictions
+        """
+                )
+            unmatched = reference.select(is_unmatched)
+            del unmatched["reference_index"]
+            del matched["reference_index"]
+            reference = matched
+            if len(unmatched) != 0:
+                logger.info("")
+                logger.info("*" * 80)
+                logger.info(
+                    "Warning: %d reference spots were not matched to predictions"
+                    % (len(unmatched))
+                )
+                logger.info("*" * 80)
+                logger.info("")
+            rubbish.extend(unmatched)
+
+            if len(experiments) > 1:
+                (
+                    experiments,
+                    reference,
+                    modelling,
+                    rubbish,
+                ) = self.remove_unmatched_experiments(
+                    experiments, reference, modelling, rubbish
+                )
+
+        # Compute the profile model
+        experiments = self.create_profile_model(params, experiments, reference)
+
+        # Keep only what is needed to match the reference spots again
+        if reference:
+            matched = flex.reflection_table()
+            for key in (
+                "id",
+                "miller_index",
+                "entering",
+                "xyzcal.px",
+                "panel",
+                "flags",
+            ):
+                matched[key] = reference[key]
+        else:
+            matched = None
+        del reference
+
+        # Model the reference profiles from all the matched predictions
+        reference_profiles = None
+        profile_model_report = None
+        if len(modelling) > 0:
+            modelling.compute_bbox(experiments)
+            logger.info("")
+            integrator = create_integrator(params, experiments, modelling)
+            reference_profiles = integrator.model_profiles()
+            profile_model_report = integrator.profile_model_report
+        del modelling
+
+        # Split each block into jobs, so that the images outside the block are
+        # not read to integrate it
+        block_params = copy.deepcopy(params)
+        block_params.integration.block.force = True
+
+        # Integrate the reflections in each block with the reference profiles
+        integrated = []
+        for (z0, z1), predicted in predict_blocks(experiments):
+            if len(predicted) == 0:
+                continue
+            logger.info("")
+            logger.info("Integrating the reflections on images %d to %d" % (z0, z1))
+            if matched is not None:
+                subset = near_block(matched, z0, z1)
+                if len(subset) > 0:
+                    predicted.match_with_reference(subset)
+            predicted.compute_bbox(experiments)
+            integrator = create_integrator(block_params, experiments, predicted)
+            integrated.append(integrator.integrate(reference_profiles))
+        reflections = flex.reflection_table.concat(integrated)
+        del integrated
+
+        # Create the report for the whole scan
+        integration_report = IntegrationReport(experiments, reflections)
+        logger.info("")
+        logger.info(integration_report.as_str(prefix=" "))
+        report = Report()
+        if profile_model_report is not None:
+            report.combine(profile_model_report)
+        report.combine(integration_report)
+        return experiments, reflections, rubbish, report
+
+    def remove_unmatched_experiments(self, experiments, reference, predicted, rubbish):
+        """
+        Remove the experiments without any matched reference reflections.
+        """
+        # f_: filtered
+        from dxtbx.model.experiment_list import ExperimentList
+
+        f_reference = flex.reflection_table()
+        f_predicted = flex.reflection_table()
+        f_rubbish = flex.reflection_table()
+        f_experiments = ExperimentList()
+        good_expt_count = 0
+
+        def refl_extend(src, dest, eid):
+            old_id = eid
+            new_id = good_expt_count
+            tmp = src.select(src["id"] == old_id)
+            tmp["id"] = flex.int(len(tmp), good_expt_count)
+            if old_id in tmp.experiment_identifiers():
+                identifier = tmp.experiment_identifiers()[old_id]
+                del tmp.experiment_identifiers()[old_id]
+                tmp.experiment_identifiers()[new_id] = identifier
+            dest.extend(tmp)
+
+        for expt_id, experiment in enumerate(experiments):
+            if len(reference.select(reference["id"] == expt_id)) != 0:
+                refl_extend(reference, f_reference, expt_id)
+                refl_extend(predicted, f_predicted, expt_id)
+                refl_extend(rubbish, f_rubbish, expt_id)
+                f_experiments.append(experiment)
+                good_expt_count += 1
+            else:
+                logger.info(
+                    "Removing experiment %d: no reference reflections matched to predictions"
+                    % expt_id
+                )
+
+        reference = f_reference
+        predicted = f_predicted
+        experiments = f_experiments
+        rubbish = f_rubbish
+        return experiments, reference, predicted, rubbish
+
+    def create_profile_model(self, params, experiments, reference):
+        """
+        Compute the profile model, from the reference spots if requested.
+        """
+        from dials.algorithms.profile_model.factory import ProfileModelFactory
+
+        if (
+            params.create_profile_model
+            and reference is not None
+            and "shoebox" in reference
+        ):
+            experiments = ProfileModelFactory.create(params, experiments, reference)
+        else:
+            try:
+                experiments = ProfileModelFactory.create(params, experiments)
+            except RuntimeError as e:
+                raise Sorry(e)
+            for expr in experiments:
+                if expr.profile is None:
+                    raise Sorry("No profile information in experiment list")
+        return experiments
+
     def process_reference(self, reference):
         """Load the reference spots."""
         from dials.util import Sorry
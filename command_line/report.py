@@ -28,6 +28,7 @@
     make_image_range_table,
 )
 from dials.util import show_mail_on_error
+from dials.util.async_report import downsample
 from dials.util.command_line import Command
 from dials.util.batch_handling import batch_manager
 
@@ -1574,6 +1575,11 @@ def __call__(self, rlist, experiments):
 
         d = OrderedDict()
         self.z_score_data = IntensityDist(rlist, experiments).rtable
+        # Plot the z-scores of a sample of the reflections, to keep the plots
+        # to a manageable size
+        self.z_score_sample = self.z_score_data.select(
+            downsample(len(self.z_score_data))
+        )
 
         print(" Analysing distribution of intensity z-scores")
         d.update(self.z_score_hist())
@@ -1628,8 +1634,8 @@ def normal_probability_plot(self):
         :rtype:`dict`
         """
 
-        z_scores = self.z_score_data["intensity.z_score"]
-        osm = self.z_score_data["intensity.order_statistic_medians"]
+        z_scores = self.z_score_sample["intensity.z_score"]
+        osm = self.z_score_sample["intensity.order_statistic_medians"]
 
         return {
             "normal_probability_plot": {
@@ -1668,8 +1674,8 @@ def z_vs_multiplicity(self):
         :rtype:`dict`
         """
 
-        multiplicity = self.z_score_data["multiplicity"]
-        z_scores = self.z_score_data["intensity.z_score"]
+        multiplicity = self.z_score_sample["multiplicity"]
+        z_scores = self.z_score_sample["intensity.z_score"]
 
         return {
             "z_score_vs_multiplicity": {
@@ -1699,8 +1705,8 @@ def z_time_series(self):
         :rtype:`dict`
         """
 
-        batch_number = self.z_score_data["xyzobs.px.value"].parts()[2]
-        z_scores = self.z_score_data["intensity.z_score"]
+        batch_number = self.z_score_sample["xyzobs.px.value"].parts()[2]
+        z_scores = self.z_score_sample["intensity.z_score"]
 
         return {
             "z_score_time_series": {
@@ -1729,8 +1735,8 @@ def z_vs_I(self):
         :rtype:`dict`
         """
 
-        intensity = self.z_score_data["intensity.mean.value"]
-        z_scores = self.z_score_data["intensity.z_score"]
+        intensity = self.z_score_sample["intensity.mean.value"]
+        z_scores = self.z_score_sample["intensity.z_score"]
 
         return {
             "z_score_vs_I": {
@@ -1760,10 +1766,10 @@ def z_vs_I_over_sigma(self):
         """
 
         i_over_sigma = (
-            self.z_score_data["intensity.mean.value"]
-            / self.z_score_data["intensity.mean.std_error"]
+            self.z_score_sample["intensity.mean.value"]
+            / self.z_score_sample["intensity.mean.std_error"]
         )
-        z_scores = self.z_score_data["intensity.z_score"]
+        z_scores = self.z_score_sample["intensity.z_score"]
 
         return {
             "z_score_vs_I_over_sigma": {
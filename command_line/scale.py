@@ -39,6 +39,7 @@
 from libtbx import phil
 from six.moves import cStringIO as StringIO
 from dials.util import log, show_mail_on_error, Sorry
+from dials.util.async_report import reports_in_background
 from dials.util.options import OptionParser, reflections_and_experiments_from_files
 from dials.util.version import dials_version
 from dials.algorithms.scaling.algorithm import ScalingAlgorithm, ScaleAndFilterAlgorithm
@@ -74,6 +75,11 @@
     json = None
       .type = str
       .help = "Filename to save html report data in json format."
+    report_in_background = True
+      .type = bool
+      .help = "Generate the html report in a separate process, so that the data"
+              "files are written without waiting for the report."
+      .expert_level = 2
     unmerged_mtz = None
       .type = str
       .help = "Filename to export an unmerged_mtz file using dials.export."
@@ -235,25 +241,28 @@ def run(args=None, phil=phil_scope):  # type: (List[str], phil.scope) -> None
     if diff_phil:
         logger.info("The following parameters have been modified:\n%s", diff_phil)
 
-    try:
-        scaled_experiments, joint_table = run_scaling(params, experiments, reflections)
-    except ValueError as e:
-        raise Sorry(e)
-    else:
-        # Note, cross validation mode does not produce scaled datafiles
-        if scaled_experiments and joint_table:
-            logger.info("Saving the experiments to %s", params.output.experiments)
-            scaled_experiments.as_file(params.output.experiments)
-            logger.info(
-                "Saving the scaled reflections to %s", params.output.reflections
+    with reports_in_background(params.output.report_in_background):
+        try:
+            scaled_experiments, joint_table = run_scaling(
+                params, experiments, reflections
             )
-            joint_table.as_file(params.output.reflections)
-
-            if params.output.unmerged_mtz:
-                _export_unmerged_mtz(params, scaled_experiments, joint_table)
-
-            if params.output.merged_mtz:
-                _export_merged_mtz(params, scaled_experiments, joint_table)
+        except ValueError as e:
+            raise Sorry(e)
+        else:
+            # Note, cross validation mode does not produce scaled datafiles
+            if scaled_experiments and joint_table:
+                logger.info("Saving the experiments to %s", params.output.experiments)
+                scaled_experiments.as_file(params.output.experiments)
+                logger.info(
+                    "Saving the scaled reflections to %s", params.output.reflections
+                )
+                joint_table.as_file(params.output.reflections)
+
+                if params.output.unmerged_mtz:
+                    _export_unmerged_mtz(params, scaled_experiments, joint_table)
+
+                if params.output.merged_mtz:
+                    _export_merged_mtz(params, scaled_experiments, joint_table)
 
     logger.info(
         "See dials.github.io/dials_scale_user_guide.html for more info on scaling options"
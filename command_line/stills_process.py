@@ -12,7 +12,7 @@
 from six import BytesIO
 
 import dials.util
-from dials.util import log
+from dials.util import instrumentation, log
 from dials.array_family import flex
 from dxtbx.model.experiment_list import ExperimentListFactory
 from dxtbx.model.experiment_list import ExperimentList
@@ -659,6 +659,10 @@ def do_work(i, item_list, processor=None, finalize=True):
                         print("Rank %d event processed" % rank)
                     if processor:
                         processor.finalize()
+
+            # merge the time spent on each rank into rank 0
+            if size > 1:
+                instrumentation.gather_mpi(comm)
         else:
             from dxtbx.command_line.image_average import splitit
 
@@ -736,9 +740,9 @@ def __init__(self, params, composite_tag=None, rank=0):
 
             # self.all_strong_reflections = flex.reflection_table() # no composite strong pickles yet
             self.all_indexed_experiments = ExperimentList()
-            self.all_indexed_reflections = flex.reflection_table()
+            self.all_indexed_reflections = flex.reflection_table_builder()
             self.all_integrated_experiments = ExperimentList()
-            self.all_integrated_reflections = flex.reflection_table()
+            self.all_integrated_reflections = flex.reflection_table_builder()
             self.all_int_pickle_filenames = []
             self.all_int_pickles = []
             if params.dispatch.coset:
@@ -938,6 +942,7 @@ def pre_process(self, experiments):
         """Add any pre-processing steps here"""
         pass
 
+    @instrumentation.span("stills_process.find_spots")
     def find_spots(self, experiments):
         st = time.time()
 
@@ -968,6 +973,7 @@ def find_spots(self, experiments):
         logger.info("Time Taken = %f seconds" % (time.time() - st))
         return observed
 
+    @instrumentation.span("stills_process.index")
     def index(self, experiments, reflections):
         from dials.algorithms.indexing.indexer import Indexer
 
@@ -1039,6 +1045,7 @@ def index(self, experiments, reflections):
         logger.info("Time Taken = %f seconds" % (time.time() - st))
         return experiments, indexed
 
+    @instrumentation.span("stills_process.refine")
     def refine(self, experiments, centroids):
         if self.params.dispatch.refine:
             from dials.algorithms.refinement import RefinerFactory
@@ -1091,7 +1098,7 @@ def refine(self, experiments, centroids):
                     refls["id"] = flex.int(len(refls), n)
                     del refls.experiment_identifiers()[i]
                     refls.experiment_identifiers()[n] = experiment.identifier
-                    self.all_indexed_reflections.extend(refls)
+                    self.all_indexed_reflections.append(refls)
                     n += 1
         else:
             # Dump experiments to disk
@@ -1108,6 +1115,7 @@ def refine(self, experiments, centroids):
 
         return experiments, centroids
 
+    @instrumentation.span("stills_process.integrate")
     def integrate(self, experiments, indexed):
         st = time.time()
 
@@ -1154,6 +1162,7 @@ def integrate(self, experiments, indexed):
         # correct integrated intensities for absorption correction, if necessary
         for abs_params in self.params.integration.absorption_correction:
             if abs_params.apply:
+                kwargs = {}
                 if abs_params.algorithm == "fuller_kapton":
                     from dials.algorithms.integration.kapton_correction import (
                         multi_kapton_correction,
@@ -1163,8 +1172,14 @@ def integrate(self, experiments, indexed):
                         multi_kapton_correction,
                     )
 
+                    kwargs["nproc"] = self.params.integration.mp.nproc
+
                 experiments, integrated = multi_kapton_correction(
-                    experiments, integrated, abs_params.fuller_kapton, logger=logger
+                    experiments,
+                    integrated,
+                    abs_params.fuller_kapton,
+                    logger=logger,
+                    **kwargs
                 )()
 
         if self.params.significance_filter.enable:
@@ -1219,7 +1234,7 @@ def integrate(self, experiments, indexed):
                     refls["id"] = flex.int(len(refls), n)
                     del refls.experiment_identifiers()[i]
                     refls.experiment_identifiers()[n] = experiment.identifier
-                    self.all_integrated_reflections.extend(refls)
+                    self.all_integrated_reflections.append(refls)
                     n += 1
         else:
             # Dump experiments to disk
@@ -1390,6 +1405,10 @@ def save_reflections(self, reflections, filename):
     def finalize(self):
         """Perform any final operations"""
         if self.params.output.composite_output:
+            # Join the reflections of all the images processed
+            self.all_indexed_reflections = self.all_indexed_reflections.build()
+            self.all_integrated_reflections = self.all_integrated_reflections.build()
+
             if self.params.mp.composite_stride is not None:
                 assert self.params.mp.method == "mpi"
                 stride = self.params.mp.composite_stride
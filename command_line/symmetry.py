@@ -16,6 +16,7 @@
 
 from dials.array_family import flex
 from dials.util import log, show_mail_on_error
+from dials.util.async_report import reports_in_background, start_report
 from dials.util.options import OptionParser, reflections_and_experiments_from_files
 from dials.util.version import dials_version
 from dials.util.multi_dataset_handling import (
@@ -113,6 +114,11 @@
   html = "dials.symmetry.html"
     .type = path
     .help = "Filename for html report."
+  report_in_background = True
+    .type = bool
+    .help = "Generate the html report in a separate process, so that the data"
+            "files are written without waiting for the report."
+    .expert_level = 2
 }
 """,
     process_includes=True,
@@ -449,7 +455,7 @@ def symmetry(experiments, reflection_tables, params=None):
         joint_reflections.as_file(params.output.reflections)
 
     if params.output.html and params.systematic_absences.check:
-        ScrewAxisObserver().generate_html_report(params.output.html)
+        start_report(ScrewAxisObserver().generate_html_report, params.output.html)
 
 
 def _reindex_experiments_reflections(experiments, reflections, space_group, cb_op):
@@ -530,7 +536,8 @@ def run(args=None):
         )
     try:
         experiments, reflections = assign_unique_identifiers(experiments, reflections)
-        symmetry(experiments, reflections, params=params)
+        with reports_in_background(params.output.report_in_background):
+            symmetry(experiments, reflections, params=params)
     except ValueError as e:
         sys.exit(e)
 
@@ -32,12 +32,13 @@ def __init__(self, params):
         """
         self.params = params
 
-    def compute_threshold(self, image, mask):
+    def compute_threshold(self, image, mask, nthreads=1):
         """
         Compute the threshold.
 
         :param image: The image to process
         :param mask: The pixel mask on the image
+        :param nthreads: Unused; the image is processed in a single thread
         :returns: A boolean mask showing foreground/background pixels
         """
 
@@ -51,7 +52,7 @@ def compute_threshold(self, image, mask):
                 % (params.spotfinder.threshold.dispersion.global_threshold)
             )
 
-        self._algorithm = DispersionExtendedThresholdStrategy(
+        algorithm = DispersionExtendedThresholdStrategy(
             kernel_size=params.spotfinder.threshold.dispersion.kernel_size,
             gain=params.spotfinder.threshold.dispersion.gain,
             mask=params.spotfinder.lookup.mask,
@@ -61,7 +62,7 @@ def compute_threshold(self, image, mask):
             global_threshold=params.spotfinder.threshold.dispersion.global_threshold,
         )
 
-        return self._algorithm(image, mask)
+        return algorithm(image, mask)
 
 
 def estimate_global_threshold(image, mask=None, plot=False):
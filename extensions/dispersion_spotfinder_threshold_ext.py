@@ -73,12 +73,13 @@ def __init__(self, params):
         """
         self.params = params
 
-    def compute_threshold(self, image, mask):
+    def compute_threshold(self, image, mask, nthreads=1):
         """
         Compute the threshold.
 
         :param image: The image to process
         :param mask: The pixel mask on the image
+        :param nthreads: The number of threads to split the image between
         :returns: A boolean mask showing foreground/background pixels
         """
 
@@ -96,7 +97,7 @@ def compute_threshold(self, image, mask):
 
         from dials.algorithms.spot_finding.threshold import DispersionThresholdStrategy
 
-        self._algorithm = DispersionThresholdStrategy(
+        algorithm = DispersionThresholdStrategy(
             kernel_size=params.spotfinder.threshold.dispersion.kernel_size,
             gain=params.spotfinder.threshold.dispersion.gain,
             mask=params.spotfinder.lookup.mask,
@@ -104,9 +105,10 @@ def compute_threshold(self, image, mask):
             n_sigma_s=params.spotfinder.threshold.dispersion.sigma_strong,
             min_count=params.spotfinder.threshold.dispersion.min_local,
             global_threshold=params.spotfinder.threshold.dispersion.global_threshold,
+            nthreads=nthreads,
         )
 
-        return self._algorithm(image, mask)
+        return algorithm(image, mask)
 
 
 def estimate_global_threshold(image, mask=None, plot=False):
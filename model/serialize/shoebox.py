@@ -0,0 +1,277 @@
+"""
+An indexed, block compressed store for reflection shoeboxes.
+
+The file is laid out as a short header, followed by a sequence of blocks and a
+trailing index. Each block is a zlib compressed msgpack reflection table
+containing the shoeboxes of all reflections whose bounding box starts within
+the z range of the block. The index records the byte offset, z range and
+reflection ids of every block so that a reader can seek directly to the blocks
+it needs without decompressing the rest of the file.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import struct
+import zlib
+
+from dials.array_family import flex
+
+MAGIC = b"DIALSSBX"
+VERSION = 1
+
+_header = struct.Struct("<8sI")
+_footer = struct.Struct("<Q8s")
+
+
+class ShoeboxWriter(object):
+    """
+    Write shoeboxes to an indexed block store.
+
+    Blocks are appended one at a time so that shoeboxes from successive
+    processing jobs can be written without holding them all in memory.
+    """
+
+    def __init__(self, filename, columns=None, compression=6):
+        """
+        Open the file for writing.
+
+        :param filename: The output filename
+        :param columns: Extra columns to store alongside the shoeboxes
+        :param compression: The zlib compression level
+        """
+        if columns is None:
+            columns = ["id", "panel", "bbox", "miller_index"]
+        self._columns = ["shoebox", "shoebox_id"] + [
+            c for c in columns if c not in ("shoebox", "shoebox_id")
+        ]
+        self._compression = compression
+        self._blocks = []
+        self._next_id = 0
+        self._file = open(filename, "wb")
+        self._file.write(_header.pack(MAGIC, VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_block(self, reflections, z_range, ids=None):
+        """
+        Append a block of shoeboxes to the file.
+
+        :param reflections: The reflection table containing the shoeboxes
+        :param z_range: The (z0, z1) frame range covered by the block
+        :param ids: The reflection ids (default: sequential in write order)
+        :returns: The reflection ids assigned to the block
+        """
+        assert not self._file.closed, "Shoebox store has been closed"
+        assert "shoebox" in reflections, "No shoeboxes in reflection table"
+        z0, z1 = z_range
+        assert z1 > z0, "Invalid block range %d -> %d" % (z0, z1)
+        if ids is None:
+            ids = flex.size_t_range(len(reflections)) + self._next_id
+        else:
+            ids = flex.size_t(ids)
+        assert len(ids) == len(reflections)
+        if len(ids):
+            self._next_id = max(self._next_id, flex.max(ids) + 1)
+
+        table = flex.reflection_table()
+        for column in self._columns:
+            if column == "shoebox_id":
+                table[column] = ids
+            elif column in reflections:
+                table[column] = reflections[column]
+        data = zlib.compress(table.as_msgpack(), self._compression)
+
+        if len(table):
+            z_max = flex.max(table["shoebox"].bounding_boxes().parts()[5])
+        else:
+            z_max = z1
+        self._blocks.append(
+            {
+                "z": [int(z0), int(z1)],
+                "z_max": int(max(z_max, z1)),
+                "offset": self._file.tell(),
+                "size": len(data),
+                "ids": list(ids),
+            }
+        )
+        self._file.write(data)
+        return ids
+
+    def write(self, reflections, block_size=10):
+        """
+        Write a whole reflection table, split into blocks of frames.
+
+        :param reflections: The reflection table containing the shoeboxes
+        :param block_size: The number of frames per block
+        :returns: The reflection ids of the input rows
+        """
+        assert block_size > 0
+        ids = flex.size_t_range(len(reflections)) + self._next_id
+        if len(reflections) == 0:
+            return ids
+        z = reflections["bbox"].parts()[4]
+        z0, last = flex.min(z), flex.max(z)
+        while z0 <= last:
+            z1 = z0 + block_size
+            selection = ((z >= z0) & (z < z1)).iselection()
+            if len(selection):
+                self.write_block(
+                    reflections.select(selection), (z0, z1), ids=ids.select(selection),
+                )
+            z0 = z1
+        return ids
+
+    def close(self):
+        """
+        Write the index and close the file.
+        """
+        if self._file.closed:
+            return
+        index = json.dumps(
+            {"version": VERSION, "columns": self._columns, "blocks": self._blocks}
+        ).encode("utf-8")
+        offset = self._file.tell()
+        self._file.write(zlib.compress(index))
+        self._file.write(_footer.pack(offset, MAGIC))
+        self._file.close()
+
+
+class ShoeboxReader(object):
+    """
+    Random access reader for an indexed shoebox store.
+    """
+
+    def __init__(self, filename):
+        """
+        Open the file and read the index.
+
+        :param filename: The shoebox store filename
+        """
+        self._filename = filename
+        self._file = open(filename, "rb")
+        magic, version = _header.unpack(self._file.read(_header.size))
+        if magic != MAGIC:
+            raise ValueError("%s is not a shoebox store" % filename)
+        if version > VERSION:
+            raise ValueError("Unsupported shoebox store version %d" % version)
+        self._file.seek(-_footer.size, 2)
+        end = self._file.tell()
+        offset, magic = _footer.unpack(self._file.read(_footer.size))
+        if magic != MAGIC:
+            raise ValueError("%s is truncated or was not closed" % filename)
+        self._file.seek(offset)
+        index = json.loads(zlib.decompress(self._file.read(end - offset)).decode())
+        self._columns = index["columns"]
+        self._blocks = index["blocks"]
+        self._lookup = {}
+        for i, b in enumerate(self._blocks):
+            for j, ident in enumerate(b["ids"]):
+                self._lookup[ident] = (i, j)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def filename(self):
+        """
+        :returns: The filename of the shoebox store
+        """
+        return self._filename
+
+    def columns(self):
+        """
+        :returns: The columns stored with each shoebox
+        """
+        return list(self._columns)
+
+    def __len__(self):
+        """
+        :returns: The number of blocks
+        """
+        return len(self._blocks)
+
+    def block(self, index):
+        """
+        :param index: The index of the block
+        :returns: The block z range
+        """
+        return tuple(self._blocks[index]["z"])
+
+    def __getitem__(self, index):
+        """
+        Read the shoeboxes in a block
+
+        :param index: The block index
+        :returns: A reflection table of the shoeboxes in the block
+        """
+        b = self._blocks[index]
+        self._file.seek(b["offset"])
+        data = zlib.decompress(self._file.read(b["size"]))
+        return flex.reflection_table.from_msgpack(data)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __contains__(self, ident):
+        return ident in self._lookup
+
+    def read(self, z0, z1):
+        """
+        Read all shoeboxes whose bounding box overlaps a frame range.
+
+        Only the blocks that can contain such shoeboxes are decompressed.
+
+        :param z0: The first frame
+        :param z1: The last frame (exclusive)
+        :returns: A reflection table of the shoeboxes
+        """
+        result = flex.reflection_table()
+        for i, b in enumerate(self._blocks):
+            if b["z"][0] >= z1 or b["z_max"] <= z0:
+                continue
+            table = self[i]
+            if len(table) == 0:
+                continue
+            bbox = table["shoebox"].bounding_boxes()
+            _, _, _, _, bz0, bz1 = bbox.parts()
+            table = table.select((bz0 < z1) & (bz1 > z0))
+            if len(table):
+                result.extend(table)
+        return result
+
+    def select(self, ids):
+        """
+        Read the shoeboxes for a list of reflection ids.
+
+        :param ids: The reflection ids
+        :returns: A reflection table with rows in the order of the ids
+        """
+        ids = list(ids)
+        missing = [i for i in ids if i not in self._lookup]
+        if missing:
+            raise KeyError("Reflection ids not in store: %s" % missing[:10])
+        wanted = {}
+        for position, ident in enumerate(ids):
+            block, row = self._lookup[ident]
+            wanted.setdefault(block, []).append((row, position))
+
+        result = flex.reflection_table()
+        positions = flex.size_t()
+        for block in sorted(wanted):
+            rows, where = zip(*wanted[block])
+            result.extend(self[block].select(flex.size_t(rows)))
+            positions.extend(flex.size_t(where))
+        order = flex.size_t(len(ids))
+        order.set_selected(positions, flex.size_t_range(len(ids)))
+        return result.select(order)
@@ -179,6 +179,31 @@ def test_dispersion_threshold(self):
         assert result1 == result3
         assert result2 == result4
 
+    def test_dispersion_threshold_nthreads(self):
+        from dials.algorithms.image.threshold import DispersionThreshold
+        from dials.array_family import flex
+
+        nsig_b = 3
+        nsig_s = 3
+        serial = DispersionThreshold(
+            self.image.all(), self.size, nsig_b, nsig_s, 0, self.min_count
+        )
+        threaded = DispersionThreshold(
+            self.image.all(), self.size, nsig_b, nsig_s, 0, self.min_count, 4
+        )
+
+        result1 = flex.bool(flex.grid(self.image.all()))
+        result2 = flex.bool(flex.grid(self.image.all()))
+        serial(self.image, self.mask, result1)
+        threaded(self.image, self.mask, result2)
+        assert result1 == result2
+
+        result1 = flex.bool(flex.grid(self.image.all()))
+        result2 = flex.bool(flex.grid(self.image.all()))
+        serial(self.image, self.mask, self.gain, result1)
+        threaded(self.image, self.mask, self.gain, result2)
+        assert result1 == result2
+
     def test_dispersion_extended_threshold(self):
         from dials.algorithms.image.threshold import DispersionExtendedThreshold
         from dials.algorithms.image.threshold import DispersionExtendedThresholdDebug
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 import os
+import random
 
 import libtbx
 import pytest
@@ -144,3 +145,32 @@ def test_kapton(run_in_tmpdir):
     # y < 0; kapton correction should average out but should be slightly higher
     assert without_kapton_medians[3] == pytest.approx(with_kapton_medians[3], abs=5.0)
     assert without_kapton_medians[3] < with_kapton_medians[3]
+
+
+def test_kapton_path_lengths_flex():
+    """Check the vectorised kapton path lengths against the per-ray faces"""
+    from dials.algorithms.integration.kapton_2019_correction import KaptonTape_2019
+    from scitbx.matrix import col
+
+    random.seed(0)
+    kapton = KaptonTape_2019(0.04, 0.025, 0.665, 0.55, wavelength_ang=1.3)
+    rA, rB, rC, rD, rE, rF, rG, rH = kapton.edge_points
+
+    # Rays through points inside the tape, and their reverse which miss it
+    s1 = flex.vec3_double()
+    for i in range(100):
+        a, b, c = (random.uniform(0.05, 0.95) for j in range(3))
+        point = rB + a * (rA - rB) + b * (rC - rB) * 0.01 + c * (rF - rB)
+        s1.append(point.normalize().elems)
+    s1.extend(s1 * -1.0)
+
+    paths = kapton.get_kapton_path_mm_flex(s1)
+    for i in range(len(s1)):
+        expected = kapton.get_kapton_path_mm(col(s1[i]))
+        assert paths[i] == pytest.approx(expected, abs=1e-4)
+    assert paths[:100].all_gt(0)
+    assert paths[100:].all_eq(0)
+
+    corrections = kapton.abs_correction_flex(s1)
+    assert corrections[:100].all_gt(1)
+    assert corrections[100:].all_eq(1)
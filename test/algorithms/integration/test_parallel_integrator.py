@@ -397,6 +397,79 @@ def test_job_list():
         assert jobs.block_index(frame) == 4
 
 
+def test_compute_adaptive_blocks():
+    from dials.algorithms.integration.parallel_integrator import (
+        compute_adaptive_blocks,
+        SimpleBlockList,
+    )
+    from scitbx.array_family import shared
+
+    # Without a memory limit the blocks match the fixed size block list
+    for frame_range, block_size in (((0, 60), 20), ((5, 42), 7), ((0, 10), 1)):
+        blocks = compute_adaptive_blocks(frame_range, block_size, image_memory=1)
+        expected = SimpleBlockList(frame_range, block_size)
+        assert blocks == [tuple(expected[i]) for i in range(len(expected))]
+
+    # A dense frame is processed in smaller blocks
+    frame_memory = [0] * 60
+    frame_memory[30] = 100
+    blocks = compute_adaptive_blocks(
+        (0, 60), 20, image_memory=1, frame_memory=frame_memory, max_memory=25
+    )
+    assert blocks == [
+        (0, 20),
+        (10, 30),
+        (20, 31),
+        (30, 32),
+        (31, 42),
+        (32, 52),
+        (42, 60),
+    ]
+    assert len(SimpleBlockList(shared.tiny_int_2(blocks))) == len(blocks)
+
+    # But not below the minimum block size
+    blocks = compute_adaptive_blocks(
+        (0, 60),
+        20,
+        image_memory=1,
+        frame_memory=frame_memory,
+        max_memory=25,
+        min_block_size=5,
+    )
+    assert all(z1 - z0 >= 5 for z0, z1 in blocks)
+    assert len(SimpleBlockList(shared.tiny_int_2(blocks))) == len(blocks)
+
+
+def test_fit_blocks_in_memory():
+    from dials.algorithms.integration.parallel_integrator import fit_blocks_in_memory
+
+    # Two bytes per frame: a 20 frame block needs 40 bytes
+    frame_memory = [1] * 60
+
+    # The memory limit forces smaller blocks rather than an error
+    blocks, required, njobs = fit_blocks_in_memory(
+        (0, 60), 20, 1, frame_memory, 20, njobs=1, min_block_size=5
+    )
+    assert njobs == 1
+    assert required <= 20
+    assert all(5 <= z1 - z0 <= 10 for z0, z1 in blocks)
+    assert blocks[0][0] == 0 and blocks[-1][1] == 60
+
+    # The number of jobs is reduced when even the smallest blocks do not fit
+    blocks, required, njobs = fit_blocks_in_memory(
+        (0, 60), 20, 1, frame_memory, 25, njobs=4, min_block_size=10
+    )
+    assert njobs == 1
+    assert required <= 25
+    assert all(z1 - z0 >= 10 for z0, z1 in blocks)
+
+    # Blocks are not shrunk below the frame range of a reflection
+    with pytest.raises(RuntimeError):
+        fit_blocks_in_memory(
+            (0, 60), 20, 1, frame_memory, 15, njobs=1, min_block_size=10
+        )
+
+
 def test_reflection_manager(data):
     from dials.algorithms.integration.parallel_integrator import SimpleBlockList
     from dials.algorithms.integration.parallel_integrator import SimpleReflectionManager
@@ -0,0 +1,124 @@
+"""
+Tests for managed prediction of reflections for multiple experiments
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import copy
+import math
+
+from cctbx.sgtbx import space_group, space_group_symbols
+from libtbx.phil import parse
+from scitbx import matrix
+
+from dials.array_family import flex
+from dials.test.algorithms.refinement.setup_geometry import Extract
+from dxtbx.model import ScanFactory
+from dxtbx.model.experiment_list import ExperimentList, Experiment
+from dials.algorithms.spot_prediction import IndexGenerator, ray_intersection
+from dials.algorithms.refinement.prediction.managed_predictors import (
+    ScansRayPredictor,
+    ScansExperimentsPredictor,
+)
+
+
+class CountingPredictor(ScansExperimentsPredictor):
+    """Record which experiments are predicted on each call"""
+
+    def __init__(self, *args, **kwargs):
+        super(CountingPredictor, self).__init__(*args, **kwargs)
+        self.predicted = []
+
+    def _predict_one_experiment(self, experiment, reflections):
+        self.predicted.append(experiment)
+        super(CountingPredictor, self)._predict_one_experiment(experiment, reflections)
+
+
+def setup_experiments_and_reflections(n_experiments=3):
+    master_phil = parse(
+        """
+    include scope dials.test.algorithms.refinement.geometry_phil
+    """,
+        process_includes=True,
+    )
+    models = Extract(master_phil, "geometry.parameters.random_seed = 42")
+    scan = ScanFactory().make_scan(
+        image_range=(1, 30),
+        exposure_times=0.1,
+        oscillation=(0, 1.0),
+        epochs=list(range(30)),
+        deg=True,
+    )
+
+    experiments = ExperimentList()
+    reflections = flex.reflection_table()
+    for i in range(n_experiments):
+        crystal = copy.deepcopy(models.crystal)
+        rotation = matrix.col((1, 0, 0)).axis_and_angle_as_r3_rotation_matrix(
+            10 * i, deg=True
+        )
+        crystal.set_U(rotation * matrix.sqr(crystal.get_U()))
+        experiments.append(
+            Experiment(
+                beam=models.beam,
+                detector=models.detector,
+                goniometer=models.goniometer,
+                scan=scan,
+                crystal=crystal,
+                imageset=None,
+            )
+        )
+
+        indices = IndexGenerator(
+            crystal.get_unit_cell(),
+            space_group(space_group_symbols(1).hall()).type(),
+            2.0,
+        ).to_array()
+        ray_predictor = ScansRayPredictor(
+            experiments[i : i + 1], scan.get_oscillation_range(deg=False)
+        )
+        refs = ray_predictor(indices)
+        refs = refs.select(ray_intersection(models.detector, refs))
+        refs["id"] = flex.int(len(refs), i)
+        reflections.extend(refs)
+
+    return experiments, reflections
+
+
+def test_predict_in_threads_and_reuse_predictions():
+    experiments, reflections = setup_experiments_and_reflections()
+
+    expected = ScansExperimentsPredictor(experiments)(copy.deepcopy(reflections))
+
+    # by default nothing is kept, so every call predicts again
+    predictor = CountingPredictor(experiments)
+    for i in range(2):
+        predictor(copy.deepcopy(reflections))
+    assert len(predictor.predicted) == 2 * len(experiments)
+
+    predictor = CountingPredictor(experiments, nthreads=2, reuse_predictions=True)
+    result = predictor(copy.deepcopy(reflections))
+    assert len(predictor.predicted) == len(experiments)
+    assert result["xyzcal.mm"].all_approx_equal(expected["xyzcal.mm"])
+    assert result["s1"].all_approx_equal(expected["s1"])
+
+    # nothing has changed, so the predictions are reused
+    predictor.predicted = []
+    result = predictor(copy.deepcopy(reflections))
+    assert predictor.predicted == []
+    assert result["xyzcal.mm"].all_approx_equal(expected["xyzcal.mm"])
+    assert result.get_flags(result.flags.predicted).all_eq(
+        expected.get_flags(expected.flags.predicted)
+    )
+
+    # only the experiment with a changed model is predicted again
+    crystal = experiments[1].crystal
+    rotation = matrix.col((0, 1, 0)).axis_and_angle_as_r3_rotation_matrix(
+        0.1 * math.pi / 180.0
+    )
+    crystal.set_U(rotation * matrix.sqr(crystal.get_U()))
+    predictor.predicted = []
+    result = predictor(copy.deepcopy(reflections))
+    assert predictor.predicted == [experiments[1]]
+    expected = ScansExperimentsPredictor(experiments)(copy.deepcopy(reflections))
+    assert result["xyzcal.mm"].all_approx_equal(expected["xyzcal.mm"])
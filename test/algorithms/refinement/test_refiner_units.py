@@ -21,3 +21,14 @@ def test_that_the_experiment_reduced_copier_works_as_intended():
     # Anything read-only should be untouched
     for att in ["scan", "profile", "imageset", "scaling_model"]:
         assert getattr(sample, att) is getattr(dupe, att)
+
+
+def test_rows_by_experiment():
+    from dials.algorithms.refinement.reflection_manager import _rows_by_experiment
+    from dials.array_family import flex
+
+    ids = flex.int([2, 0, -1, 2, 1, 0, 5, 2])
+    groups = _rows_by_experiment(ids, 4)
+    assert len(groups) == 4
+    for iexp, isel in enumerate(groups):
+        assert list(isel) == list((ids == iexp).iselection())
@@ -174,3 +174,25 @@ def test_per_width_and_per_image_are_equivalent():
     assert r_pw["block"].all_eq(r_pi["block"])
     for bc1, bc2 in zip(r_pw["block_centre"], r_pi["block_centre"]):
         assert bc1 == pytest.approx(bc2)
+
+
+def test_per_width_matches_selection_per_block():
+
+    experiments = create_experiments(1)
+    reflections = generate_reflections(experiments)
+
+    width = 3 * experiments[0].scan.get_oscillation(deg=False)[1]
+    block_calculator = BlockCalculator(experiments, reflections)
+    reflections = block_calculator.per_width(width, deg=False)
+
+    # Each block should contain exactly the reflections with observed phi in
+    # its range, with later blocks taking any reflection on a boundary
+    start, stop = experiments[0].scan.get_oscillation_range(deg=False)
+    _width = width + 1e-11
+    phi = reflections["xyzobs.mm.value"].parts()[2]
+    expected = flex.size_t(len(reflections), 0)
+    for b_num in range(int(abs(stop - start) / width) + 1):
+        b_start = start + b_num * _width
+        expected.set_selected((b_start <= phi) & (phi <= b_start + _width), b_num)
+    assert reflections["block"].all_eq(expected)
+    assert flex.max(reflections["block"]) > 0
@@ -0,0 +1,53 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from dials.algorithms.spot_finding.factory import SpotFinderFactory, phil_scope
+from dials.algorithms.spot_finding.finder import ExtractPixelsFromImage
+from dials.array_family import flex
+
+
+@pytest.mark.parametrize("algorithm", ["dispersion", "dispersion_extended"])
+def test_threaded_panel_thresholds_match_serial(algorithm):
+    # Many equal-size panels, so the threads all share the cached threshold
+    # buffer of a single image size
+    flex.set_random_seed(0)
+    npanels, height, width = 16, 64, 64
+    image = []
+    mask = []
+    for i in range(npanels):
+        im = flex.random_double(height * width) * 10
+        for j in range(20):
+            y = flex.random_size_t(1, height - 4)[0] + 2
+            x = flex.random_size_t(1, width - 4)[0] + 2
+            im[y * width + x] += 200
+        im.reshape(flex.grid(height, width))
+        image.append(im)
+        mk = flex.bool(flex.grid(height, width), True)
+        mk[i] = False
+        mask.append(mk)
+    image = tuple(image)
+    mask = tuple(mask)
+
+    params = phil_scope.extract()
+    params.spotfinder.threshold.algorithm = algorithm
+    threshold_function = SpotFinderFactory.configure_threshold(params)
+
+    def threshold_masks(nthreads):
+        extract = ExtractPixelsFromImage(
+            imageset=None,
+            threshold_function=threshold_function,
+            mask=None,
+            region_of_interest=None,
+            max_strong_pixel_fraction=1,
+            compute_mean_background=False,
+            nthreads=nthreads,
+        )
+        return extract._compute_thresholds(image, mask)
+
+    serial = threshold_masks(1)
+    for i in range(5):
+        threaded = threshold_masks(4)
+        assert len(threaded) == npanels
+        for expected, result in zip(serial, threaded):
+            assert result.all_eq(expected)
@@ -118,6 +118,44 @@ def test_with_old_index_generator(data):
         )
 
 
+def test_on_frame_range(data):
+    from dials.algorithms.spot_prediction import ScanStaticReflectionPredictor
+    from dials.array_family import flex
+
+    experiment = data.experiments[0]
+    predict = ScanStaticReflectionPredictor(experiment)
+    A = experiment.crystal.get_A()
+    r_all = predict.for_ub(A)
+    z0, z1 = predict.frame_range()
+    assert (z0, z1) == experiment.scan.get_array_range()
+
+    # Predictions on consecutive ranges partition the full prediction
+    r_blocks = flex.reflection_table()
+    for f0 in range(z0, z1, 3):
+        f1 = min(f0 + 3, z1)
+        block = predict.for_ub_on_frame_range(A, f0, f1)
+        z = block["xyzcal.px"].parts()[2]
+        assert z.all_ge(f0) and z.all_lt(f1)
+        r_blocks.extend(block)
+    assert len(r_blocks) == len(r_all)
+    assert sorted(r_blocks["miller_index"]) == sorted(r_all["miller_index"])
+
+
+def test_reflection_table_iter_predictions_multi(data):
+    from dials.array_family import flex
+
+    experiment = data.experiments[0]
+    r_all = flex.reflection_table.from_predictions_multi(data.experiments)
+    blocks = list(
+        flex.reflection_table.iter_predictions_multi(data.experiments, block_size=4)
+    )
+    z0, z1 = experiment.scan.get_array_range()
+    assert [b[0] for b in blocks] == [(f, min(f + 4, z1)) for f in range(z0, z1, 4)]
+    assert sum(len(b[1]) for b in blocks) == len(r_all)
+    for _, table in blocks:
+        assert table["id"].all_eq(0)
+
+
 def test_with_reflection_table(data):
     from dials.algorithms.spot_prediction import ScanStaticReflectionPredictor
     from dials.array_family import flex
@@ -1294,6 +1294,70 @@ def test_experiment_identifiers():
     assert table.experiment_identifiers()[4] == "qrst"
 
 
+def test_concat():
+    tables = []
+    for i in range(5):
+        table = flex.reflection_table()
+        table["id"] = flex.int(i + 1, i)
+        table["xyzobs.px.value"] = flex.vec3_double([(i, i + 1, i + 2)] * (i + 1))
+        if i % 2:
+            table["miller_index"] = flex.miller_index([(i, 0, 0)] * (i + 1))
+        table.experiment_identifiers()[i] = "dataset-%d" % i
+        tables.append(table)
+    tables.append(flex.reflection_table())
+
+    # The result is the same as extending an empty table by each table in turn
+    expected = flex.reflection_table()
+    for table in tables:
+        expected.extend(table)
+    result = flex.reflection_table.concat(tables)
+    assert len(result) == len(expected) == 15
+    assert sorted(result.keys()) == sorted(expected.keys())
+    for key in expected.keys():
+        assert list(result[key]) == list(expected[key])
+    assert dict(result.experiment_identifiers()) == dict(
+        expected.experiment_identifiers()
+    )
+
+    # The inputs are not modified
+    assert len(tables[0]) == 1
+    assert "miller_index" not in tables[0]
+
+    assert len(flex.reflection_table.concat([])) == 0
+
+    # Columns of the same name must have the same type
+    other = flex.reflection_table()
+    other["id"] = flex.double(1, 0)
+    with pytest.raises(Exception):
+        flex.reflection_table.concat([tables[0], other])
+
+    # Identifiers must be consistent
+    other = flex.reflection_table()
+    other["id"] = flex.int(1, 0)
+    other.experiment_identifiers()[0] = "other"
+    with pytest.raises(RuntimeError):
+        flex.reflection_table.concat([tables[0], other])
+
+
+def test_reflection_table_builder():
+    builder = flex.reflection_table_builder()
+    assert len(builder) == 0
+    assert len(builder.build()) == 0
+    for i in range(3):
+        table = flex.reflection_table()
+        table["id"] = flex.int(2, i)
+        builder.append(table)
+    assert len(builder) == 6
+    result = builder.build()
+    assert list(result["id"]) == [0, 0, 1, 1, 2, 2]
+
+    # More tables can be added after building
+    builder.extend([result.select(result["id"] == 0)])
+    assert len(builder) == 8
+    assert list(builder.build()["id"]) == [0, 0, 1, 1, 2, 2, 0, 0]
+    assert len(result) == 6
+
+
 def test_select_remove_on_experiment_identifiers():
 
     table = flex.reflection_table()
@@ -1448,3 +1512,64 @@ def test_calculate_entering_flags(dials_regression):
     flags = refl["entering"]
     assert flags.count(True) == 58283
     assert flags.count(False) == 57799
+
+
+def test_asu_index():
+    from cctbx import crystal, miller
+
+    space_group = sgtbx.space_group_info("P 41 21 2").group()
+    random.seed(0)
+    indices = flex.miller_index(
+        [tuple(random.randint(-4, 4) for _ in range(3)) for _ in range(200)]
+    )
+    table = flex.reflection_table()
+    table["miller_index"] = indices
+
+    result = table.asu_index(space_group)
+    expected = (
+        miller.set(crystal.symmetry(space_group=space_group), indices, False)
+        .map_to_asu()
+        .indices()
+    )
+    assert list(result.miller_index) == list(expected)
+    assert list(table["miller_index"]) == list(indices)
+    assert "asu_miller_index" not in table
+
+    # The permutation groups the symmetry equivalent reflections
+    sorted_indices = result.miller_index.select(result.permutation)
+    offsets = list(result.group_offsets)
+    assert offsets[0] == 0 and offsets[-1] == len(table)
+    assert len(offsets) - 1 == len(set(expected))
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        group = set(sorted_indices[start:end])
+        assert len(group) == 1
+        assert sorted_indices[end - 1] == sorted_indices[start]
+    assert list(sorted_indices) == sorted(expected)
+
+    # Repeated calls reuse the result, and selections are mapped again
+    assert table.asu_index(space_group) is result
+    subset = table.select(flex.size_t(range(0, 200, 3)))
+    assert list(subset.asu_index(space_group).miller_index) == list(
+        expected.select(flex.size_t(range(0, 200, 3)))
+    )
+
+    # Changing the Miller indices is noticed
+    cb_op = sgtbx.change_of_basis_op("k,l,h")
+    subset["miller_index"] = cb_op.apply(subset["miller_index"])
+    reindexed = subset.asu_index(space_group)
+    assert list(reindexed.miller_index) != list(
+        expected.select(flex.size_t(range(0, 200, 3)))
+    )
+    assert list(reindexed.miller_index) == list(
+        miller.set(
+            crystal.symmetry(space_group=space_group), subset["miller_index"], False
+        )
+        .map_to_asu()
+        .indices()
+    )
+
+    # A different space group or anomalous flag is recomputed
+    anomalous = table.asu_index(space_group, anomalous=True)
+    assert len(anomalous.group_offsets) > len(result.group_offsets)
+    p1 = table.asu_index(sgtbx.space_group())
+    assert len(p1.group_offsets) > len(anomalous.group_offsets)
@@ -0,0 +1,95 @@
+from __future__ import absolute_import, division, print_function
+
+import multiprocessing
+import pickle
+
+import pytest
+
+from dials.array_family import flex
+from dials.array_family.shared_memory import SharedReflectionTable, is_available
+
+
+def make_table(n=10):
+    table = flex.reflection_table()
+    table["id"] = flex.int(list(range(n)))
+    table["panel"] = flex.size_t(list(range(n)))
+    table["intensity.sum.value"] = flex.double(list(range(n))) * 1.5
+    table["entering"] = flex.bool([i % 2 == 0 for i in range(n)])
+    table["xyzcal.px"] = flex.vec3_double([(i, i + 0.5, -i) for i in range(n)])
+    table["miller_index"] = flex.miller_index([(i, -i, 2 * i) for i in range(n)])
+    table["bbox"] = flex.int6(
+        [(i, i + 1, i + 2, i + 3, i + 4, i + 5) for i in range(n)]
+    )
+    table["name"] = flex.std_string(["r%d" % i for i in range(n)])
+    table.experiment_identifiers()[0] = "abc"
+    return table
+
+
+def assert_tables_equal(a, b):
+    assert len(a) == len(b)
+    assert sorted(a.keys()) == sorted(b.keys())
+    for key in a.keys():
+        assert list(a[key]) == list(b[key]), key
+    assert list(a.experiment_identifiers().keys()) == list(
+        b.experiment_identifiers().keys()
+    )
+
+
+def read_rows(handle):
+    table = handle.table()
+    table["intensity.sum.value"] *= 2
+    return list(table["intensity.sum.value"]), list(table["name"])
+
+
+@pytest.mark.parametrize("use_shared_memory", [True, False])
+def test_shared_reflection_table(use_shared_memory):
+    table = make_table()
+    with SharedReflectionTable(table, use_shared_memory=use_shared_memory) as shared:
+        assert len(shared) == 10
+        assert sorted(shared.keys()) == sorted(table.keys())
+        assert_tables_equal(shared.table(), table)
+
+        # The shared arrays are read only
+        array = shared.array("intensity.sum.value")
+        with pytest.raises(ValueError):
+            array[0] = 1
+        del array
+
+        # Subsets, and subsets of them
+        rows = flex.size_t([7, 2, 5, 3])
+        subset = shared.subset(rows.as_numpy_array())
+        assert len(subset) == 4
+        assert_tables_equal(subset.table(), table.select(rows))
+        assert_tables_equal(
+            subset.subset([1, 3]).table(), table.select(flex.size_t([2, 3]))
+        )
+        assert list(subset.table(columns=["id"]).keys()) == ["id"]
+
+        # The handle is small when pickled, and the copy reads the same data
+        copy = pickle.loads(pickle.dumps(subset))
+        assert_tables_equal(copy.table(), table.select(rows))
+        if use_shared_memory and is_available():
+            assert len(pickle.dumps(shared)) < len(pickle.dumps(table))
+
+        # Modifying a table of the rows does not modify the shared data
+        private = subset.table()
+        private["intensity.sum.value"] *= 2
+        assert list(shared.table()["intensity.sum.value"]) == list(
+            table["intensity.sum.value"]
+        )
+
+
+@pytest.mark.skipif(not is_available(), reason="Requires shared memory")
+def test_shared_reflection_table_in_worker_processes():
+    table = make_table(100)
+    blocks = [list(range(i, 100, 4)) for i in range(4)]
+    with SharedReflectionTable(table) as shared:
+        pool = multiprocessing.Pool(2)
+        try:
+            results = pool.map(read_rows, [shared.subset(rows) for rows in blocks])
+        finally:
+            pool.close()
+            pool.join()
+        for rows, (intensities, names) in zip(blocks, results):
+            assert intensities == [3.0 * i for i in rows]
+            assert names == ["r%d" % i for i in rows]
@@ -73,3 +73,38 @@ def test_cluster_unit_cell_api(dials_regression):
         [0.09509739126548639, 0.09509739126548526, 0.0950973912654865, 0, 0, 0],
         abs=1e-6,
     )
+
+
+def test_cluster_unit_cell_sparse(dials_regression):
+    pytest.importorskip("scipy")
+    pytest.importorskip("xfel")
+
+    data_dir = os.path.join(
+        dials_regression, "refinement_test_data", "multi_narrow_wedges"
+    )
+    experiments = ExperimentList(
+        [
+            ExperimentListFactory.from_json_file(expt, check_format=False)[0]
+            for expt in glob.glob(
+                os.path.join(data_dir, "data/sweep_*/experiments.json")
+            )
+        ]
+    )
+    crystal_symmetries = [
+        crystal.symmetry(
+            unit_cell=expt.crystal.get_unit_cell(),
+            space_group=expt.crystal.get_space_group(),
+        )
+        for expt in experiments
+    ]
+
+    params = cluster_unit_cell.phil_scope.extract()
+    params.sparse.enable = True
+    clusters = cluster_unit_cell.do_cluster_analysis(crystal_symmetries, params)
+    assert len(clusters) == 1
+    assert len(clusters[0].members) == 40
+
+    # Below the spread of the cells every cell is its own cluster
+    params.threshold = 1e-6
+    clusters = cluster_unit_cell.do_cluster_analysis(crystal_symmetries, params)
+    assert len(clusters) > 1
@@ -11,6 +11,7 @@
 import pytest
 
 from dxtbx.serialize import load
+from dxtbx.model import Experiment
 from dxtbx.model.experiment_list import ExperimentListFactory
 from dials.array_family import flex
 import dials.command_line.combine_experiments as combine_experiments
@@ -391,3 +392,92 @@ def test_failed_tolerance_error(dials_regression, monkeypatch):
         script.run_with_preparsed(params, options)
     assert "Beam" in str(exc.value)
     print("Got (expected) error message:", exc.value)
+
+
+def test_experiment_index(dials_regression, monkeypatch):
+    """Test that experiments are traced back to the file they came from"""
+    jsons = os.path.join(
+        dials_regression,
+        "refinement_test_data",
+        "multi_narrow_wedges",
+        "data",
+        "sweep_{:03d}",
+        "{}",
+    )
+    files = []
+    for i in (2, 3, 4):
+        files.append(jsons.format(i, "experiments.json"))
+        files.append(jsons.format(i, "reflections.pickle"))
+
+    script = combine_experiments.Script()
+    params, options = script.parser.parse_args(files)
+
+    index = combine_experiments.ExperimentIndex(params.input.experiments)
+    for source in params.input.experiments:
+        for i, experiment in enumerate(source.data):
+            assert index.find(experiment) == (source.filename, i)
+            assert combine_experiments.find_experiment_in(
+                experiment, params.input.experiments
+            ) == (source.filename, i)
+
+    with pytest.raises(ValueError):
+        index.find(Experiment())
+
+    # Every input experiment is found by its key, without a search
+    def no_search(self, experiment):
+        raise AssertionError("Experiment not found by key")
+
+    monkeypatch.setattr(combine_experiments.ExperimentIndex, "_search", no_search)
+    for source in params.input.experiments:
+        for i, experiment in enumerate(source.data):
+            assert index.find(experiment) == (source.filename, i)
+
+    # Combined experiments with a reference model are traced back to the input,
+    # also by key
+    reference_beam = params.input.experiments[0].data[0].beam
+    combine = combine_experiments.CombineWithReference(
+        beam=reference_beam, experiment_index=index
+    )
+    for source in params.input.experiments:
+        for i, experiment in enumerate(source.data):
+            combined = combine(experiment)
+            assert index.find(combined) == (source.filename, i)
+
+
+def test_combine_deduplicate_models(dials_regression, tmpdir):
+    """Identical models from separate files are shared if requested"""
+    data_dir = os.path.join(
+        dials_regression, "refinement_test_data", "multi_narrow_wedges", "data"
+    )
+    expts = os.path.join(data_dir, "sweep_002", "experiments.json")
+    refls = os.path.join(data_dir, "sweep_002", "reflections.pickle")
+
+    for deduplicate, n_models in (("False", 2), ("True", 1)):
+        result = procrunner.run(
+            [
+                "dials.combine_experiments",
+                expts,
+                refls,
+                expts,
+                refls,
+                "deduplicate_models=%s" % deduplicate,
+            ],
+            working_directory=tmpdir,
+        )
+        assert not result.returncode and not result.stderr
+
+        exps = load.experiment_list(
+            tmpdir.join("combined.expt").strpath, check_format=False
+        )
+        assert len(exps) == 2
+        assert len(exps.beams()) == n_models
+        assert len(exps.detectors()) == n_models
+
+        ref = flex.reflection_table.from_file(tmpdir.join("combined.refl").strpath)
+        single = flex.reflection_table.from_file(refls)
+        n_single = (single["id"] == 0).count(True)
+        assert len(ref) == 2 * n_single
+        assert (ref["id"] == 0).count(True) == n_single
+        assert (ref["id"] == 1).count(True) == n_single
+        # Reflections are grouped by experiment
+        assert list(ref["id"][:n_single]) == [0] * n_single
@@ -139,3 +139,22 @@ def test_export_restricted_multiimage(dials_data, tmpdir):
     assert [f.basename for f in tmpdir.listdir("*.png")] == [
         "image0002.png"
     ], "Only one image expected"
+
+
+def test_export_stacked_bitmaps_in_parallel(dials_data, tmpdir):
+    result = procrunner.run(
+        [
+            "dials.export_bitmaps",
+            dials_data("centroid_test_data").join("experiments.json").strpath,
+            "stack_images=3",
+            "stack_mode=max",
+            "nproc=2",
+        ],
+        working_directory=tmpdir.strpath,
+    )
+    assert not result.returncode and not result.stderr
+
+    for i in (1, 4, 7):
+        assert tmpdir.join("image000%i.png" % i).check(file=1)
+    for i in (2, 3, 5, 6, 8, 9):
+        assert not tmpdir.join("image000%i.png" % i).check()
@@ -365,3 +365,39 @@ def test_find_spots_with_per_image_statistics(dials_data, tmpdir):
     assert (
         b"|   image |   #spots |   #spots_no_ice |   total_intensity |" in result.stdout
     )
+
+
+def test_find_spots_in_parallel_matches_serial(dials_data, tmpdir):
+    images = [
+        f.strpath for f in dials_data("centroid_test_data").listdir("centroid*.cbf")
+    ]
+    results = []
+    for nproc in (1, 3):
+        prefix = "nproc%d_" % nproc
+        result = procrunner.run(
+            [
+                "dials.find_spots",
+                "nproc=%d" % nproc,
+                "write_hot_mask=True",
+                "hot_mask_prefix=%shot_mask" % prefix,
+                "output.reflections=%sstrong.refl" % prefix,
+                "algorithm=dispersion",
+            ]
+            + images,
+            working_directory=tmpdir.strpath,
+        )
+        assert not result.returncode and not result.stderr
+        reflections = flex.reflection_table.from_file(
+            tmpdir / ("%sstrong.refl" % prefix)
+        )
+        with tmpdir.join("%shot_mask_0.pickle" % prefix).open("rb") as f:
+            mask = pickle.load(f)
+        results.append((reflections, mask))
+
+    (serial, serial_mask), (parallel, parallel_mask) = results
+    assert len(parallel) == len(serial)
+    key = lambda r: (r["panel"], r["bbox"], r["intensity.sum.value"])
+    assert sorted(key(r) for r in parallel.rows()) == sorted(
+        key(r) for r in serial.rows()
+    )
+    assert parallel_mask[0].all_eq(serial_mask[0])
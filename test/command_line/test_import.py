@@ -401,3 +401,31 @@ def test_with_convert_sequences_to_stills(dials_data, tmpdir):
 
     # all should call out as still too
     assert experiments.all_stills()
+
+
+def test_import_in_parallel_with_cache(dials_data, tmpdir):
+    image_files = dials_data("centroid_test_data").listdir("centroid*.cbf", sort=True)
+    del image_files[4]  # Delete filename to force two sequences
+
+    for output in ("first.expt", "second.expt"):
+        result = procrunner.run(
+            [
+                "dials.import",
+                "nproc=2",
+                "cache=import.cache",
+                "output.experiments=%s" % output,
+            ]
+            + [f.strpath for f in image_files],
+            working_directory=tmpdir.strpath,
+        )
+        assert not result.returncode and not result.stderr
+        assert tmpdir.join("import.cache").check(file=1)
+
+    first = load.experiment_list(tmpdir.join("first.expt").strpath)
+    second = load.experiment_list(tmpdir.join("second.expt").strpath)
+    assert len(first) == len(second) == 2
+    for e1, e2 in zip(first, second):
+        assert e1.imageset.paths() == e2.imageset.paths()
+        assert e1.scan.get_image_range() == e2.scan.get_image_range()
+        assert e1.beam == e2.beam
+        assert e1.detector == e2.detector
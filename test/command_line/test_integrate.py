@@ -9,6 +9,7 @@
 from dials.array_family import flex
 from dials.algorithms.integration.processor import _average_bbox_size
 import procrunner
+import pytest
 
 
 def test2(dials_data, tmpdir):
@@ -215,6 +216,59 @@ def test_multi_sweep(dials_regression, tmpdir):
     assert flex.abs(I1 - I2) < 1e-6
 
 
+def test_integrate_in_blocks(dials_regression, tmpdir):
+    expts = os.path.join(
+        dials_regression, "integration_test_data", "multi_sweep", "experiments.json"
+    )
+    refls = os.path.join(
+        dials_regression, "integration_test_data", "multi_sweep", "indexed.pickle"
+    )
+
+    tables = []
+    for block_size in (None, 2):
+        output = "integrated_%s.refl" % block_size
+        command = [
+            "dials.integrate",
+            expts,
+            refls,
+            "prediction.padding=0",
+            "output.reflections=%s" % output,
+        ]
+        if block_size:
+            command.append("prediction_block_size=%d" % block_size)
+        result = procrunner.run(command, working_directory=tmpdir)
+        assert not result.returncode and not result.stderr
+        tables.append(flex.reflection_table.from_file(tmpdir / output))
+
+    # The same reflections are integrated, with the same reference profiles
+    def by_reflection(table):
+        return {
+            (
+                row["id"],
+                row["miller_index"],
+                row["entering"],
+                round(row["xyzcal.px"][2], 3),
+            ): row
+            for row in table.rows()
+        }
+
+    whole, blocks = map(by_reflection, tables)
+    assert len(tables[1]) == len(tables[0])
+    assert set(blocks) == set(whole)
+    flags = tables[0].flags
+    for key, row in whole.items():
+        other = blocks[key]
+        assert (
+            other["flags"] & flags.reference_spot == row["flags"] & flags.reference_spot
+        )
+        assert other["intensity.sum.value"] == pytest.approx(row["intensity.sum.value"])
+        if row["flags"] & flags.integrated_prf:
+            assert other["flags"] & flags.integrated_prf
+            assert other["intensity.prf.value"] == pytest.approx(
+                row["intensity.prf.value"], rel=1e-3
+            )
+
+
 def test_multi_lattice(dials_regression, tmpdir):
 
     expts = os.path.join(
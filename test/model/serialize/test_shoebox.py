@@ -0,0 +1,90 @@
+from __future__ import absolute_import, division, print_function
+
+import random
+
+import pytest
+
+from dials.array_family import flex
+from dials.model.data import Shoebox
+from dials.model.serialize.shoebox import ShoeboxReader, ShoeboxWriter
+
+
+def random_reflections(num):
+    random.seed(0)
+    reflections = flex.reflection_table()
+    shoeboxes = flex.shoebox(num)
+    bboxes = flex.int6(num)
+    for i in range(num):
+        x0 = random.randint(0, 100)
+        y0 = random.randint(0, 100)
+        z0 = random.randint(0, 50)
+        bbox = (x0, x0 + 5, y0, y0 + 5, z0, z0 + random.randint(1, 5))
+        shoebox = Shoebox(0, bbox)
+        shoebox.allocate()
+        for j in range(len(shoebox.data)):
+            shoebox.data[j] = random.uniform(0, 100)
+        shoeboxes[i] = shoebox
+        bboxes[i] = bbox
+    reflections["shoebox"] = shoeboxes
+    reflections["bbox"] = bboxes
+    reflections["panel"] = flex.size_t(num, 0)
+    reflections["id"] = flex.int(num, 0)
+    return reflections
+
+
+def test_shoebox_store_round_trip(tmpdir):
+    reflections = random_reflections(200)
+    filename = tmpdir.join("shoeboxes.sbx").strpath
+    with ShoeboxWriter(filename) as writer:
+        ids = writer.write(reflections, block_size=10)
+    assert list(ids) == list(range(200))
+
+    with ShoeboxReader(filename) as reader:
+        assert len(reader) == 6
+        assert reader.block(0) == (0, 10)
+        assert sum(len(block) for block in reader) == 200
+
+        # Random access by reflection id returns rows in the requested order
+        wanted = [150, 3, 77, 199, 0]
+        table = reader.select(wanted)
+        assert list(table["shoebox_id"]) == wanted
+        for i, j in zip(wanted, range(len(wanted))):
+            assert table["bbox"][j] == reflections["bbox"][i]
+            assert table["shoebox"][j].data.all_eq(reflections["shoebox"][i].data)
+        with pytest.raises(KeyError):
+            reader.select([1000])
+
+        # Reading by image range includes shoeboxes that started earlier
+        z0, z1 = 20, 22
+        expected = set(
+            i
+            for i, bbox in enumerate(reflections["bbox"])
+            if bbox[4] < z1 and bbox[5] > z0
+        )
+        table = reader.read(z0, z1)
+        assert set(table["shoebox_id"]) == expected
+
+
+def test_shoebox_store_appends_blocks(tmpdir):
+    reflections = random_reflections(20)
+    filename = tmpdir.join("shoeboxes.sbx").strpath
+    with ShoeboxWriter(filename, columns=[]) as writer:
+        first = writer.write_block(reflections[:10], (0, 50))
+        second = writer.write_block(reflections[10:], (0, 50))
+    assert list(first) == list(range(10))
+    assert list(second) == list(range(10, 20))
+    with ShoeboxReader(filename) as reader:
+        assert len(reader) == 2
+        assert reader.columns() == ["shoebox", "shoebox_id"]
+        assert 19 in reader
+        assert list(reader[1]["shoebox_id"]) == list(range(10, 20))
+
+
+def test_shoebox_store_rejects_unclosed_file(tmpdir):
+    filename = tmpdir.join("shoeboxes.sbx").strpath
+    writer = ShoeboxWriter(filename)
+    writer.write(random_reflections(5))
+    writer._file.flush()
+    with pytest.raises(ValueError):
+        ShoeboxReader(filename)
+    writer.close()
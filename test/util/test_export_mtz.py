@@ -99,3 +99,42 @@ def test_calculate_batch_ranges(self):
         assert all(float(x).is_integer() for x in offsets)
         assert all(isinstance(x, int) for x in offsets)
         assert all(x > 0 for x in offsets)
+
+
+def test_dials_batch_crystal_arrays():
+    """Batch cell and orientation arrays match the per-image calculation"""
+    import pytest
+    from dxtbx.model import Crystal
+    from scitbx import matrix
+
+    import dials.util.ext
+    from dials.array_family import flex
+
+    crystal = Crystal((10, 0, 0), (1, 11, 0), (0, 2, 12), space_group_symbol="P1")
+    A = matrix.sqr(crystal.get_A())
+    axis = matrix.col((1, 0, 0))
+    crystal.set_A_at_scan_points(
+        [axis.axis_and_angle_as_r3_rotation_matrix(i, deg=True) * A for i in range(5)]
+    )
+    F = matrix.col((0, 1, 1)).axis_and_angle_as_r3_rotation_matrix(10, deg=True)
+
+    for scan_varying in (True, False):
+        cell_array = flex.float(flex.grid(3, 6))
+        umat_array = flex.float(flex.grid(3, 9))
+        dials.util.ext.dials_batch_crystal_arrays(
+            crystal, F.elems, 1, scan_varying, cell_array, umat_array
+        )
+        for i in range(3):
+            if scan_varying:
+                uc = crystal.get_unit_cell_at_scan_point(i + 1)
+                U = matrix.sqr(crystal.get_U_at_scan_point(i + 1))
+            else:
+                uc = crystal.get_unit_cell()
+                U = matrix.sqr(crystal.get_U())
+            U = matrix.sqr(dials.util.ext.dials_u_to_mosflm(F * U, uc))
+            assert [cell_array[i, j] for j in range(6)] == pytest.approx(
+                uc.parameters(), rel=1e-6
+            )
+            assert [umat_array[i, j] for j in range(9)] == pytest.approx(
+                U.transpose().elems, abs=1e-6
+            )
@@ -708,6 +708,21 @@ def test_sum_partial_reflections():
     assert r2 is r
     assert list(r["identifier"]) == [1, 2, 3]
 
+    # Groups of different sizes with unordered partial ids are combined into the
+    # first row of each group
+    r = flex.reflection_table()
+    r["intensity.sum.value"] = flex.double([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0])
+    r["intensity.sum.variance"] = flex.double(7, 1.0)
+    r["partial_id"] = flex.int([2, 0, 2, 1, 0, 2, 3])
+    r["partiality"] = flex.double(7, 0.3)
+    r["identifier"] = flex.int([1, 2, 3, 4, 5, 6, 7])
+
+    r = sum_partial_reflections(r)
+    assert list(r["identifier"]) == [1, 2, 4, 7]
+    assert list(r["intensity.sum.value"]) == [10.0, 7.0, 4.0, 7.0]
+    assert list(r["intensity.sum.variance"]) == [3.0, 2.0, 1.0, 1.0]
+    assert list(r["partiality"]) == pytest.approx([0.9, 0.6, 0.3, 0.3])
+
     # Add test to check calculation in case where both prf and sum - but this
     # requires knowing how the values will be weighted, so leave until that is
     # decided.
@@ -0,0 +1,89 @@
+from __future__ import absolute_import, division, print_function
+
+import glob
+import os
+
+import pytest
+from dxtbx.model.experiment_list import ExperimentListFactory
+
+from dials.util.image_import import (
+    experiments_from_filenames,
+    filename_template,
+    group_filenames,
+)
+
+
+def test_filename_template():
+    assert filename_template("image_0001.cbf") == "image_####.cbf"
+    assert filename_template(os.path.join("run_2", "x_00010.h5")) == os.path.join(
+        "run_2", "x_#####.h5"
+    )
+    assert filename_template("image_0001.cbf.gz") == "image_####.cbf.gz"
+    assert filename_template("image.cbf") == "image.cbf"
+    assert filename_template("master.h5") == "master.h5"
+
+
+def test_group_filenames():
+    filenames = [
+        "a_0001.cbf",
+        "a_0002.cbf",
+        "b_0001.cbf",
+        "a_0003.cbf",
+        "master.h5",
+    ]
+    assert group_filenames(filenames) == [
+        ["a_0001.cbf", "a_0002.cbf"],
+        ["b_0001.cbf"],
+        ["a_0003.cbf"],
+        ["master.h5"],
+    ]
+
+
+def assert_same_as_serial_import(experiments, filenames):
+    serial = ExperimentListFactory.from_filenames(filenames)
+    assert len(experiments) == len(serial)
+    assert len(experiments.imagesets()) == len(serial.imagesets())
+    assert len(experiments.beams()) == len(serial.beams())
+    assert len(experiments.detectors()) == len(serial.detectors())
+    assert len(experiments.goniometers()) == len(serial.goniometers())
+    for e1, e2 in zip(experiments, serial):
+        assert e1.imageset.paths() == e2.imageset.paths()
+        assert e1.imageset.get_format_class() == e2.imageset.get_format_class()
+        assert e1.beam == e2.beam
+        assert e1.detector == e2.detector
+        assert e1.goniometer == e2.goniometer
+        assert e1.scan == e2.scan
+
+
+def test_import_stills_in_chunks(dials_regression, tmpdir):
+    filenames = sorted(
+        glob.glob(
+            os.path.join(dials_regression, "image_examples", "DLS_I24_stills", "*.cbf")
+        )
+    )
+    if len(filenames) < 3:
+        pytest.skip("Not enough still images to import in chunks")
+
+    cache = tmpdir.join("import.cache").strpath
+    for _ in range(2):
+        # The second import is read from the cache
+        experiments = experiments_from_filenames(filenames, nproc=3, cache=cache)
+        assert_same_as_serial_import(experiments, filenames)
+        assert len(experiments.imagesets()) == 1
+        assert experiments[-1].imageset.get_raw_data(len(filenames) - 1)
+
+
+def test_import_runs_in_parallel(dials_data, tmpdir):
+    image_files = dials_data("centroid_test_data").listdir("centroid*.cbf", sort=True)
+    filenames = []
+    for i, image_file in enumerate(image_files, start=1):
+        filename = tmpdir.join("%s_%04d.cbf" % ("a" if i < 5 else "b", i))
+        image_file.copy(filename)
+        filenames.append(filename.strpath)
+
+    experiments = experiments_from_filenames(filenames, nproc=2)
+    assert_same_as_serial_import(experiments, filenames)
+    assert len(experiments) == 2
+    # The runs share their models, as in a serial import
+    assert len(experiments.beams()) == 1
+    assert len(experiments.detectors()) == 1
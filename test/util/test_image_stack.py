@@ -0,0 +1,43 @@
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from dials.array_family import flex
+from dials.util.image_stack import stack_images
+from dxtbx.model.experiment_list import ExperimentListFactory
+
+
+@pytest.mark.parametrize("nproc", [1, 2])
+@pytest.mark.parametrize("mode", ["sum", "max", "mean"])
+def test_stack_images(dials_data, mode, nproc):
+    experiments = ExperimentListFactory.from_json_file(
+        dials_data("centroid_test_data").join("experiments.json").strpath
+    )
+    imageset = experiments.imagesets()[0]
+
+    def expected_stack(get_data):
+        expected = get_data(0)[0].as_double()
+        for i in range(1, 5):
+            data = get_data(i)[0].as_double()
+            if mode == "max":
+                expected.set_selected(data > expected, data)
+            else:
+                expected += data
+        if mode == "mean":
+            expected /= 5
+        return expected
+
+    # The corrected data are stacked by default
+    expected = expected_stack(lambda i: imageset[i])
+    stacked = stack_images(imageset, range(5), mode=mode, nproc=nproc)
+    assert len(stacked) == 1
+    assert stacked[0].all() == expected.all()
+    assert flex.max(flex.abs(stacked[0] - expected)) < 1e-7
+
+    expected = expected_stack(imageset.get_raw_data)
+    stacked = stack_images(imageset, range(5), mode=mode, nproc=nproc, raw=True)
+    assert len(stacked) == 1
+    assert flex.max(flex.abs(stacked[0] - expected)) < 1e-7
+
+    with pytest.raises(ValueError):
+        stack_images(imageset, range(5), mode="median")
@@ -0,0 +1,129 @@
+"""
+Generation of html reports in background processes.
+
+Building the plots for the html report of a program can take minutes for a
+large dataset, and need not hold up the writing of the data files. Within a
+reports_in_background() block, a report started with start_report() is
+generated in a forked child process, which works on a snapshot of the data at
+the time the report was started, while the program goes on to write its data
+files. The block waits for the reports to be finished before it exits::
+
+  with reports_in_background(params.output.report_in_background):
+      script.run()  # the observers call start_report()
+      script.export()
+
+Outside such a block, or where processes cannot be forked, reports are
+generated at once in the calling process.
+
+Plots of per-reflection data are kept to a bounded size by plotting a random
+sample of at most MAX_PLOT_POINTS reflections, see downsample().
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import contextlib
+import logging
+import multiprocessing
+import os
+import sys
+
+import numpy
+
+from dials.array_family import flex
+
+logger = logging.getLogger("dials")
+
+# The maximum number of reflections to plot individually in a report
+MAX_PLOT_POINTS = 20000
+
+_background = False
+_processes = []
+
+
+def _fork_context():
+    """The multiprocessing context for forked processes, or None."""
+    if not hasattr(os, "fork"):
+        return None
+    try:
+        return multiprocessing.get_context("fork")
+    except AttributeError:  # Python 2, which always forks
+        return multiprocessing
+
+
+def _generate_report(function, args, kwargs):
+    try:
+        function(*args, **kwargs)
+    except Exception:
+        logger.error("Error generating report", exc_info=True)
+        sys.exit(1)
+
+
+def start_report(function, *args, **kwargs):
+    """
+    Generate a report, in a background process if enabled.
+
+    :param function: The function which generates and writes the report
+    :param args: The arguments to the function
+    :param kwargs: The keyword arguments to the function
+    """
+    if not _background:
+        function(*args, **kwargs)
+        return
+    process = _fork_context().Process(
+        target=_generate_report, args=(function, args, kwargs)
+    )
+    process.start()
+    _processes.append(process)
+
+
+def wait_for_reports():
+    """
+    Wait for all the reports generating in the background to finish.
+
+    :returns: True if all the reports were generated successfully
+    """
+    success = True
+    while _processes:
+        process = _processes.pop(0)
+        process.join()
+        if process.exitcode:
+            logger.warning("Report generation failed (exit code %d)", process.exitcode)
+            success = False
+    return success
+
+
+@contextlib.contextmanager
+def reports_in_background(enable=True):
+    """
+    Generate the reports started in the block in background processes.
+
+    :param enable: False to generate the reports in the calling process
+    """
+    global _background
+    previous = _background
+    _background = bool(enable) and _fork_context() is not None
+    try:
+        yield
+    finally:
+        _background = previous
+        wait_for_reports()
+
+
+def downsample(n, max_points=MAX_PLOT_POINTS, seed=0):
+    """
+    Choose a random sample of reflections to plot.
+
+    The sample is the same each time for the same number of reflections, and
+    does not use or change the state of the flex random number generator.
+
+    :param n: The number of reflections
+    :param max_points: The maximum number of reflections to choose
+    :param seed: The random seed
+    :returns: The sorted indices of the chosen reflections, or of all the
+              reflections if there are no more than max_points
+    """
+    if n <= max_points:
+        return flex.size_t_range(n)
+    rng = numpy.random.RandomState(seed)
+    indices = numpy.sort(rng.choice(n, max_points, replace=False))
+    return flex.size_t(indices.tolist())
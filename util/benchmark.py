@@ -0,0 +1,266 @@
+"""
+Benchmarking of the DIALS processing pipeline on simulated data.
+
+Rotation datasets are simulated with dials.algorithms.simulation.images and
+processed by the command line programs, from dials.import to dials.export.
+Each stage is run in its own process with instrumentation enabled, and its
+wall time, CPU time, throughput and peak memory use are recorded. Results are
+written as JSON, and can be compared against the results of another commit to
+find stages that have become slower or use more memory.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+import procrunner
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+
+# A stage of the pipeline: the command line to run, what the throughput is
+# measured in ("images" or "reflections"), and the number of items processed
+# or the reflection file to count them in
+Stage = collections.namedtuple("Stage", ["name", "command", "unit", "items"])
+
+
+def pipeline(templates, n_images, unit_cell, space_group, nproc=1):
+    """
+    The stages processing simulated datasets.
+
+    :param templates: The filename templates of the datasets
+    :param n_images: The total number of images
+    :param unit_cell: The unit cell parameters, for indexing
+    :param space_group: The space group symbol, for indexing
+    :param nproc: The number of processes for the stages that can use them
+    :returns: A list of stages, in the order they must be run
+    """
+    unit_cell = ",".join("%g" % p for p in unit_cell)
+    return [
+        Stage(
+            "import",
+            ["dials.import"] + ["template=%s" % t for t in templates],
+            "images",
+            n_images,
+        ),
+        Stage(
+            "find_spots",
+            ["dials.find_spots", "imported.expt", "nproc=%d" % nproc],
+            "images",
+            n_images,
+        ),
+        Stage(
+            "index",
+            [
+                "dials.index",
+                "imported.expt",
+                "strong.refl",
+                "joint_indexing=False",
+                "unit_cell=%s" % unit_cell,
+                "space_group=%s" % space_group,
+                "indexing.nproc=%d" % nproc,
+            ],
+            "reflections",
+            "strong.refl",
+        ),
+        Stage(
+            "refine",
+            ["dials.refine", "indexed.expt", "indexed.refl"],
+            "reflections",
+            "indexed.refl",
+        ),
+        Stage(
+            "integrate",
+            ["dials.integrate", "refined.expt", "refined.refl", "nproc=%d" % nproc],
+            "images",
+            n_images,
+        ),
+        Stage(
+            "cosym",
+            ["dials.cosym", "integrated.expt", "integrated.refl", "nproc=%d" % nproc],
+            "reflections",
+            "integrated.refl",
+        ),
+        Stage(
+            "scale",
+            ["dials.scale", "symmetrized.expt", "symmetrized.refl"],
+            "reflections",
+            "symmetrized.refl",
+        ),
+        Stage(
+            "export",
+            ["dials.export", "scaled.expt", "scaled.refl"],
+            "reflections",
+            "scaled.refl",
+        ),
+    ]
+
+
+def _children_cpu_time():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _count_items(items, directory):
+    """The number of items processed by a stage."""
+    if isinstance(items, int):
+        return items
+    from dials.array_family import flex
+
+    return len(flex.reflection_table.from_file(os.path.join(directory, items)))
+
+
+def run_stage(stage, directory):
+    """
+    Run a stage of the pipeline with instrumentation enabled.
+
+    :param stage: The stage to run
+    :param directory: The working directory
+    :returns: A dictionary of the timings, throughput and memory use
+    """
+    instrument_json = "%s.instrument.json" % stage.name
+    command = stage.command + ["--instrument-json=%s" % instrument_json]
+    logger.info("Running %s", " ".join(command))
+
+    # Count the input reflections before the stage replaces any files
+    items = _count_items(stage.items, directory)
+    cpu_start = _children_cpu_time()
+    start = time.time()
+    result = procrunner.run(
+        command,
+        working_directory=directory,
+        environment_override={"DIALS_NOBANNER": "1"},
+        print_stdout=False,
+        print_stderr=False,
+    )
+    wall_time = time.time() - start
+    if result.returncode:
+        output = (result.stderr or result.stdout).decode("latin-1").strip()
+        raise RuntimeError(
+            "%s failed with exit code %d:\n%s"
+            % (
+                stage.command[0],
+                result.returncode,
+                "\n".join(output.splitlines()[-20:]),
+            )
+        )
+
+    cpu_time = None
+    if cpu_start is not None:
+        cpu_time = _children_cpu_time() - cpu_start
+    with open(os.path.join(directory, instrument_json)) as fh:
+        instrumentation = json.load(fh)
+    worker_memory = [
+        w["memory"] for w in instrumentation["workers"].values() if w["memory"]
+    ]
+    return {
+        "command": " ".join(stage.command),
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "items": items,
+        "unit": stage.unit,
+        "throughput": items / wall_time if wall_time else None,
+        "peak_memory": instrumentation["memory"],
+        "worker_peak_memory": max(worker_memory) if worker_memory else None,
+        "spans": instrumentation["spans"],
+    }
+
+
+def host_information():
+    """
+    :returns: A description of the machine, to judge which results are comparable
+    """
+    try:
+        import multiprocessing
+
+        cpus = multiprocessing.cpu_count()
+    except NotImplementedError:
+        cpus = None
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": cpus,
+        "python": sys.version.split()[0],
+    }
+
+
+def run_pipeline(stages, directory, selected=None, repeats=1):
+    """
+    Run the stages of a pipeline, timing those selected.
+
+    Every stage before the last selected one is run, since later stages need
+    their output, but only the selected stages are repeated and reported.
+
+    :param stages: The stages, in the order they must be run
+    :param directory: The working directory
+    :param selected: The names of the stages to report, or None for all
+    :param repeats: How many times to run each selected stage
+    :returns: An ordered dictionary of the results for each selected stage.
+              The fastest of the repeats is reported.
+    """
+    if selected is None:
+        selected = [stage.name for stage in stages]
+    last = max(i for i, stage in enumerate(stages) if stage.name in selected)
+    results = collections.OrderedDict()
+    for stage in stages[: last + 1]:
+        if stage.name not in selected:
+            run_stage(stage, directory)
+            continue
+        runs = [run_stage(stage, directory) for _ in range(repeats)]
+        best = min(runs, key=lambda r: r["wall_time"])
+        best["repeats"] = [r["wall_time"] for r in runs]
+        results[stage.name] = best
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Find the stages that have become slower or use more memory.
+
+    :param results: The benchmark results
+    :param baseline: The benchmark results to compare against
+    :param tolerance: The fractional increase allowed before reporting
+    :returns: A list of (stage, metric, baseline value, value) for each increase
+    """
+    regressions = []
+    for name, stage in results["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            continue
+        for metric in ("wall_time", "peak_memory"):
+            if not stage.get(metric) or not before.get(metric):
+                continue
+            if stage[metric] > before[metric] * (1 + tolerance):
+                regressions.append((name, metric, before[metric], stage[metric]))
+    return regressions
+
+
+def load_results(filename):
+    """
+    Read benchmark results from a JSON file.
+
+    :param filename: The results filename
+    :returns: The results dictionary
+    """
+    with open(filename) as fh:
+        results = json.load(fh)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(
+            "%s is not a version %d benchmark result" % (filename, RESULTS_VERSION)
+        )
+    return results
@@ -40,6 +40,15 @@ namespace dials { namespace util { namespace boost_python {
 
     def("dials_u_to_mosflm", &dials_u_to_mosflm, (arg("dials_U"), arg("uc")));
 
+    def("dials_batch_crystal_arrays",
+        &dials_batch_crystal_arrays,
+        (arg("crystal"),
+         arg("F"),
+         arg("first"),
+         arg("scan_varying"),
+         arg("cell_array"),
+         arg("umat_array")));
+
     def("add_dials_batches",
         &add_dials_batches,
         (arg("mtz"),
@@ -1,6 +1,8 @@
 import logging
 import math
 
+import numpy
+
 from libtbx.math_utils import iceil
 
 from dials.array_family import flex
@@ -102,13 +104,17 @@ def blank_integrated_analysis(reflections, scan, phi_step, fractional_loss):
     logger.debug("Histogram:")
     logger.debug(hist.as_str())
 
-    mean_i_sigi = flex.double()
-    for i, slot_info in enumerate(hist.slot_infos()):
-        sel = (z_px >= slot_info.low_cutoff) & (z_px < slot_info.high_cutoff)
-        if sel.count(True) == 0:
-            mean_i_sigi.append(0)
-        else:
-            mean_i_sigi.append(flex.mean(i_sigi.select(sel)))
+    # Find the slot of each reflection with the same comparisons as selecting
+    # low_cutoff <= z < high_cutoff for each slot, then average per slot
+    slot = _slot_indices(z_px, hist)
+    sel = slot >= 0
+    counts = numpy.bincount(slot[sel], minlength=n_steps)
+    sums = numpy.bincount(
+        slot[sel], weights=i_sigi.as_numpy_array()[sel], minlength=n_steps
+    )
+    mean_i_sigi = flex.double(
+        numpy.where(counts > 0, sums / numpy.maximum(counts, 1), 0.0)
+    )
 
     potential_blank_sel = mean_i_sigi <= (fractional_loss * flex.max(mean_i_sigi))
 
@@ -144,6 +150,117 @@ def blank_integrated_analysis(reflections, scan, phi_step, fractional_loss):
     return d
 
 
+def _slot_indices(z_px, hist):
+    """
+    The histogram slot of each value, or -1 for values outside every slot.
+    """
+    low = numpy.array([slot_info.low_cutoff for slot_info in hist.slot_infos()])
+    high = numpy.array([slot_info.high_cutoff for slot_info in hist.slot_infos()])
+    z = z_px.as_numpy_array()
+    slot = numpy.searchsorted(low, z, side="right") - 1
+    inside = slot >= 0
+    inside[inside] = z[inside] < high[slot[inside]]
+    slot[~inside] = -1
+    return slot
+
+
+class BlankImageMonitor(object):
+    """
+    Per-image reflection counts and summed I/sigma, updated incrementally.
+
+    Reflections can be added in batches as they become available, for example
+    as spot finding completes each block of images, and the blank regions
+    re-examined after each update without revisiting earlier reflections.
+    """
+
+    def __init__(self, scan):
+        self.scan = scan
+        self.array_range = scan.get_array_range()
+        n_images = self.array_range[1] - self.array_range[0]
+        self.counts = numpy.zeros(n_images, dtype=numpy.int64)
+        self.sum_i_sigi = numpy.zeros(n_images)
+        self.n_seen = 0
+
+    def update(self, z_px, i_sigi=None, up_to_image=None):
+        """
+        Add a batch of reflections.
+
+        :param z_px: The observed z centroids in pixels
+        :param i_sigi: The I/sigma of the reflections (optional)
+        :param up_to_image: The array index up to which all images have now
+                            been processed (optional). Blank images give no
+                            reflections, so this is needed to see them.
+        """
+        n_images = len(self.counts)
+        image = numpy.floor(z_px.as_numpy_array()).astype(numpy.int64)
+        image = numpy.clip(image - self.array_range[0], 0, n_images - 1)
+        self.counts += numpy.bincount(image, minlength=n_images)
+        if i_sigi is not None:
+            self.sum_i_sigi += numpy.bincount(
+                image, weights=i_sigi.as_numpy_array(), minlength=n_images
+            )
+        if len(image):
+            self.n_seen = max(self.n_seen, int(image.max()) + 1)
+        if up_to_image is not None:
+            self.n_seen = max(
+                self.n_seen, min(up_to_image - self.array_range[0], n_images)
+            )
+
+    def analysis(self, phi_step, fractional_loss, use_i_sigi=False):
+        """
+        Find the blank regions among the images seen so far.
+
+        Only complete steps of images are analysed until the end of the scan
+        is reached, so that a step still being collected is not reported as
+        blank.
+
+        :param phi_step: The step size in degrees
+        :param fractional_loss: The fractional loss relative to the best step
+        :param use_i_sigi: Use mean I/sigma rather than reflection counts
+        :returns: A dictionary in the form of blank_counts_analysis
+        """
+        osc = self.scan.get_oscillation()[1]
+        n_images_per_step = iceil(phi_step / osc)
+        n_images = self.n_seen
+        if n_images < len(self.counts):
+            n_images -= n_images % n_images_per_step
+        starts = numpy.arange(0, n_images, n_images_per_step)
+
+        if len(starts):
+            counts = numpy.add.reduceat(self.counts[:n_images], starts)
+            if use_i_sigi:
+                sums = numpy.add.reduceat(self.sum_i_sigi[:n_images], starts)
+                values = numpy.where(counts > 0, sums / numpy.maximum(counts, 1), 0)
+            else:
+                values = counts
+            blank = values <= fractional_loss * values.max()
+        else:
+            values = blank = numpy.zeros(0)
+
+        xlow = starts + self.array_range[0]
+        xhigh = numpy.minimum(xlow + n_images_per_step, n_images + self.array_range[0])
+        d = {
+            "data": [
+                {
+                    "x": ((xlow + xhigh) / 2).tolist(),
+                    "y": values.tolist(),
+                    "xlow": xlow.tolist(),
+                    "xhigh": xhigh.tolist(),
+                    "blank": [bool(b) for b in blank],
+                    "type": "bar",
+                    "name": "blank_counts_analysis",
+                }
+            ],
+            "layout": {
+                "xaxis": {"title": "z observed (images)"},
+                "yaxis": {"title": "Number of reflections"},
+                "bargap": 0,
+            },
+        }
+        d["blank_regions"] = blank_regions_from_sel(d["data"][0])
+        return d
+
+
 def blank_regions_from_sel(d):
     blank_sel = d["blank"]
     xlow = d["xlow"]
@@ -158,7 +275,7 @@ def blank_regions_from_sel(d):
                 blank_start = math.floor(xlow[i])
             blank_end = math.ceil(xhigh[i])
         if (not blank_sel[i] and i > 0 and blank_sel[i - 1]) or (
-            i == (n - 1) and blank_sel[i - 1]
+            i == (n - 1) and blank_sel[i]
         ):
             blank_regions.append((blank_start, blank_end))
 
@@ -149,56 +149,54 @@ def add_batch_list(
 
         # Recalculate useful numbers and references here
         n_batches = image_range[1] - image_range[0] + 1
-        phi_start = flex.float(n_batches, 0)
-        phi_range = flex.float(n_batches, 0)
-        umat_array = flex.float(flex.grid(n_batches, 9))
-        cell_array = flex.float(flex.grid(n_batches, 6))
+        i0 = image_range[0]
+        if experiment.scan:
+            osc_start, osc_width = experiment.scan.get_oscillation()
+            first_image = experiment.scan.get_image_range()[0]
+            phi_start = flex.float(
+                [
+                    osc_start + (i + i0 - first_image) * osc_width
+                    for i in range(n_batches)
+                ]
+            )
+            phi_range = flex.float(n_batches, osc_width)
+        else:
+            phi_start = flex.float(n_batches, 0)
+            phi_range = flex.float(n_batches, 0)
 
-        U = matrix.sqr(experiment.crystal.get_U())
         if experiment.goniometer is not None:
-            F = matrix.sqr(experiment.goniometer.get_fixed_rotation())
+            F = experiment.goniometer.get_fixed_rotation()
         else:
-            F = matrix.sqr((1, 0, 0, 0, 1, 0, 0, 0, 1))
-
-        i0 = image_range[0]
-        for i in range(n_batches):
-            if experiment.scan:
-                phi_start[i], phi_range[i] = experiment.scan.get_image_oscillation(
-                    i + i0
-                )
+            F = (1, 0, 0, 0, 1, 0, 0, 0, 1)
+
+        # unit cell (this is fine) and the what-was-refined-flags hardcoded
+        # take time-varying parameters from the *end of the frame* unlikely to
+        # be much different at the end - however only exist if scan-varying
+        # refinement was used
+        scan_varying = not force_static_model and experiment.crystal.num_scan_points > 0
+        if scan_varying:
+            # Get the index of the first image in the sequence e.g. first => 0
+            first = i0 - experiment.scan.get_image_range()[0]
+        else:
+            first = 0
 
-            # unit cell (this is fine) and the what-was-refined-flags hardcoded
-            # take time-varying parameters from the *end of the frame* unlikely to
-            # be much different at the end - however only exist if scan-varying
-            # refinement was used
-            if not force_static_model and experiment.crystal.num_scan_points > 0:
-                # Get the index of the image in the sequence e.g. first => 0, second => 1
-                image_index = i + i0 - experiment.scan.get_image_range()[0]
-                _unit_cell = experiment.crystal.get_unit_cell_at_scan_point(image_index)
-                _U = matrix.sqr(experiment.crystal.get_U_at_scan_point(image_index))
-            else:
-                _unit_cell = experiment.crystal.get_unit_cell()
-                _U = U
-
-            # apply the fixed rotation to this to unify matrix definitions - F * U
-            # was what was used in the actual prediction: U appears to be stored
-            # as the transpose?! At least is for Mosflm...
-            #
-            # FIXME Do we need to apply the setting rotation here somehow? i.e. we have
-            # the U.B. matrix assuming that the axis is equal to S * axis_datum but
-            # here we are just giving the effective axis so at scan angle 0 this will
-            # not be correct... FIXME 2 not even sure we can express the stack of
-            # matrices S * R * F * U * B in MTZ format?... see [=A=] below
-            _U = matrix.sqr(dials.util.ext.dials_u_to_mosflm(F * _U, _unit_cell))
-
-            # FIXME need to get what was refined and what was constrained from the
-            # crystal model - see https://github.com/dials/dials/issues/355
-            _unit_cell_params = _unit_cell.parameters()
-            for j in range(6):
-                cell_array[i, j] = _unit_cell_params[j]
-            _U_t_elements = _U.transpose().elems
-            for j in range(9):
-                umat_array[i, j] = _U_t_elements[j]
+        # apply the fixed rotation to this to unify matrix definitions - F * U
+        # was what was used in the actual prediction: U appears to be stored
+        # as the transpose?! At least is for Mosflm...
+        #
+        # FIXME Do we need to apply the setting rotation here somehow? i.e. we have
+        # the U.B. matrix assuming that the axis is equal to S * axis_datum but
+        # here we are just giving the effective axis so at scan angle 0 this will
+        # not be correct... FIXME 2 not even sure we can express the stack of
+        # matrices S * R * F * U * B in MTZ format?... see [=A=] below
+        #
+        # FIXME need to get what was refined and what was constrained from the
+        # crystal model - see https://github.com/dials/dials/issues/355
+        umat_array = flex.float(flex.grid(n_batches, 9))
+        cell_array = flex.float(flex.grid(n_batches, 6))
+        dials.util.ext.dials_batch_crystal_arrays(
+            experiment.crystal, F, first, scan_varying, cell_array, umat_array
+        )
 
         # We ignore panels beyond the first one, at the moment
         panel = experiment.detector[0]
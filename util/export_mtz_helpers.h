@@ -10,10 +10,13 @@
 #include <scitbx/array_family/tiny_types.h>
 #include <cctbx/uctbx.h>
 #include <iotbx/mtz/object.h>
+#include <dxtbx/model/crystal.h>
+#include <dials/error.h>
 
 namespace dials { namespace util {
 
   using cctbx::uctbx::unit_cell;
+  using dxtbx::model::CrystalBase;
   using iotbx::mtz::object;
   using scitbx::mat3;
 
@@ -200,6 +203,54 @@ namespace dials { namespace util {
 
     return mosflm_U;
   }
+
+  /**
+   * Fill the unit cell and orientation arrays for a range of MTZ batches.
+   *
+   * The orientation matrix is the transpose of the Mosflm U matrix computed
+   * from F * U for the crystal model at each batch.
+   *
+   * @param crystal The crystal model
+   * @param F The goniometer fixed rotation
+   * @param first The scan point of the first batch
+   * @param scan_varying Use the scan-varying crystal model
+   * @param cell_array The unit cell parameters of each batch (n x 6)
+   * @param umat_array The orientation matrix of each batch (n x 9)
+   */
+  void dials_batch_crystal_arrays(const CrystalBase &crystal,
+                                  mat3<double> F,
+                                  int first,
+                                  bool scan_varying,
+                                  af::ref<float, af::c_grid<2> > cell_array,
+                                  af::ref<float, af::c_grid<2> > umat_array) {
+    DIALS_ASSERT(cell_array.accessor()[1] == 6);
+    DIALS_ASSERT(umat_array.accessor()[1] == 9);
+    DIALS_ASSERT(cell_array.accessor()[0] == umat_array.accessor()[0]);
+    std::size_t n_batches = cell_array.accessor()[0];
+    if (scan_varying) {
+      DIALS_ASSERT(first >= 0);
+      DIALS_ASSERT(first + n_batches <= crystal.get_num_scan_points());
+    }
+    scitbx::af::double6 params;
+    mat3<double> U_t;
+    for (std::size_t i = 0; i < n_batches; ++i) {
+      if (scan_varying || i == 0) {
+        unit_cell uc = scan_varying ? crystal.get_unit_cell_at_scan_point(first + i)
+                                    : crystal.get_unit_cell();
+        mat3<double> U =
+          scan_varying ? crystal.get_U_at_scan_point(first + i) : crystal.get_U();
+        params = uc.parameters();
+        U_t = dials_u_to_mosflm(F * U, uc).transpose();
+      }
+      for (std::size_t j = 0; j < 6; ++j) {
+        cell_array(i, j) = params[j];
+      }
+      for (std::size_t j = 0; j < 9; ++j) {
+        umat_array(i, j) = U_t[j];
+      }
+    }
+  }
+
 }}  // namespace dials::util
 
 #endif
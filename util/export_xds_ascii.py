@@ -1,11 +1,9 @@
 from __future__ import absolute_import, division, print_function
 
-import copy
 import logging
 import os
 
 import libtbx.phil
-from cctbx.miller import map_to_asu
 from rstbx.cftbx.coordinate_frame_helpers import align_reference_frame
 from scitbx import matrix
 
@@ -85,15 +83,9 @@ def _export_experiment(filename, integrated_data, experiment, params, var_model=
     ) = FilteringReductionMethods.calculate_lp_qe_correction_and_filter(integrated_data)
 
     # sort data before output
-    nref = len(integrated_data["miller_index"])
-    indices = flex.size_t_range(nref)
-
-    unique = copy.deepcopy(integrated_data["miller_index"])
-
-    map_to_asu(experiment.crystal.get_space_group().type(), False, unique)
-
-    perm = sorted(indices, key=lambda k: unique[k])
-    integrated_data = integrated_data.select(flex.size_t(perm))
+    integrated_data = integrated_data.select(
+        integrated_data.asu_index(experiment.crystal.get_space_group()).permutation
+    )
 
     if experiment.goniometer is None:
         print("Warning: No goniometer. Experimentally exporting with (1 0 0) axis")
@@ -43,7 +43,6 @@
 from __future__ import absolute_import, division, print_function
 
 import logging
-from collections import defaultdict
 from typing import Any, List, Type
 
 from dials.util import tabulate
@@ -818,118 +817,201 @@ def sum_partial_reflections(reflection_table):
         sel = sel & (reflection_table["intensity." + intensity + ".variance"] > 0)
     isel = sel.iselection()
 
-    # create map of partial_id to reflections
-    delete = flex.size_t()
-    partial_map = defaultdict(list)
-    for j in isel:
-        partial_map[reflection_table["partial_id"][j]].append(j)
-
-    # now work through this map - get total partiality for every reflection;
-    # here only consider reflections with > 1 component;
-    partial_ids = []
-    for p_id in partial_map:
-        if len(partial_map[p_id]) > 1:
-            partial_ids.append(p_id)
-
-    header = ["Partial id", "Partiality"]
-    for i in intensities:
-        header.extend([str(i) + " intensity", str(i) + " variance"])
-    rows = []
-
-    # Now loop through 'matched' partials, summing and then deleting before return
-    for p_id in partial_ids:
-        j = partial_map[p_id]
-        for i in j:
-            data = [str(p_id), str(reflection_table["partiality"][i])]
-            for intensity in intensities:
-                data.extend(
-                    [
-                        str(reflection_table["intensity." + intensity + ".value"][i]),
-                        str(
-                            reflection_table["intensity." + intensity + ".variance"][i]
-                        ),
-                    ]
-                )
-            rows.append(data)
-
-        # do the summing of the partiality values separately to allow looping
-        # over multiple times
-        total_partiality = sum(reflection_table["partiality"][i] for i in j)
-        if "prf" in intensities:
-            reflection_table = _sum_prf_partials(reflection_table, j)
-        if "sum" in intensities:
-            reflection_table = _sum_sum_partials(reflection_table, j)
-        if "scale" in intensities:
-            reflection_table = _sum_scale_partials(reflection_table, j)
-        # FIXME now that the partials have been summed, should fractioncalc be set
-        # to one (except for summation case?)
-        reflection_table["partiality"][j[0]] = total_partiality
-        delete.extend(flex.size_t(j[1:]))
-        data = ["combined " + str(p_id), str(total_partiality)]
-        for intensity in intensities:
-            data.extend(
-                [
-                    str(reflection_table["intensity." + intensity + ".value"][j[0]]),
-                    str(reflection_table["intensity." + intensity + ".variance"][j[0]]),
-                ]
+    # find the groups of 'matched' partials - only consider reflections with
+    # > 1 component
+    groups = _PartialGroups.from_partial_ids(reflection_table["partial_id"], isel)
+
+    # Formatting this table can be sloooow for large numbers of reflections, so skip
+    # this unless debug output has been requested
+    debug = logger.getEffectiveLevel() <= logging.DEBUG
+    if debug:
+        header = ["Partial id", "Partiality"]
+        columns = ["partiality"]
+        for i in intensities:
+            header.extend([str(i) + " intensity", str(i) + " variance"])
+            columns.extend(
+                ["intensity." + i + ".value", "intensity." + i + ".variance"]
             )
-        rows.append(data)
-    reflection_table.del_selected(delete)
+
+        def table_row(label, i):
+            return [label] + [str(reflection_table[c][i]) for c in columns]
+
+        rows = [
+            [table_row(str(reflection_table["partial_id"][i]), i) for i in j]
+            for j in groups.as_lists()
+        ]
+
+    # Now sum all 'matched' partials, then delete before return. Do the summing
+    # of the partiality values separately to allow looping over multiple times
+    total_partiality = groups.sum(reflection_table["partiality"].select)
+    if "prf" in intensities:
+        reflection_table = _sum_prf_partials(reflection_table, groups)
+    if "sum" in intensities:
+        reflection_table = _sum_sum_partials(reflection_table, groups)
+    if "scale" in intensities:
+        reflection_table = _sum_scale_partials(reflection_table, groups)
+    # FIXME now that the partials have been summed, should fractioncalc be set
+    # to one (except for summation case?)
+    reflection_table["partiality"].set_selected(groups.first, total_partiality)
+
+    if debug:
+        table = []
+        for j, group_rows in zip(groups.as_lists(), rows):
+            table.extend(group_rows)
+            p_id = reflection_table["partial_id"][j[0]]
+            table.append(table_row("combined " + str(p_id), j[0]))
+        logger.debug("\nSummary of combination of partial reflections")
+        logger.debug(tabulate(table, header))
+
+    reflection_table.del_selected(groups.others())
     if nrefl > reflection_table.size():
         logger.info(
             "Combined %s partial reflections with other partial reflections"
             % (nrefl - reflection_table.size())
         )
-
-    # Formatting this table can be sloooow for large numbers of reflections, so skip
-    # this unless debug output has been requested
-    if logger.getEffectiveLevel() <= logging.DEBUG:
-        logger.debug("\nSummary of combination of partial reflections")
-        logger.debug(tabulate(rows, header))
     return reflection_table
 
 
+class _PartialGroups(object):
+    """Row indices of the components of groups of matching partial reflections.
+
+    The components of each group are ordered by row index. The combined values
+    of a group are written to its first component and the rest are deleted.
+    Sums over the components of all groups are accumulated one component at a
+    time, in the same order as summing each group in turn.
+    """
+
+    def __init__(self, first, components):
+        """
+        :param first: The rows of the first component of each group
+        :param components: For each further component k, a tuple of the indices
+                           of the groups with more than k components and the
+                           rows of their k'th components
+        """
+        self.first = first
+        self.components = components
+
+    @classmethod
+    def from_lists(cls, groups):
+        """Create the groups from lists of row indices."""
+        groups = [sorted(j) for j in groups]
+        components = []
+        k = 1
+        while True:
+            active = flex.size_t([i for i, j in enumerate(groups) if len(j) > k])
+            if not len(active):
+                break
+            components.append((active, flex.size_t([groups[i][k] for i in active])))
+            k += 1
+        return cls(flex.size_t([j[0] for j in groups]), components)
+
+    @classmethod
+    def from_partial_ids(cls, partial_id, isel):
+        """Group the selected rows with more than one matching partial_id."""
+        ids = partial_id.select(isel)
+        order = flex.sort_permutation(ids, stable=True)
+        rows = isel.select(order)
+        ids = ids.select(order)
+        if not len(ids):
+            return cls(flex.size_t(), [])
+
+        # find the start and length of each run of equal partial ids
+        new_group = flex.bool(len(ids), True)
+        new_group.set_selected(flex.size_t_range(1, len(ids)), ids[1:] != ids[:-1])
+        starts = new_group.iselection()
+        ends = starts[1:]
+        ends.append(len(ids))
+        lengths = ends - starts
+        multiple = (lengths > 1).iselection()
+        starts = starts.select(multiple)
+        lengths = lengths.select(multiple)
+
+        components = []
+        k = 1
+        while True:
+            active = (lengths > k).iselection()
+            if not len(active):
+                break
+            components.append((active, rows.select(starts.select(active) + k)))
+            k += 1
+        return cls(rows.select(starts), components)
+
+    def __len__(self):
+        return len(self.first)
+
+    def sum(self, values_for_rows):
+        """Sum values over the components of each group.
+
+        :param values_for_rows: A function returning the values for a
+                                flex.size_t selection of rows
+        :returns: A flex.double of the total for each group
+        """
+        total = values_for_rows(self.first)
+        for active, rows in self.components:
+            total.set_selected(active, total.select(active) + values_for_rows(rows))
+        return total
+
+    def others(self):
+        """The rows of all components except the first of each group."""
+        rows = flex.size_t()
+        for _, component in self.components:
+            rows.extend(component)
+        return rows
+
+    def as_lists(self):
+        """The row indices of each group, ordered by first row."""
+        groups = [[i] for i in self.first]
+        for active, rows in self.components:
+            for i, row in zip(active, rows):
+                groups[i].append(row)
+        return sorted(groups)
+
+
 # FIXME what are the correct weights to use for the different cases? - why
 # weighting by (I/sig(I))^2 not just 1/variance for prf. See tests?
 
 
 def _sum_prf_partials(reflection_table, partials_isel_for_pid):
     """Sum prf partials and set the updated value in the first entry."""
-    j = partials_isel_for_pid
-    value = reflection_table["intensity.prf.value"][j[0]]
-    variance = reflection_table["intensity.prf.variance"][j[0]]
-    weight = value * value / variance
-    value *= weight
-    variance *= weight
-    total_weight = weight
-    for i in j[1:]:
-        _value = reflection_table["intensity.prf.value"][i]
-        _variance = reflection_table["intensity.prf.variance"][i]
-        _weight = _value * _value / _variance
-        value += _weight * _value
-        variance += _weight * _variance
-        total_weight += _weight
+    groups = partials_isel_for_pid
+    if not isinstance(groups, _PartialGroups):
+        groups = _PartialGroups.from_lists([groups])
+    values = reflection_table["intensity.prf.value"]
+    variances = reflection_table["intensity.prf.variance"]
+
+    def weights(rows):
+        value = values.select(rows)
+        return value * value / variances.select(rows)
+
+    value = groups.sum(lambda rows: weights(rows) * values.select(rows))
+    variance = groups.sum(lambda rows: weights(rows) * variances.select(rows))
+    total_weight = groups.sum(weights)
     # now write these back into original reflection
-    if total_weight:
-        reflection_table["intensity.prf.value"][j[0]] = value / total_weight
-        reflection_table["intensity.prf.variance"][j[0]] = variance / total_weight
-    else:
-        variance = sum(reflection_table["intensity.prf.variance"][_j] for _j in j)
-        reflection_table["intensity.prf.value"][j[0]] = 0
-        reflection_table["intensity.prf.variance"][j[0]] = variance
+    nonzero = (total_weight != 0).iselection()
+    value.set_selected(nonzero, value.select(nonzero) / total_weight.select(nonzero))
+    variance.set_selected(
+        nonzero, variance.select(nonzero) / total_weight.select(nonzero)
+    )
+    zero = (total_weight == 0).iselection()
+    if len(zero):
+        value.set_selected(zero, 0.0)
+        variance.set_selected(zero, groups.sum(variances.select).select(zero))
+    values.set_selected(groups.first, value)
+    variances.set_selected(groups.first, variance)
     return reflection_table
 
 
 def _sum_sum_partials(reflection_table, partials_isel_for_pid):
     """Sum sum partials and set the updated value in the first entry."""
-    j = partials_isel_for_pid
-    value = reflection_table["intensity.sum.value"][j[0]]
-    variance = reflection_table["intensity.sum.variance"][j[0]]
-    for i in j[1:]:
-        value += reflection_table["intensity.sum.value"][i]
-        variance += reflection_table["intensity.sum.variance"][i]
-    reflection_table["intensity.sum.value"][j[0]] = value
-    reflection_table["intensity.sum.variance"][j[0]] = variance
+    groups = partials_isel_for_pid
+    if not isinstance(groups, _PartialGroups):
+        groups = _PartialGroups.from_lists([groups])
+    values = reflection_table["intensity.sum.value"]
+    variances = reflection_table["intensity.sum.variance"]
+    value = groups.sum(values.select)
+    variance = groups.sum(variances.select)
+    values.set_selected(groups.first, value)
+    variances.set_selected(groups.first, variance)
     return reflection_table
 
 
@@ -938,14 +1020,13 @@ def _sum_scale_partials(reflection_table, partials_isel_for_pid):
     # Weight scaled intensity partials by 1/variance. See
     # https://en.wikipedia.org/wiki/Weighted_arithmetic_mean, section
     # 'Dealing with variance'
-    j = partials_isel_for_pid
-    variance = reflection_table["intensity.scale.variance"][j[0]]
-    value = reflection_table["intensity.scale.value"][j[0]] / variance
-    total_weight = 1.0 / variance
-    for i in j[1:]:
-        _variance = reflection_table["intensity.scale.variance"][i]
-        value += reflection_table["intensity.scale.value"][i] / _variance
-        total_weight += 1.0 / _variance
-    reflection_table["intensity.scale.value"][j[0]] = value / total_weight
-    reflection_table["intensity.scale.variance"][j[0]] = 1.0 / total_weight
+    groups = partials_isel_for_pid
+    if not isinstance(groups, _PartialGroups):
+        groups = _PartialGroups.from_lists([groups])
+    values = reflection_table["intensity.scale.value"]
+    variances = reflection_table["intensity.scale.variance"]
+    value = groups.sum(lambda rows: values.select(rows) / variances.select(rows))
+    total_weight = groups.sum(lambda rows: 1.0 / variances.select(rows))
+    values.set_selected(groups.first, value / total_weight)
+    variances.set_selected(groups.first, 1.0 / total_weight)
     return reflection_table
@@ -0,0 +1,420 @@
+"""
+Parallel and cached import of image files into experiment lists.
+
+Files are split into runs of consecutive files sharing a filename template.
+Each run is imported by ExperimentListFactory.from_filenames, which only
+checks the format registry again when the format of the previous file stops
+understanding the next one. Runs are imported in separate processes, and runs
+of stills are further split into chunks since no sequence can span them. The
+imported experiments of each run can be kept in a cache file keyed by the path,
+modification time and size of every file, so that importing the same files
+again does not need to read any image headers.
+
+The parts are then put back together as a serial import would: consecutive
+stills of the same format share one imageset, and consecutive experiments
+share equal beam, detector and goniometer models.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import hashlib
+import itertools
+import json
+import logging
+import operator
+import os
+import re
+
+from dxtbx.format.FormatMultiImage import FormatMultiImage
+from dxtbx.format.Registry import get_format_class_for
+from dxtbx.imageset import ImageGrid, ImageSequence, ImageSetFactory
+from dxtbx.model import BeamFactory, DetectorFactory, GoniometerFactory
+from dxtbx.model.experiment_list import ExperimentList, ExperimentListFactory
+
+from dials.util.mp import parallel_map
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+
+# The file extensions, e.g. ".cbf.gz", and the last run of digits before them
+_extensions = re.compile(r"(\.[A-Za-z][A-Za-z0-9]*)*$")
+_image_number = re.compile(r"[0-9]+(?=[^0-9]*$)")
+
+
+def filename_template(filename):
+    """
+    Replace the image number in a filename with '#' characters.
+
+    :param filename: The filename
+    :returns: The filename template
+    """
+    directory, basename = os.path.split(filename)
+    split = _extensions.search(basename).start()
+    stem = _image_number.sub(lambda m: "#" * len(m.group(0)), basename[:split])
+    return os.path.join(directory, stem + basename[split:])
+
+
+def group_filenames(filenames):
+    """
+    Split a list of filenames into runs of consecutive files sharing a template.
+
+    :param filenames: The filenames
+    :returns: A list of lists of filenames, in the input order
+    """
+    return [list(g) for _, g in itertools.groupby(filenames, key=filename_template)]
+
+
+class _ImportFilenames(object):
+    """Picklable worker importing a list of filenames."""
+
+    def __init__(self, kwargs):
+        self.kwargs = kwargs
+
+    def __call__(self, filenames):
+        unhandled = []
+        experiments = ExperimentListFactory.from_filenames(
+            filenames, unhandled=unhandled, **self.kwargs
+        )
+        formats = [
+            imageset.get_format_class().__name__ for imageset in experiments.imagesets()
+        ]
+        return experiments.to_dict(), formats, unhandled
+
+
+def _is_stills(filenames, kwargs):
+    """Import the first file of a run to see whether it holds stills."""
+    experiments = ExperimentListFactory.from_filenames(filenames[:1], **kwargs)
+    return len(experiments) > 0 and not any(
+        isinstance(imageset, ImageSequence) for imageset in experiments.imagesets()
+    )
+
+
+def _settings_key(kwargs):
+    """A string identifying the import options, for the cache key."""
+    settings = {}
+    for name, value in kwargs.items():
+        if name == "verbose":
+            continue
+        if hasattr(value, "__dict__"):
+            value = vars(value)
+        settings[name] = value
+    return json.dumps(settings, sort_keys=True, default=repr)
+
+
+def _files_key(filenames, settings):
+    """
+    A digest of the paths, modification times and sizes of a run of files.
+
+    :returns: The digest, or None if any of the files cannot be examined
+    """
+    digest = hashlib.sha1(settings.encode("utf-8"))
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        entry = "%s\0%r\0%d\n" % (
+            os.path.abspath(filename),
+            stat.st_mtime,
+            stat.st_size,
+        )
+        digest.update(entry.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ImportCache(object):
+    """
+    A file holding the experiments imported from runs of image files.
+    """
+
+    def __init__(self, filename):
+        """
+        Load the cache, if the file exists.
+
+        :param filename: The cache filename
+        """
+        self.filename = filename
+        self._entries = {}
+        self._modified = False
+        if os.path.isfile(filename):
+            try:
+                with open(filename) as fh:
+                    cache = json.load(fh)
+                if cache.get("version") == CACHE_VERSION:
+                    self._entries = cache["entries"]
+            except ValueError:
+                logger.warning("Ignoring unreadable import cache %s", filename)
+
+    def get(self, key):
+        """
+        :param key: The key of the run of files
+        :returns: The experiment list dictionary, the format class names of its
+                  imagesets and the unhandled files, or None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry["experiments"], entry["formats"], entry["unhandled"]
+
+    def set(self, key, experiments, formats, unhandled):
+        self._entries[key] = {
+            "experiments": experiments,
+            "formats": formats,
+            "unhandled": unhandled,
+        }
+        self._modified = True
+
+    def save(self):
+        """Write the cache, if anything has been added."""
+        if not self._modified:
+            return
+        with open(self.filename, "w") as fh:
+            json.dump({"version": CACHE_VERSION, "entries": self._entries}, fh)
+        self._modified = False
+
+
+def experiments_from_filenames(
+    filenames, unhandled=None, nproc=1, cache=None, **kwargs
+):
+    """
+    Import a list of image files in parallel.
+
+    :param filenames: The image filenames
+    :param unhandled: A list to append filenames that could not be imported to
+    :param nproc: The number of processes to import with
+    :param cache: The filename of the import cache, or None
+    :param kwargs: Options for ExperimentListFactory.from_filenames
+    :returns: The experiment list
+    """
+    settings = _settings_key(kwargs)
+    import_cache = ImportCache(cache) if cache else None
+
+    # Split the files into jobs, finding the runs already in the cache
+    jobs = []
+    results = {}
+    for group in group_filenames(filenames):
+        key = _files_key(group, settings) if import_cache else None
+        cached = import_cache.get(key) if key else None
+        if cached is not None:
+            results[len(jobs)] = cached
+            chunks = []
+        elif nproc > 1 and len(group) > 1 and _is_stills(group, kwargs):
+            size = -(-len(group) // nproc)
+            chunks = [group[i : i + size] for i in range(0, len(group), size)]
+        else:
+            chunks = [group]
+        jobs.append((chunks, key))
+
+    # Import everything not found in the cache
+    todo = [(i, chunk) for i, (chunks, _) in enumerate(jobs) for chunk in chunks]
+    worker = _ImportFilenames(kwargs)
+    if nproc > 1 and len(todo) > 1:
+        imported = parallel_map(
+            func=worker,
+            iterable=[chunk for _, chunk in todo],
+            processes=min(nproc, len(todo)),
+            method="multiprocessing",
+            preserve_order=True,
+        )
+    else:
+        imported = [worker(chunk) for _, chunk in todo]
+
+    parts = collections.defaultdict(list)
+    for (i, _), result in zip(todo, imported):
+        parts[i].append(result)
+    for i, result in parts.items():
+        dicts, formats, group_unhandled = zip(*result)
+        results[i] = (
+            _merge_dicts(dicts),
+            list(itertools.chain(*formats)),
+            list(itertools.chain(*group_unhandled)),
+        )
+        key = jobs[i][1]
+        if key:
+            import_cache.set(key, *results[i])
+
+    if import_cache:
+        import_cache.save()
+
+    if not jobs:
+        return ExperimentList()
+    dicts, formats, job_unhandled = zip(*(results[i] for i in range(len(jobs))))
+    if unhandled is not None:
+        unhandled.extend(itertools.chain(*job_unhandled))
+    experiment_dict = _merge_dicts(dicts)
+    formats = list(itertools.chain(*formats))
+    _share_models(experiment_dict, kwargs)
+    formats = _join_stills(experiment_dict, formats)
+    if not experiment_dict["experiment"]:
+        return ExperimentList()
+
+    # The format of every imageset is already known, so there is no need to
+    # look it up in the format registry again
+    experiments = ExperimentListFactory.from_dict(experiment_dict, check_format=False)
+    imagesets = {}
+    for experiment, entry in zip(experiments, experiment_dict["experiment"]):
+        i = entry.get("imageset")
+        if i is None:
+            continue
+        if i not in imagesets:
+            imagesets[i] = _with_format_class(
+                experiment.imageset, get_format_class_for(formats[i])
+            )
+        experiment.imageset = imagesets[i]
+    return experiments
+
+
+def _merge_dicts(dicts):
+    """
+    Concatenate experiment list dictionaries, renumbering the model references.
+    """
+    if len(dicts) == 1:
+        return dicts[0]
+    models = ("beam", "detector", "goniometer", "scan", "crystal", "profile")
+    merged = {"__id__": "ExperimentList", "experiment": [], "imageset": []}
+    for name in models + ("scaling_model",):
+        merged[name] = []
+    for d in dicts:
+        offsets = {name: len(merged[name]) for name in models + ("imageset",)}
+        offsets["scaling_model"] = len(merged["scaling_model"])
+        for name in offsets:
+            merged[name].extend(d.get(name, []))
+        for experiment in d["experiment"]:
+            experiment = dict(experiment)
+            for name in offsets:
+                if name in experiment:
+                    experiment[name] += offsets[name]
+            merged["experiment"].append(experiment)
+    return merged
+
+
+def _remove_unused(experiment_dict, name):
+    """Remove the models no experiment refers to, renumbering the references."""
+    used = sorted({e[name] for e in experiment_dict["experiment"] if name in e})
+    renumber = {old: new for new, old in enumerate(used)}
+    experiment_dict[name] = [experiment_dict.get(name, [])[i] for i in used]
+    for experiment in experiment_dict["experiment"]:
+        if name in experiment:
+            experiment[name] = renumber[experiment[name]]
+    return used
+
+
+def _share_models(experiment_dict, kwargs):
+    """
+    Share equal models between consecutive experiments, as a serial import does.
+
+    The experiments of each part of the import already share their models, so
+    this only joins up the models across the parts.
+
+    :param experiment_dict: The experiment list dictionary, modified in place
+    :param kwargs: The import options, with the optional model comparisons
+    """
+    for name, factory in (
+        ("beam", BeamFactory),
+        ("detector", DetectorFactory),
+        ("goniometer", GoniometerFactory),
+    ):
+        compare = kwargs.get("compare_" + name) or operator.eq
+        previous = None
+        for experiment in experiment_dict["experiment"]:
+            index = experiment.get(name)
+            if index is None:
+                previous = None
+                continue
+            if previous is not None and index != previous:
+                models = experiment_dict[name]
+                if compare(
+                    factory.from_dict(models[previous]),
+                    factory.from_dict(models[index]),
+                ):
+                    experiment[name] = index = previous
+            previous = index
+        _remove_unused(experiment_dict, name)
+
+
+def _join_stills(experiment_dict, formats):
+    """
+    Join consecutive imagesets of stills of the same format into one imageset,
+    as a serial import does.
+
+    :param experiment_dict: The experiment list dictionary, modified in place
+    :param formats: The format class name of each imageset
+    :returns: The format class names of the remaining imagesets
+    """
+
+    def joinable(imageset):
+        return (
+            imageset["__id__"] == "ImageSet" and "single_file_indices" not in imageset
+        )
+
+    def settings(imageset):
+        return {k: v for k, v in imageset.items() if k != "images"}
+
+    imagesets = experiment_dict["imageset"]
+    target = list(range(len(imagesets)))
+    for i in range(1, len(imagesets)):
+        j = target[i - 1]
+        if (
+            joinable(imagesets[i])
+            and joinable(imagesets[j])
+            and formats[i] == formats[j]
+            and settings(imagesets[i]) == settings(imagesets[j])
+        ):
+            imagesets[j] = dict(imagesets[j])
+            imagesets[j]["images"] = imagesets[j]["images"] + imagesets[i]["images"]
+            target[i] = j
+    for experiment in experiment_dict["experiment"]:
+        if "imageset" in experiment:
+            experiment["imageset"] = target[experiment["imageset"]]
+    used = _remove_unused(experiment_dict, "imageset")
+    return [formats[i] for i in used]
+
+
+def _with_format_class(imageset, format_class):
+    """
+    Make a copy of an imageset loaded without a format check, which reads the
+    images with a known format class.
+
+    :param imageset: The imageset
+    :param format_class: The format class of its images
+    :returns: The new imageset
+    """
+    format_kwargs = imageset.params()
+    if isinstance(imageset, ImageSequence):
+        first, last = imageset.get_scan().get_image_range()
+        result = ImageSetFactory.make_sequence(
+            template=imageset.get_template(),
+            indices=list(range(first, last + 1)),
+            format_class=format_class,
+            beam=imageset.get_beam(),
+            detector=imageset.get_detector(),
+            goniometer=imageset.get_goniometer(),
+            scan=imageset.get_scan(),
+            format_kwargs=format_kwargs,
+            check_format=False,
+        )
+    else:
+        indices = None
+        if issubclass(format_class, FormatMultiImage):
+            indices = list(imageset.indices())
+        result = ImageSetFactory.make_imageset(
+            imageset.paths(),
+            format_class,
+            check_format=False,
+            single_file_indices=indices,
+            format_kwargs=format_kwargs,
+        )
+        if isinstance(imageset, ImageGrid):
+            result = ImageGrid.from_imageset(result, imageset.get_grid_size())
+        for i in range(len(imageset)):
+            result.set_beam(imageset.get_beam(i), i)
+            result.set_detector(imageset.get_detector(i), i)
+            result.set_goniometer(imageset.get_goniometer(i), i)
+            result.set_scan(imageset.get_scan(i), i)
+    for name in ("mask", "gain", "pedestal", "dx", "dy"):
+        lookup = getattr(imageset.external_lookup, name)
+        getattr(result.external_lookup, name).data = lookup.data
+        getattr(result.external_lookup, name).filename = lookup.filename
+    return result
@@ -0,0 +1,110 @@
+"""
+Headless stacking of consecutive diffraction images.
+
+Frames are accumulated per panel in numpy arrays so that no intermediate flex
+arrays or selections are created for each frame. Long stacks can be split into
+chunks which are read and accumulated in separate processes and then combined.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy
+
+from dials.array_family import flex
+from dials.util.mp import parallel_map
+
+stack_modes = ("sum", "max", "mean")
+
+
+def _combine(total, data, mode):
+    """Accumulate one set of panel arrays into the running totals in place."""
+    for t, d in zip(total, data):
+        if mode == "max":
+            numpy.maximum(t, d, out=t)
+        else:
+            t += d
+
+
+def _as_flex(arrays):
+    """Convert a list of 2D numpy arrays to a tuple of flex.double arrays."""
+    result = []
+    for a in arrays:
+        data = flex.double(numpy.ascontiguousarray(a).ravel())
+        data.reshape(flex.grid(*a.shape))
+        result.append(data)
+    return tuple(result)
+
+
+def _stack_chunk(imageset, indices, mode, raw=False):
+    """
+    Accumulate a run of frames of an imageset.
+
+    :returns: A list of numpy arrays, one per panel
+    """
+    total = None
+    for index in indices:
+        if raw:
+            data = imageset.get_raw_data(index)
+        else:
+            data = imageset[index]
+        if not isinstance(data, tuple):
+            data = (data,)
+        data = [d.as_numpy_array() for d in data]
+        if total is None:
+            total = [d.astype(numpy.float64) for d in data]
+        else:
+            _combine(total, data, mode)
+    return total
+
+
+class _StackChunk(object):
+    """Picklable worker for stacking a chunk of frames in a subprocess."""
+
+    def __init__(self, imageset, mode, raw):
+        self.imageset = imageset
+        self.mode = mode
+        self.raw = raw
+
+    def __call__(self, indices):
+        return _stack_chunk(self.imageset, indices, self.mode, self.raw)
+
+
+def stack_images(imageset, indices, mode="sum", nproc=1, raw=False):
+    """
+    Sum, max or mean a set of frames from an imageset.
+
+    :param imageset: The imageset to read from
+    :param indices: The imageset indices of the frames to stack
+    :param mode: One of "sum", "max" or "mean"
+    :param nproc: The number of processes to read the frames with
+    :param raw: Stack the raw data rather than the corrected data
+    :returns: A tuple of flex.double arrays, one per panel
+    """
+    if mode not in stack_modes:
+        raise ValueError("Unknown stack mode %s" % mode)
+    indices = list(indices)
+    assert len(indices) > 0, "No images to stack"
+
+    nproc = max(1, min(nproc, len(indices)))
+    if nproc == 1:
+        total = _stack_chunk(imageset, indices, mode, raw)
+    else:
+        chunk_size = -(-len(indices) // nproc)
+        chunks = [
+            indices[i : i + chunk_size] for i in range(0, len(indices), chunk_size)
+        ]
+        partial = parallel_map(
+            func=_StackChunk(imageset, mode, raw),
+            iterable=chunks,
+            processes=len(chunks),
+            method="multiprocessing",
+            preserve_order=True,
+        )
+        total = partial[0]
+        for p in partial[1:]:
+            _combine(total, p, mode)
+
+    if mode == "mean":
+        for t in total:
+            t /= len(indices)
+    return _as_flex(total)
@@ -17,6 +17,7 @@
 from dials.array_family import flex
 from dials.command_line.find_spots import phil_scope as find_spots_phil_scope
 from dials.util import masking
+from dials.util.image_stack import stack_images
 from dials.util.image_viewer.mask_frame import MaskSettingsFrame
 from dials.util.image_viewer.spotfinder_wrap import chooser_wrapper
 from dxtbx.imageset import ImageSet
@@ -822,32 +823,21 @@ def stack_images(self):
         mode = self.params.stack_mode
         if self.params.stack_images > 1:
             self.settings.display = "image"
-            image = self.pyslip.tiles.raw_image
-            image_data = image.get_image_data()
-            if not isinstance(image_data, tuple):
-                image_data = (image_data,)
 
             i_frame = self.image_chooser.GetClientData(
                 self.image_chooser.GetSelection()
             ).index
             imageset = self.image_chooser.GetClientData(i_frame).image_set
 
-            for i in range(1, self.params.stack_images):
-                if (i_frame + i) >= len(imageset):
-                    break
-                image_data_i = imageset[i_frame + i]
-                for j, rd in enumerate(image_data):
-                    data = image_data_i[j]
-                    if mode == "max":
-                        sel = data > rd
-                        rd = rd.as_1d().set_selected(sel.as_1d(), data.as_1d())
-                    else:
-                        rd += data
-
-            # /= stack_images to put on consistent scale with single image
-            # so that -1 etc. handled correctly (mean mode)
-            if mode == "mean":
-                image_data = tuple(i / self.params.stack_images for i in image_data)
+            # mean mode puts the stack on a consistent scale with a single
+            # image so that -1 etc. are handled correctly
+            last = min(i_frame + self.params.stack_images, len(imageset))
+            image_data = stack_images(
+                imageset,
+                range(i_frame, last),
+                mode=mode,
+                raw=self.settings.image_type == "raw",
+            )
 
             # Don't show summed images with overloads
             self.pyslip.tiles.set_image_data(image_data, show_saturated=False)
@@ -0,0 +1,457 @@
+"""
+Instrumentation of DIALS programs.
+
+Each process has a single recorder of named spans of time, counters and the
+peak memory use of the process. Recording is off until enable() is called,
+which every program using dials.util.options.OptionParser does when given the
+--instrument-json or --instrument-trace options. Until then spans and counters
+cost no more than a function call.
+
+Work done in other processes by dials.util.mp.parallel_map is recorded in
+those processes and merged into the recorder of the parent, keeping a summary
+for each worker. Recorders of MPI ranks are merged with gather_mpi().
+
+The results may be written as JSON, or as a Chrome trace which can be viewed
+with chrome://tracing or https://ui.perfetto.dev.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import atexit
+import functools
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def _memory_high_water():
+    """
+    :returns: The peak resident memory of this process in bytes, or None
+    """
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return None
+
+
+def _worker_name():
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+
+def _merge_spans(totals, spans):
+    """Add span statistics [count, total, max] into a dictionary of them."""
+    for name, (n, total, longest) in spans.items():
+        if name in totals:
+            t = totals[name]
+            totals[name] = [t[0] + n, t[1] + total, max(t[2], longest)]
+        else:
+            totals[name] = [n, total, longest]
+
+
+def _merge_counters(totals, counters):
+    for name, value in counters.items():
+        totals[name] = totals.get(name, 0) + value
+
+
+class Recorder(object):
+    """
+    Record spans, counters and peak memory use for one process.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def claim_process(self):
+        """
+        Forget what was recorded in the parent process, the first time the
+        recorder is used in a forked child process. The lock is replaced, as
+        another thread of the parent may have held it at the fork.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.spans = {}
+            self.counters = {}
+            self.events = []
+            self.workers = {}
+            self.memory = None
+
+    def enable(self, trace=False):
+        """
+        Start recording.
+
+        :param trace: Keep every span, for writing a Chrome trace
+        """
+        self.enabled = True
+        self.trace = self.trace or trace
+
+    def record(self, name, seconds, start=None, args=None):
+        """
+        Record a span of time.
+
+        :param name: The span name
+        :param seconds: The duration of the span
+        :param start: The time the span started, if it is to be traced
+        :param args: Extra values to show with the span in a trace
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            _merge_spans(self.spans, {name: (1, seconds, seconds)})
+            if self.trace and start is not None:
+                event = {
+                    "name": name,
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": seconds * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.current_thread().ident,
+                }
+                if args:
+                    event["args"] = args
+                self.events.append(event)
+
+    def count(self, name, value=1):
+        """
+        Add to a counter.
+
+        :param name: The counter name
+        :param value: The amount to add
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if self.trace:
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "C",
+                        "ts": time.time() * 1e6,
+                        "pid": os.getpid(),
+                        "args": {name: self.counters[name]},
+                    }
+                )
+
+    def sample_memory(self):
+        """Update the peak memory use of this process."""
+        memory = _memory_high_water()
+        if memory is not None:
+            self.memory = max(self.memory or 0, memory)
+
+    def snapshot(self, reset=False):
+        """
+        Get everything recorded, as a dictionary that can be pickled.
+
+        :param reset: Forget what was recorded, so that it is only reported once
+        :returns: The recorded spans, counters, memory, events and workers
+        """
+        self.sample_memory()
+        with self._lock:
+            result = {
+                "worker": _worker_name(),
+                "spans": dict(self.spans),
+                "counters": dict(self.counters),
+                "memory": self.memory,
+                "events": list(self.events),
+                "workers": dict(self.workers),
+            }
+        if reset:
+            self.reset()
+        return result
+
+    def merge(self, snapshot):
+        """
+        Add the snapshot of another process to this recorder.
+
+        :param snapshot: The result of Recorder.snapshot() in the other process
+        """
+        with self._lock:
+            _merge_spans(self.spans, snapshot["spans"])
+            _merge_counters(self.counters, snapshot["counters"])
+            self.events.extend(snapshot["events"])
+            workers = dict(snapshot["workers"])
+            workers[snapshot["worker"]] = {
+                "spans": snapshot["spans"],
+                "counters": snapshot["counters"],
+                "memory": snapshot["memory"],
+            }
+            for name, worker in workers.items():
+                if name not in self.workers:
+                    self.workers[name] = {"spans": {}, "counters": {}, "memory": None}
+                mine = self.workers[name]
+                _merge_spans(mine["spans"], worker["spans"])
+                _merge_counters(mine["counters"], worker["counters"])
+                if worker["memory"] is not None:
+                    mine["memory"] = max(mine["memory"] or 0, worker["memory"])
+
+
+_recorder = Recorder()
+
+
+def _after_fork_in_child():
+    _recorder.claim_process()
+
+
+if hasattr(os, "register_at_fork"):  # Python 3.7 or later
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class span(object):
+    """
+    Record the time taken by a block of code or a function.
+
+    Use as a context manager::
+
+      with instrumentation.span("integration.read", image=i):
+          ...
+
+    or as a decorator::
+
+      @instrumentation.span("indexing.refine")
+      def refine(...):
+          ...
+    """
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if _recorder.enabled:
+            _recorder.record(
+                self.name, time.time() - self._start, self._start, self.args
+            )
+            _recorder.sample_memory()
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.name, **self.args):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def count(name, value=1):
+    """
+    Add to a named counter.
+
+    :param name: The counter name
+    :param value: The amount to add
+    """
+    _recorder.count(name, value)
+
+
+def record(name, seconds):
+    """
+    Record a span of time measured elsewhere, e.g. by a C++ extension.
+
+    :param name: The span name
+    :param seconds: The duration
+    """
+    _recorder.record(name, seconds)
+
+
+def is_enabled():
+    """
+    :returns: True if spans and counters are being recorded
+    """
+    return _recorder.enabled
+
+
+_outputs = {}
+
+
+def enable(json_file=None, trace_file=None):
+    """
+    Start recording, and write the results when the program exits.
+
+    :param json_file: The file to write spans, counters and memory use to
+    :param trace_file: The file to write a Chrome trace to
+    """
+    first = not _recorder.enabled and not _outputs
+    _recorder.enable(trace=trace_file is not None)
+    if json_file:
+        _outputs["json"] = json_file
+    if trace_file:
+        _outputs["trace"] = trace_file
+    if first:
+        _outputs["program"] = os.path.basename(sys.argv[0]) or "python"
+        _outputs["start"] = time.time()
+        atexit.register(_write_outputs)
+
+
+def _write_outputs():
+    if not _outputs.get("write", True):
+        return
+    start = _outputs["start"]
+    _recorder.record(_outputs["program"], time.time() - start, start)
+    logger.debug(summary())
+    if "json" in _outputs:
+        write_json(_outputs["json"])
+    if "trace" in _outputs:
+        write_chrome_trace(_outputs["trace"])
+
+
+def snapshot(reset=False):
+    """
+    :param reset: Forget what was recorded, so that it is only reported once
+    :returns: Everything recorded in this process, as a picklable dictionary
+    """
+    return _recorder.snapshot(reset=reset)
+
+
+def merge(other):
+    """
+    Merge the snapshot of another process into this process.
+
+    :param other: The result of snapshot() in the other process
+    """
+    _recorder.merge(other)
+
+
+def gather_mpi(comm, root=0):
+    """
+    Merge the recorders of all MPI ranks into the root rank. Only the root
+    rank writes the results at exit.
+
+    :param comm: The MPI communicator
+    :param root: The rank to merge into
+    """
+    if not _recorder.enabled:
+        return
+    snapshots = comm.gather(_recorder.snapshot(reset=comm.rank != root), root=root)
+    if comm.rank == root:
+        for other in snapshots:
+            if other["worker"] != _worker_name():
+                _recorder.merge(other)
+    else:
+        _outputs["write"] = False
+
+
+def summary():
+    """
+    :returns: A table of the recorded spans and counters
+    """
+    from dials.util import tabulate
+
+    rows = [
+        [name, n, "%.3f" % total, "%.3f" % (total / n), "%.3f" % longest]
+        for name, (n, total, longest) in sorted(
+            _recorder.spans.items(), key=lambda item: -item[1][1]
+        )
+    ]
+    text = tabulate(rows, ["Span", "Count", "Total (s)", "Mean (s)", "Max (s)"])
+    if _recorder.counters:
+        text += "\n" + tabulate(
+            sorted(_recorder.counters.items()), ["Counter", "Value"]
+        )
+    return text
+
+
+def write_json(filename):
+    """
+    Write the recorded spans, counters and memory use, in total and per worker.
+
+    :param filename: The output filename
+    """
+    data = snapshot()
+    del data["events"]
+    data["spans"] = {
+        name: {"count": n, "total": total, "max": longest}
+        for name, (n, total, longest) in data["spans"].items()
+    }
+    with open(filename, "w") as fh:
+        json.dump(data, fh, indent=2, sort_keys=True)
+    logger.info("Written instrumentation results to %s", filename)
+
+
+def write_chrome_trace(filename):
+    """
+    Write the recorded spans and counters in the Chrome trace event format.
+
+    :param filename: The output filename
+    """
+    data = snapshot()
+    with open(filename, "w") as fh:
+        json.dump({"traceEvents": data["events"], "displayTimeUnit": "ms"}, fh)
+    logger.info("Written instrumentation trace to %s", filename)
+
+
+class _WorkerResult(object):
+    """The result of a function run in a worker process, with its recording."""
+
+    def __init__(self, result, snapshot):
+        self.result = result
+        self.snapshot = snapshot
+
+
+class InstrumentedFunction(object):
+    """
+    Wrap a function to be run in worker processes, so that what is recorded
+    in the workers is returned to the parent with each result.
+    """
+
+    def __init__(self, func, name):
+        self.func = func
+        self.name = name
+        self.trace = _recorder.trace
+        self.parent = _worker_name()
+
+    def __call__(self, *args, **kwargs):
+        in_worker = _worker_name() != self.parent
+        if in_worker:
+            _recorder.claim_process()
+            _recorder.enable(trace=self.trace)
+        with span(self.name):
+            result = self.func(*args, **kwargs)
+        if not in_worker:
+            return result
+        return _WorkerResult(result, _recorder.snapshot(reset=True))
+
+
+def unwrap_result(result, merge_snapshot=True):
+    """
+    Get the result of an InstrumentedFunction, merging what the worker
+    recorded into this process.
+
+    :param result: The value returned by the function
+    :param merge_snapshot: False if the recording has been merged already
+    :returns: The result of the wrapped function
+    """
+    if isinstance(result, _WorkerResult):
+        if merge_snapshot:
+            _recorder.merge(result.snapshot)
+        return result.result
+    return result
@@ -3,6 +3,8 @@
 import future.moves.itertools as itertools
 import libtbx.easy_mp
 
+from dials.util import instrumentation
+
 
 def parallel_map(
     func,
@@ -19,8 +21,67 @@ def parallel_map(
     """
     A wrapper function to call either drmaa or easy_mp to do a parallel map
     calculation. This function is setup so that in each case we can select
-    the number of cores on a machine
+    the number of cores on a machine. If instrumentation is enabled, what each
+    worker records is merged into this process.
+    """
+    if instrumentation.is_enabled():
+        func = instrumentation.InstrumentedFunction(
+            func, "parallel_map.%s" % getattr(func, "__name__", type(func).__name__)
+        )
+        if callback is not None:
+            callback = _unwrapped_callback(callback)
+        result = _parallel_map(
+            func,
+            iterable,
+            processes,
+            nslots,
+            method,
+            asynchronous,
+            callback,
+            preserve_order,
+            preserve_exception_message,
+            job_category,
+        )
+        return [instrumentation.unwrap_result(r) for r in result]
+
+    return _parallel_map(
+        func,
+        iterable,
+        processes,
+        nslots,
+        method,
+        asynchronous,
+        callback,
+        preserve_order,
+        preserve_exception_message,
+        job_category,
+    )
+
+
+def _unwrapped_callback(callback):
     """
+    Wrap a callback so that it is given the results of the original function
+    rather than those of an instrumented one.
+    """
+
+    def unwrap(result):
+        return callback(instrumentation.unwrap_result(result, merge_snapshot=False))
+
+    return unwrap
+
+
+def _parallel_map(
+    func,
+    iterable,
+    processes,
+    nslots,
+    method,
+    asynchronous,
+    callback,
+    preserve_order,
+    preserve_exception_message,
+    job_category,
+):
     from dials.util.cluster_map import cluster_map as drmaa_parallel_map
 
     if method == "drmaa":
@@ -74,7 +135,7 @@ def __call__(self, iterable):
         """
         Call the function
         """
-        return libtbx.easy_mp.parallel_map(
+        return parallel_map(
             func=self.func,
             iterable=iterable,
             processes=self.nproc,
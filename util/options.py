@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 import copy
+import functools
 import itertools
 import optparse
 import os
@@ -15,7 +16,7 @@
 
 import libtbx.phil
 from dials.array_family import flex
-from dials.util import Sorry
+from dials.util import Sorry, instrumentation
 from dials.util.multi_dataset_handling import (
     sort_tables_to_experiments_order,
     renumber_table_id_columns,
@@ -170,6 +171,8 @@ def __init__(
         scan_tolerance=None,
         format_kwargs=None,
         load_models=True,
+        nproc=1,
+        cache=None,
     ):
         """
         Parse the arguments. Populates its instance attributes in an intelligent way
@@ -190,6 +193,8 @@ def __init__(
         :param check_format: Check the format when reading images
         :param verbose: True/False print out some stuff
         :param load_models: Whether to load all models for ExperimentLists
+        :param nproc: The number of processes to read images with
+        :param cache: The filename of a cache of previously imported images
         """
 
         # Initialise output
@@ -210,6 +215,8 @@ def __init__(
                 scan_tolerance,
                 format_kwargs,
                 load_models,
+                nproc,
+                cache,
             )
 
         # Second try to read experiment files
@@ -245,6 +252,8 @@ def try_read_experiments_from_images(
         scan_tolerance,
         format_kwargs,
         load_models=True,
+        nproc=1,
+        cache=None,
     ):
         """
         Try to import images.
@@ -257,9 +266,12 @@ def try_read_experiments_from_images(
         :param scan_tolerance:
         :param format_kwargs:
         :param load_models: Whether to load all models for ExperimentLists
+        :param nproc: The number of processes to read images with
+        :param cache: The filename of a cache of previously imported images
         :return: Unhandled arguments
         """
         from dxtbx.model.experiment_list import ExperimentListFactory
+        from dials.util.image_import import experiments_from_filenames
 
         # If filenames contain wildcards, expand
         args_new = []
@@ -272,7 +284,13 @@ def try_read_experiments_from_images(
         args = args_new
 
         unhandled = []
-        experiments = ExperimentListFactory.from_filenames(
+        if nproc > 1 or cache:
+            from_filenames = functools.partial(
+                experiments_from_filenames, nproc=nproc, cache=cache
+            )
+        else:
+            from_filenames = ExperimentListFactory.from_filenames
+        experiments = from_filenames(
             args,
             verbose=verbose,
             unhandled=unhandled,
@@ -538,6 +556,14 @@ def _is_a_phil_file(filename):
         except AttributeError:
             load_models = True
 
+        # Options for importing images, only available in dials.import
+        try:
+            import_nproc = params.input.nproc
+            import_cache = params.input.cache
+        except AttributeError:
+            import_nproc = 1
+            import_cache = None
+
         # Try to import everything
         importer = Importer(
             unhandled,
@@ -552,6 +578,8 @@ def _is_a_phil_file(filename):
             scan_tolerance=scan_tolerance,
             format_kwargs=format_kwargs,
             load_models=load_models,
+            nproc=import_nproc,
+            cache=import_cache,
         )
 
         # Grab a copy of the errors that occured in case the caller wants them
@@ -696,6 +724,22 @@ def __init__(self, config_options=False, sort_options=False, **kwargs):
             help="PHIL files to read. Pass '-' for STDIN. Can be specified multiple times, but duplicates ignored.",
         )
 
+        # Add options to record where the program spends its time
+        self.add_option(
+            "--instrument-json",
+            metavar="FILE",
+            dest="instrument_json",
+            help="Write the time spent in instrumented parts of the program, "
+            "counters and peak memory use, in total and per worker, to a JSON file.",
+        )
+        self.add_option(
+            "--instrument-trace",
+            metavar="FILE",
+            dest="instrument_trace",
+            help="Write a Chrome trace of the instrumented parts of the program, "
+            "for viewing with chrome://tracing or ui.perfetto.dev.",
+        )
+
     def parse_args(self, args=None, quick_parse=False):
         """
         Parse the command line arguments and get system configuration.
@@ -709,6 +753,12 @@ def parse_args(self, args=None, quick_parse=False):
         # which phil options will be included.
         options, args = super(OptionParserBase, self).parse_args(args=args)
 
+        # Start recording if requested
+        if options.instrument_json or options.instrument_trace:
+            instrumentation.enable(
+                json_file=options.instrument_json, trace_file=options.instrument_trace
+            )
+
         # Read any argument-specified PHIL file. Ignore duplicates.
         if options.phil:
             for philfile in OrderedSet(options.phil):
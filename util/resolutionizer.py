@@ -5,8 +5,8 @@
 
 import iotbx.mtz
 import iotbx.phil
-from cctbx.array_family import flex
 from cctbx import miller
+from dials.array_family import flex
 from dials.util import Sorry
 from scitbx import lbfgs
 
@@ -404,25 +404,29 @@ def from_reflections_and_experiments(cls, reflection_tables, experiments, params
         # do batch assignment (same functions as in dials.export)
         offsets = calculate_batch_offsets(experiments)
         reflection_tables = assign_batches_to_reflections(reflection_tables, offsets)
-        batches = flex.int()
-        intensities = flex.double()
-        indices = flex.miller_index()
-        variances = flex.double()
+        tables = []
         for table in reflection_tables:
             if "intensity.scale.value" in table:
                 table = filter_reflection_table(
                     table, ["scale"], partiality_threshold=0.4
                 )
-                intensities.extend(table["intensity.scale.value"])
-                variances.extend(table["intensity.scale.variance"])
+                intensity = "intensity.scale"
             else:
                 table = filter_reflection_table(
                     table, ["profile"], partiality_threshold=0.4
                 )
-                intensities.extend(table["intensity.prf.value"])
-                variances.extend(table["intensity.prf.variance"])
-            indices.extend(table["miller_index"])
-            batches.extend(table["batch"])
+                intensity = "intensity.prf"
+            selected = flex.reflection_table()
+            selected["intensity"] = table[intensity + ".value"]
+            selected["variance"] = table[intensity + ".variance"]
+            selected["miller_index"] = table["miller_index"]
+            selected["batch"] = table["batch"]
+            tables.append(selected)
+        joined = flex.reflection_table.concat(tables)
+        intensities = joined.get("intensity", flex.double())
+        variances = joined.get("variance", flex.double())
+        indices = joined.get("miller_index", flex.miller_index())
+        batches = joined.get("batch", flex.int())
 
         crystal_symmetry = miller.crystal.symmetry(
             unit_cell=determine_best_unit_cell(experiments),
@@ -0,0 +1,35 @@
+/*
+ * scoped_gil_release.h
+ *
+ *  Copyright (C) 2020 Diamond Light Source
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#ifndef DIALS_UTIL_SCOPED_GIL_RELEASE_H
+#define DIALS_UTIL_SCOPED_GIL_RELEASE_H
+
+#include <boost/python.hpp>
+
+namespace dials { namespace util {
+
+  /**
+   * Release the GIL for the lifetime of the object, so that the wrapped C++
+   * code can run in parallel from Python threads. No Python objects may be
+   * touched while the GIL is released.
+   */
+  class scoped_gil_release {
+  public:
+    scoped_gil_release() : state_(PyEval_SaveThread()) {}
+
+    ~scoped_gil_release() {
+      PyEval_RestoreThread(state_);
+    }
+
+  private:
+    PyThreadState *state_;
+  };
+
+}}  // namespace dials::util
+
+#endif  // DIALS_UTIL_SCOPED_GIL_RELEASE_H
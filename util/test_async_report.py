@@ -0,0 +1,54 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import pytest
+
+from dials.util import async_report
+
+
+def write_report(filename, data, calls):
+    calls.append(filename)
+    with open(filename, "w") as fh:
+        fh.write(" ".join(str(d) for d in data))
+
+
+def fail():
+    raise RuntimeError("Failed to make the plots")
+
+
+@pytest.mark.parametrize("background", [True, False])
+def test_reports_in_background(run_in_tmpdir, background):
+    background = background and hasattr(os, "fork")
+    data = [1, 2, 3]
+    calls = []
+    with async_report.reports_in_background(background):
+        async_report.start_report(write_report, "report.html", data, calls)
+        # The report has a snapshot of the data
+        data.append(4)
+    with open("report.html") as fh:
+        assert fh.read() == "1 2 3"
+    # A background report runs in another process
+    assert calls == ([] if background else ["report.html"])
+
+    # Outside the block reports are written at once
+    async_report.start_report(write_report, "again.html", data, calls)
+    assert calls[-1] == "again.html"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires os.fork")
+def test_failed_background_report():
+    with async_report.reports_in_background():
+        async_report.start_report(fail)
+        assert async_report.wait_for_reports() is False
+        assert async_report.wait_for_reports() is True
+
+
+def test_downsample():
+    assert list(async_report.downsample(10, max_points=20)) == list(range(10))
+    sample = async_report.downsample(1000, max_points=100)
+    assert len(sample) == 100
+    assert len(set(sample)) == 100
+    assert list(sample) == sorted(sample)
+    assert max(sample) < 1000
+    assert list(async_report.downsample(1000, max_points=100)) == list(sample)
@@ -0,0 +1,113 @@
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import procrunner
+import pytest
+
+from dials.algorithms.simulation.images import (
+    RotationImageSimulator,
+    simulate_intensities,
+    simulate_rotation_experiment,
+)
+from dials.util import benchmark
+
+
+def test_simulated_images_are_reproducible_and_find_spots(tmpdir):
+    unit_cell = (40, 50, 60, 90, 90, 90)
+    experiment = simulate_rotation_experiment(
+        unit_cell, "P222", n_images=5, image_size=256, distance=80, seed=1
+    )
+    intensities = simulate_intensities(unit_cell, "P222", 2.5, seed=1)
+    simulator = RotationImageSimulator(experiment, intensities, 2.5, seed=1)
+    assert len(simulator.reflections)
+    assert simulator.reflections["intensity.sum.value"].all_ge(0)
+
+    image = simulator.image(2)
+    assert image.shape == (256, 256)
+    assert image.sum() > 10 * image.size
+    again = RotationImageSimulator(experiment, intensities, 2.5, seed=1).image(2)
+    assert (image == again).all()
+
+    filenames = simulator.write(tmpdir.join("image_%04d.cbf").strpath)
+    assert len(filenames) == 5
+    result = procrunner.run(
+        ["dials.import", "template=image_####.cbf"], working_directory=tmpdir
+    )
+    result.check_returncode()
+    result = procrunner.run(
+        ["dials.find_spots", "imported.expt"], working_directory=tmpdir
+    )
+    result.check_returncode()
+    assert tmpdir.join("strong.refl").check()
+
+
+def test_compare():
+    baseline = {
+        "stages": {
+            "find_spots": {"wall_time": 10.0, "peak_memory": 1000},
+            "integrate": {"wall_time": 20.0, "peak_memory": 1000},
+        }
+    }
+    results = {
+        "stages": {
+            "find_spots": {"wall_time": 11.0, "peak_memory": 2000},
+            "integrate": {"wall_time": 30.0, "peak_memory": None},
+            "scale": {"wall_time": 5.0, "peak_memory": 1000},
+        }
+    }
+    assert sorted(benchmark.compare(results, baseline, tolerance=0.2)) == [
+        ("find_spots", "peak_memory", 1000, 2000),
+        ("integrate", "wall_time", 20.0, 30.0),
+    ]
+    assert benchmark.compare(results, baseline, tolerance=1.0) == []
+
+
+def test_load_results(tmpdir):
+    filename = tmpdir.join("results.json").strpath
+    with open(filename, "w") as fh:
+        json.dump({"version": benchmark.RESULTS_VERSION, "stages": {}}, fh)
+    assert benchmark.load_results(filename)["stages"] == {}
+    with open(filename, "w") as fh:
+        json.dump({"stages": {}}, fh)
+    with pytest.raises(ValueError):
+        benchmark.load_results(filename)
+
+
+@pytest.mark.slow
+def test_benchmark_command_line(tmpdir):
+    result = procrunner.run(
+        [
+            "dev.dials.benchmark",
+            "n_images=20",
+            "image_size=512",
+            "stages=find_spots+index",
+            "directory=data",
+        ],
+        working_directory=tmpdir,
+    )
+    result.check_returncode()
+    with open(tmpdir.join("dials.benchmark.json").strpath) as fh:
+        results = json.load(fh)
+    assert list(results["stages"]) == ["find_spots", "index"]
+    find_spots = results["stages"]["find_spots"]
+    assert find_spots["items"] == 40
+    assert find_spots["unit"] == "images"
+    assert find_spots["throughput"] > 0
+    assert find_spots["peak_memory"] > 0
+
+    # The same results as a baseline have no regressions
+    result = procrunner.run(
+        [
+            "dev.dials.benchmark",
+            "n_images=20",
+            "image_size=512",
+            "stages=find_spots",
+            "directory=data",
+            "baseline=dials.benchmark.json",
+            "tolerance=10",
+            "output.json=again.json",
+        ],
+        working_directory=tmpdir,
+    )
+    result.check_returncode()
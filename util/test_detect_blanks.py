@@ -127,3 +127,39 @@ def test_blank_integrated_analysis(dials_data):
     )
     assert not any(results["data"][0]["blank"])
     assert results["blank_regions"] == []
+
+
+def test_blank_image_monitor(dials_data):
+    expts = ExperimentList.from_file(
+        dials_data("insulin_processed") / "imported.expt", check_format=False
+    )
+    refl = flex.reflection_table.from_file(
+        dials_data("insulin_processed") / "strong.refl"
+    )
+    scan = expts[0].scan
+    z = refl["xyzobs.px.value"].parts()[2]
+
+    # Adding all the reflections in batches matches the batch analysis
+    monitor = detect_blanks.BlankImageMonitor(scan)
+    for z0 in range(0, 45, 10):
+        monitor.update(z.select((z >= z0) & (z < z0 + 10)))
+    results = monitor.analysis(phi_step=5, fractional_loss=0.1)
+    expected = detect_blanks.blank_counts_analysis(
+        refl, scan, phi_step=5, fractional_loss=0.1
+    )
+    assert results["data"][0]["x"] == expected["data"][0]["x"]
+    assert results["data"][0]["y"] == expected["data"][0]["y"]
+    assert results["blank_regions"] == []
+
+    # Only complete steps are analysed while images are still arriving
+    monitor = detect_blanks.BlankImageMonitor(scan)
+    monitor.update(z.select(z < 12))
+    results = monitor.analysis(phi_step=5, fractional_loss=0.1)
+    assert results["data"][0]["xhigh"][-1] == 10
+    assert results["blank_regions"] == []
+
+    # Images processed without any reflections show up as a blank region
+    monitor.update(z.select((z >= 12) & (z < 30)), up_to_image=40)
+    results = monitor.analysis(phi_step=5, fractional_loss=0.1)
+    assert results["data"][0]["blank"] == [False] * 6 + [True] * 2
+    assert results["blank_regions"] == [(30, 40)]
@@ -0,0 +1,88 @@
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+
+from dials.util import instrumentation
+from dials.util.mp import parallel_map
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = instrumentation.Recorder()
+    recorder.enable(trace=True)
+    monkeypatch.setattr(instrumentation, "_recorder", recorder)
+    return recorder
+
+
+@instrumentation.span("test.square")
+def square(x):
+    instrumentation.count("test.items")
+    return x * x
+
+
+def test_spans_and_counters(recorder):
+    with instrumentation.span("test.block", size=3):
+        assert [square(x) for x in range(3)] == [0, 1, 4]
+
+    snapshot = instrumentation.snapshot()
+    assert snapshot["spans"]["test.block"][0] == 1
+    assert snapshot["spans"]["test.square"][0] == 3
+    assert snapshot["counters"] == {"test.items": 3}
+    assert snapshot["memory"] > 0
+    traced = [e for e in snapshot["events"] if e["ph"] == "X"]
+    assert sorted(e["name"] for e in traced) == ["test.block"] + ["test.square"] * 3
+    assert traced[-1]["args"] == {"size": 3}
+
+
+def test_disabled_recorder_records_nothing(monkeypatch):
+    recorder = instrumentation.Recorder()
+    monkeypatch.setattr(instrumentation, "_recorder", recorder)
+    assert square(2) == 4
+    assert recorder.spans == {} and recorder.counters == {}
+
+
+def test_merge_snapshots_per_worker(recorder):
+    other = instrumentation.Recorder()
+    other.enable()
+    other.record("test.work", 2.0)
+    other.count("test.items", 5)
+    snapshot = other.snapshot()
+    snapshot["worker"] = "node:1"
+
+    instrumentation.record("test.work", 1.0)
+    instrumentation.merge(snapshot)
+    assert recorder.spans["test.work"] == [2, 3.0, 2.0]
+    assert recorder.counters["test.items"] == 5
+    assert recorder.workers["node:1"]["spans"]["test.work"] == [1, 2.0, 2.0]
+
+
+def test_parallel_map_aggregates_workers(recorder, tmpdir):
+    result = parallel_map(square, list(range(8)), processes=2, method="multiprocessing")
+    assert result == [x * x for x in range(8)]
+    assert recorder.counters["test.items"] == 8
+    assert recorder.spans["test.square"][0] == 8
+
+    instrumentation.write_json(tmpdir.join("instrument.json").strpath)
+    with tmpdir.join("instrument.json").open() as fh:
+        data = json.load(fh)
+    assert data["spans"]["test.square"]["count"] == 8
+    assert data["workers"]
+
+    instrumentation.write_chrome_trace(tmpdir.join("trace.json").strpath)
+    with tmpdir.join("trace.json").open() as fh:
+        trace = json.load(fh)
+    assert {e["name"] for e in trace["traceEvents"]} >= {"test.square", "test.items"}
+
+
+def test_parallel_map_does_not_return_parent_recording(recorder):
+    instrumentation.record("test.parent", 1.0)
+    instrumentation.count("test.items", 100)
+    result = parallel_map(square, list(range(8)), processes=2, method="multiprocessing")
+    assert result == [x * x for x in range(8)]
+    assert recorder.spans["test.parent"] == [1, 1.0, 1.0]
+    assert recorder.counters["test.items"] == 108
+    assert recorder.spans["test.square"][0] == 8
+    for worker in recorder.workers.values():
+        assert "test.parent" not in worker["spans"]